@@ -18,71 +18,21 @@ seed(1)
 import pyfftw
 from scipy import integrate
 from scipy import linalg
-import matplotlib.pyplot as plt 
 import time as tm
-import matplotlib.ticker as ticker
 import os
+import sys
+import subprocess
 
 from utils import *
 
-font = {'family' : 'Times New Roman',
-        'size'   : 14}    
-plt.rc('font', **font)
-
-import matplotlib as mpl
-mpl.rcParams['text.usetex'] = True
-mpl.rcParams['text.latex.preamble'] = [r'\usepackage{amsmath}']
-
+# figures are listed in a plot manifest and rendered by ../solver_spectral/render_plots.py,
+# the only module importing matplotlib
 #%%
 # fast poisson solver using second-order central difference scheme
-def fps(nx, ny, dx, dy, f):
-    epsilon = 1.0e-6
-    aa = -2.0/(dx*dx) - 2.0/(dy*dy)
-    bb = 2.0/(dx*dx)
-    cc = 2.0/(dy*dy)
-    hx = 2.0*np.pi/np.float64(nx)
-    hy = 2.0*np.pi/np.float64(ny)
-    
-    kx = np.empty(nx)
-    ky = np.empty(ny)
-    
-    kx[:] = hx*np.float64(np.arange(0, nx))
-
-    ky[:] = hy*np.float64(np.arange(0, ny))
-    
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(np.cos(kx), np.cos(ky), indexing='ij')
-    
-    data = np.empty((nx,ny), dtype='complex128')
-    data1 = np.empty((nx,ny), dtype='complex128')
-    
-    data[:,:] = np.vectorize(complex)(f[2:nx+2,2:ny+2],0.0)
-
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
-    
-    e = fft_object(data)
-    #e = pyfftw.interfaces.scipy_fftpack.fft2(data)
-    
-    e[0,0] = 0.0
-    
-    data1[:,:] = e[:,:]/(aa + bb*kx[:,:] + cc*ky[:,:])
-
-    ut = np.real(fft_object_inv(data1))
-    
-    #periodicity
-    u = np.empty((nx+5,ny+5)) 
-    u[2:nx+2,2:ny+2] = ut
-    u[:,ny+2] = u[:,2]
-    u[nx+2,:] = u[2,:]
-    u[nx+2,ny+2] = u[2,2]
-    
-    return u
+def fps(nx, ny, dx, dy, f, u=None):
+    # eigenvalues and FFTW plans of the grid are computed at its first call, the
+    # solution is written into u if given
+    return poisson_solver(nx, ny, dx, dy, 2).solve(f, u)
 
 #%%
 #-----------------------------------------------------------------------------#
@@ -471,56 +421,24 @@ def rhs_cu3(nx,ny,dx,dy,re,pCU3,w,s):
 
 #%%
 def rhs_compact(nx,ny,dx,dy,re,w,s):
-    lap = np.zeros((nx+5,ny+5))
-    jac = np.zeros((nx+5,ny+5))
     f = np.zeros((nx+5,ny+5))
     
-    # compute wxx
-    for j in range(2,ny+3):
-        a = w[2:nx+3,j]
-        wxx = c4ddp(a,dx,nx)
-        
-        lap[2:nx+3,j] = wxx[:]
+    # the derivatives of all grid lines are computed at once (see ctdms_lines)
+    wi = w[2:nx+3,2:ny+3]
+    si = s[2:nx+3,2:ny+3]
     
-    # compute wyy
-    for i in range(2,nx+3):
-        a = w[i,2:ny+3]        
-        wyy = c4ddp(a,dx,nx)
-        
-        lap[i,2:ny+3] = lap[i,2:ny+3] + wyy[:]
+    # compute wxx + wyy
+    lap = c4ddp_lines(wi,dx,nx,0) + c4ddp_lines(wi,dy,ny,1)
     
-    # Jacobian (convective term): upwind
+    # Jacobian (convective term)
+    sy = c4dp_lines(si,dy,ny,1)
+    wx = c4dp_lines(wi,dx,nx,0)
+    sx = c4dp_lines(si,dx,nx,0)
+    wy = c4dp_lines(wi,dy,ny,1)
     
-    # sy
-    sy = np.zeros((nx+1,ny+1))
-    for i in range(2,nx+3):
-        a = s[i,2:ny+3]        
-        sy[i-2,:] = c4dp(a,dx,nx)
+    jac = (sy*wx - sx*wy)
     
-    # computation of wx
-    wx = np.zeros((nx+1,ny+1))
-    for j in range(2,ny+3):
-        a = w[2:nx+3,j]
-        wx[:,j-2] = c4dp(a,dx,nx)
-        
-    
-    # sx
-    sx = np.zeros((nx+1,ny+1))
-    for j in range(2,ny+3):
-        a = s[2:nx+3,j]
-        sx[:,j-2] = c4dp(a, dx, nx)
-    
-    # computation of wy
-    wy = np.zeros((nx+1,ny+1))
-    for i in range(2,nx+3):
-        a = w[i,2:ny+3]
-        wy[i-2,:] = c4dp(a, dx, nx)
-    
-    jac[2:nx+3,2:ny+3] = (sy*wx - sx*wy)
-    
-    f[2:nx+3,2:ny+3] = -jac[2:nx+3,2:ny+3] + lap[2:nx+3,2:ny+3]/re
-    
-    del sy, wx, sx, wy
+    f[2:nx+3,2:ny+3] = -jac + lap/re
     
     return f
 
@@ -645,7 +563,8 @@ def ic_decay(nx,ny,dx,dy):
     a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
     b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
     
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
+    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD',
+                             flags = fftw_options['flags'], threads = fftw_options['threads'])
     ut = np.real(fft_object_inv(wf)) 
     
     #w = np.zeros((nx+3,ny+3))
@@ -664,69 +583,35 @@ def ic_decay(nx,ny,dx,dy):
 #%%
 # compute the energy spectrum numerically
 def energy_spectrum(nx,ny,w):
-    epsilon = 1.0e-6
-
-    kx = np.empty(nx)
-    ky = np.empty(ny)
     
-    kx[0:int(nx/2)] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(0,int(nx/2)))
-    kx[int(nx/2):nx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(-int(nx/2),0))
-
-    ky[0:ny] = kx[0:ny]
+    '''
+    Computation of energy spectrum and maximum wavenumber from vorticity field
     
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(kx, ky, indexing='ij')
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    w : vorticity field in physical spce (including ghost points),
+        single field or a batch of snapshots stacked along the first axis
     
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    wf = fft_object(w[2:nx+2,2:ny+2]) 
+    Output
+    ------
+    en : energy spectrum computed from vorticity field, (n+1) or (nb,n+1)
+    n : maximum wavenumber
+    '''
     
-    es =  np.empty((nx,ny))
+    shape = w.shape[:-2] + (nx,ny)
+    a = pyfftw.empty_aligned(shape,dtype= 'complex128')
+    b = pyfftw.empty_aligned(shape,dtype= 'complex128')
+
+    fft_object = pyfftw.FFTW(a, b, axes = (-2,-1), direction = 'FFTW_FORWARD',
+                             flags = fftw_options['flags'], threads = fftw_options['threads'])
+    wf = fft_object(w[...,2:nx+2,2:ny+2]) 
     
-    kk = np.sqrt(kx[:,:]**2 + ky[:,:]**2)
-    es[:,:] = np.pi*((np.abs(wf[:,:])/(nx*ny))**2)/kk
-    
-    n = int(np.sqrt(nx*nx + ny*ny)/2.0)-1
-    
-    en = np.zeros(n+1)
-    
-    for k in range(1,n+1):
-        en[k] = 0.0
-        ic = 0
-        ii,jj = np.where((kk[1:,1:]>(k-0.5)) & (kk[1:,1:]<(k+0.5)))
-        ic = ii.size
-        ii = ii+1
-        jj = jj+1
-        en[k] = np.sum(es[ii,jj])
-#        for i in range(1,nx):
-#            for j in range(1,ny):          
-#                kk1 = np.sqrt(kx[i,j]**2 + ky[i,j]**2)
-#                if ( kk1>(k-0.5) and kk1<(k+0.5) ):
-#                    ic = ic+1
-#                    en[k] = en[k] + es[i,j]
-                    
-        en[k] = en[k]/ic
+    # shell sums with the cached shell index of the grid
+    en, n = shell_spectrum(nx,ny,wf)
         
     return en, n
 
-#%%
-def plotimage(x,y):
-    fig, ax = plt.subplots(1,1,sharey=True,figsize=(6,5))
-    cs1 = ax.contourf(x.T, 120, cmap = 'jet', interpolation='bilinear')
-    ax.set_title("True")
-    plt.colorbar(cs1, ax=ax)
-    plt.show()
-    
-    fig, ax = plt.subplots(1,1,sharey=True,figsize=(6,5))
-    cs2 = ax.contourf(y.T, 120, cmap = 'jet', interpolation='bilinear')
-    ax.set_title("Coarsened")
-    plt.colorbar(cs2, ax=ax)
-    plt.show()
-
 #%%
 def coarsen(nx,ny,nxc,nyc,w,wc):
     wf = np.fft.fft2(w[1:nx+1,1:ny+1])
@@ -785,9 +670,17 @@ ichkp = np.int64(l1[10][0])
 istart = np.int64(l1[11][0])
 kappa = np.int64(l1[12][0])
 pCU3 = np.float64(l1[13][0])
+nthreads = np.int64(l1[14][0])
+iplan = np.int64(l1[15][0])
+iplot = np.int64(l1[16][0])
 
 freq = int(nt/ns)
 
+# threads and planner effort for all FFTs, reusing the wisdom of earlier runs, and
+# threads of the stencil kernels
+init_fftw(nthreads,iplan)
+init_kernel(nthreads)
+
 #%% 
 # assign parameters
 nx = nd
@@ -815,6 +708,11 @@ y = np.linspace(0.0,2.0*np.pi,ny+1)
 
 x, y = np.meshgrid(x, y, indexing='ij')
 
+# figures of the run (see add_plot)
+manifest = "plot_manifest.jsonl"
+if os.path.exists(manifest):
+    os.remove(manifest)
+
 #%% 
 # allocate the vorticity and streamfunction arrays
 w = np.empty((nx+5,ny+5)) 
@@ -822,7 +720,7 @@ s = np.empty((nx+5,ny+5))
 
 t = np.empty((nx+5,ny+5))
 
-r = np.empty((nx+5,ny+5))
+r = np.zeros((nx+5,ny+5))
 
 #%%
 # set the initial condition based on the problem selected
@@ -849,6 +747,12 @@ def rhs(nx,ny,dx,dy,re,pCU3,w,s,isolver):
         return rhs_compact(nx,ny,dx,dy,re,w,s)
     if isolver == 3:
         return rhs_cu3(nx,ny,dx,dy,re,pCU3,w,s)
+    if isolver == 4:
+        # fused Arakawa kernel writing into r (compiled with numba if installed)
+        ev = None
+        if ifm == 1:
+            ev = dyn_smag(nx,ny,kappa,s,w)
+        return rhs_arakawa_fused(nx,ny,dx,dy,re,w,s,r,2,ev)
     
 
 #%%
@@ -867,7 +771,7 @@ for k in range(1,nt+1):
     
     t = bc(nx,ny,t)
     
-    s = fps(nx, ny, dx, dy, -t)
+    s = fps(nx, ny, dx, dy, -t, s)
     s = bc(nx,ny,s)
     
     r = rhs(nx,ny,dx,dy,re,pCU3,t,s,isolver)
@@ -877,7 +781,7 @@ for k in range(1,nt+1):
     
     t = bc(nx,ny,t)
     
-    s = fps(nx, ny, dx, dy, -t)
+    s = fps(nx, ny, dx, dy, -t, s)
     s = bc(nx,ny,s)
     
     r = rhs(nx,ny,dx,dy,re,pCU3,t,s,isolver)
@@ -887,7 +791,7 @@ for k in range(1,nt+1):
     
     w = bc(nx,ny,w)
     
-    s = fps(nx, ny, dx, dy, -w)
+    s = fps(nx, ny, dx, dy, -w, s)
     s = bc(nx,ny,s)
     
     if (k%freq == 0):
@@ -897,6 +801,8 @@ for k in range(1,nt+1):
 total_clock_time = tm.time() - clock_time_init
 print('Total clock time=', total_clock_time)
 
+save_wisdom()
+
 #%%
 # exact solution for TGV problem
 if (ipr == 1):
@@ -916,76 +822,32 @@ if (ipr == 4):
 
 #%%
 # contour plot for initial and final vorticity
-fig, axs = plt.subplots(1,2,sharey=True,figsize=(9,5))
-
-cs = axs[0].contourf(x,y,w0[2:nx+3,2:ny+3], 120, cmap = 'jet')
-axs[0].set_title('$t=0$')
-
-cs = axs[1].contourf(x,y,w[2:nx+3,2:ny+3], 120, cmap = 'jet')
-axs[1].set_title('$t=4$')
-
-fig.tight_layout() 
-
-fig.subplots_adjust(bottom=0.15)
-
-cbar_ax = fig.add_axes([0.2, -0.03, 0.6, 0.04])
-fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
-plt.show()
-
-fig.savefig("field_fdm.png", bbox_inches = 'tight')
-
+add_plot(manifest,'field_xy',"field_fdm.png",{'x':x, 'y':y, 'w0':w0[2:nx+3,2:ny+3], 'w':w[2:nx+3,2:ny+3]},
+         {'time':float(dt*nt)})
 
 #%%
 if (ipr == 4):
-
-    fig, ax = plt.subplots()
-    fig.set_size_inches(6,5)
-    
-    line = 100*k**(-3.0)
-    
-    ax.loglog(k,ese[:],'k', lw = 2, label='Exact')
-    ax.loglog(k,en0[1:],'r', ls = '--', lw = 2, label='$t = 0.0$')
-    ax.loglog(k,ent[1:], 'b', lw = 2, label = '$t = '+str(dt*nt)+'$')
-    ax.loglog(k,line, 'g--', lw = 2, label = '$k^-3$')
-    
-    
-    plt.xlabel('$K$')
-    plt.ylabel('$E(K)$')
-    plt.legend(loc=0)
-    plt.ylim(1e-12,1e-1)
-    fig.savefig('es_fdm.png', bbox_inches = 'tight', pad_inches = 0)
-    
+    add_plot(manifest,'spectrum','es_fdm.png',{'k':k, 'ese':ese, 'en0':en0, 'en':ent},
+             {'time':float(dt*nt), 'ylim':[1e-12,1e-1]})
 
 #%%
 en_dns = np.loadtxt("energy_arakawa_"+str(int(re))+"_"+str(int(1024))+"_dns.csv")
 en_coarse = np.loadtxt("energy_arakawa_"+str(int(re))+"_"+str(int(nd))+"_coarse.csv")
 en_dsm = np.loadtxt("energy_arakawa_"+str(int(re))+"_"+str(int(nd))+"_dsm.csv")
- 
-fig, ax = plt.subplots()
-fig.set_size_inches(6,5)
-
 
 kf = np.linspace(1,en_dns.shape[0]-1,en_dns.shape[0]-1)
 
 kl = kf[20:100]
 line = 500*kl**(-3.0)
 
-#ax.loglog(k,ese[:],'k', lw = 2, label='Exact')
-#ax.loglog(k,en0[1:],'r', ls = '--', lw = 2, label='$t = 0.0$')
-
-ax.loglog(kf,en_dns[1:], 'b', lw = 2, label = 'DNS')
-ax.loglog(k,en_dsm[1:], 'g', lw = 2, label = 'DSM')
-ax.loglog(k,ent[1:], 'm', lw = 2, label = 'CU3 ($p=0.25$)')
-ax.loglog(k,en_coarse[1:], 'y', lw = 2, label = 'No model')
-
-ax.loglog(kl,line, 'k-.', lw = 2)
+add_plot(manifest,'spectra','es_fdm_all.png',{'k0':kf, 'en0':en_dns, 'k1':k, 'en1':en_dsm, 'k2':k, 'en2':ent,
+                                               'k3':k, 'en3':en_coarse, 'kl':kl, 'line':line},
+         {'labels':['DNS','DSM','CU3 ($p=0.25$)','No model'], 'styles':['b','g','m','y'],
+          'xlim':[1,200], 'ylim':[1e-6,1e-1], 'text':[50,1e-2]})
 
-
-plt.xlabel('$K$')
-plt.ylabel('$E(K)$')
-plt.legend(loc=0)
-plt.xlim(1,200)
-plt.ylim(1e-6,1e-1)
-plt.text(50, 1e-2, '$k^-3$', color='k')
-
-fig.savefig('es_fdm_all.png', bbox_inches = 'tight', pad_inches = 0)    
+#%%
+# iplot = 0: headless, the manifest is rendered later
+# (python ../solver_spectral/render_plots.py plot_manifest.jsonl)
+if iplot == 1:
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),'..',
+                    'solver_spectral','render_plots.py'), manifest])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 02:17:44 2026
+
+Speedup of the tiled Arakawa right hand side kernel (rhs_arakawa_fused) on 1, 2,
+4, 8 and 16 threads at 1024^2 and 2048^2. The clock time per call is reported
+against one thread, together with the sliced NumPy version (arakawa_rows) on one
+thread. Run as
+
+    python benchmark_arakawa_threads.py
+
+which starts one process per thread count, since numba fixes the size of its
+thread pool at start. Each process executes this script in worker mode
+(python benchmark_arakawa_threads.py worker <threads>) and prints its timings.
+
+"""
+
+import numpy as np
+import sys
+import os
+import subprocess
+import time as tm
+
+from utils import *
+
+#%%
+def clock(func,nrep):
+
+    '''
+    clock time per call of func, the best of three runs of nrep calls
+    '''
+
+    func() # compilation
+    cpu = []
+    for k in range(3):
+        clock_time_init = tm.time()
+        for n in range(nrep):
+            func()
+        cpu.append((tm.time() - clock_time_init)/nrep)
+
+    return min(cpu)
+
+def worker(threads,sizes,nrep):
+
+    '''
+    time the kernel on the given number of threads for each resolution, printed
+    as 'TIME <threads> <nx> <seconds per call> <seconds per call of the sliced
+    NumPy version>'
+
+    Inputs
+    ------
+    threads : number of threads
+    sizes : resolutions nx = ny
+    nrep : number of calls timed
+    '''
+
+    init_kernel(threads)
+
+    for nx in sizes:
+        dx = 2.0*np.pi/np.float64(nx)
+        re = 8000.0
+
+        w = np.random.rand(nx+3,nx+3)
+        s = np.random.rand(nx+3,nx+3)
+        f = np.zeros((nx+3,nx+3))
+
+        cpu = clock(lambda: rhs_arakawa_fused(nx,nx,dx,dx,re,w,s,f,1),nrep)
+
+        aa, gg, hh = 1.0/(dx*dx), 1.0/(4.0*dx*dx), 1.0/3.0
+        cpu_numpy = clock(lambda: arakawa_rows(1,nx+2,nx,aa,aa,gg,hh,re,w,s,None,1,f),max(1,int(nrep/4)))
+
+        print('TIME', threads, nx, cpu, cpu_numpy)
+
+sizes = [1024, 2048]
+nrep = 20
+
+if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+    worker(int(sys.argv[2]),sizes,nrep)
+    sys.exit()
+
+#%%
+import matplotlib.pyplot as plt
+
+font = {'family' : 'Times New Roman',
+        'size'   : 14}
+plt.rc('font', **font)
+
+# thread counts up to the number of cores
+threads = [p for p in (1, 2, 4, 8, 16) if p <= os.cpu_count()]
+if len(threads) < 5:
+    print('only', os.cpu_count(), 'cores, thread counts above are skipped')
+
+results = []
+for p in threads:
+    env = dict(os.environ, NUMBA_NUM_THREADS=str(p))
+    run = subprocess.run([sys.executable, os.path.abspath(__file__), 'worker', str(p)],
+                         capture_output=True, text=True, env=env)
+    lines = [l.split()[1:] for l in run.stdout.splitlines() if l.startswith('TIME')]
+    if run.returncode != 0 or not lines:
+        print('run on', p, 'threads failed:', run.stderr)
+        continue
+    results.extend(lines)
+
+results = np.array(results, dtype=np.float64)
+
+print('%6s %8s %14s %10s %12s %16s' % ('nx', 'threads', 'time/call (s)', 'speedup', 'efficiency', 'NumPy/kernel'))
+table = []
+for nx in sizes:
+    rows = results[results[:,1] == nx]
+    for p, n, cpu, cpu_numpy in rows:
+        speedup = rows[0,2]/cpu
+        table.append([nx, p, cpu, speedup, speedup/(p/rows[0,0]), rows[0,3]/cpu])
+        print('%6d %8d %14.4e %10.2f %12.2f %16.2f' % tuple(table[-1]))
+
+table = np.array(table)
+np.savetxt('benchmark_arakawa_threads.csv', table, delimiter=',',
+           header='nx, threads, time per call (s), speedup, efficiency, speedup over the sliced NumPy version on one thread')
+
+#%%
+# speedup against the number of threads
+fig, ax = plt.subplots(figsize=(6,5))
+
+for nx, c in zip(sizes, ['b','r']):
+    rows = table[table[:,0] == nx]
+    ax.loglog(rows[:,1], rows[:,3], c+'o-', lw = 2, label = str(nx)+r'$\times$'+str(nx))
+ax.loglog(table[:,1], table[:,1]/table[0,1], 'k--', lw = 2, label = 'Ideal')
+ax.set_xlabel('Number of threads')
+ax.set_ylabel('Speedup')
+ax.legend(loc=0)
+
+fig.tight_layout()
+plt.show()
+fig.savefig('benchmark_arakawa_threads.png', bbox_inches = 'tight')
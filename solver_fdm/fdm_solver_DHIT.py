@@ -17,62 +17,21 @@ seed(1)
 import pyfftw
 from scipy import integrate
 from scipy import linalg
-import matplotlib.pyplot as plt 
 import time as tm
-import matplotlib.ticker as ticker
+import os
+import sys
+import subprocess
 
-font = {'family' : 'Times New Roman',
-        'size'   : 14}    
-plt.rc('font', **font)
+from utils import *
+
+# figures are listed in a plot manifest and rendered by ../solver_spectral/render_plots.py,
+# the only module importing matplotlib
 #%%
 # fast poisson solver using second-order central difference scheme
-def fps(nx, ny, dx, dy, f):
-    epsilon = 1.0e-6
-    aa = -2.0/(dx*dx) - 2.0/(dy*dy)
-    bb = 2.0/(dx*dx)
-    cc = 2.0/(dy*dy)
-    hx = 2.0*np.pi/np.float64(nx)
-    hy = 2.0*np.pi/np.float64(ny)
-    
-    kx = np.empty(nx)
-    ky = np.empty(ny)
-    
-    kx[:] = hx*np.float64(np.arange(0, nx))
-
-    ky[:] = hy*np.float64(np.arange(0, ny))
-    
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(np.cos(kx), np.cos(ky), indexing='ij')
-    
-    data = np.empty((nx,ny), dtype='complex128')
-    data1 = np.empty((nx,ny), dtype='complex128')
-    
-    data[:,:] = np.vectorize(complex)(f[1:nx+1,1:ny+1],0.0)
-
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
-    
-    e = fft_object(data)
-    #e = pyfftw.interfaces.scipy_fftpack.fft2(data)
-    
-    e[0,0] = 0.0
-    
-    data1[:,:] = e[:,:]/(aa + bb*kx[:,:] + cc*ky[:,:])
-
-    ut = np.real(fft_object_inv(data1))
-    
-    #periodicity
-    u = np.empty((nx+3,ny+3)) 
-    u[1:nx+1,1:ny+1] = ut
-    u[:,ny+1] = u[:,1]
-    u[nx+1,:] = u[1,:]
-    u[nx+1,ny+1] = u[1,1]
-    return u
+def fps(nx, ny, dx, dy, f, u=None):
+    # eigenvalues and FFTW plans of the grid are computed at its first call, the
+    # solution is written into u if given
+    return poisson_solver(nx, ny, dx, dy, 1).solve(f, u)
 
 #%%
 # set periodic boundary condition for ghost nodes. Index 0 and (n+2) are the ghost boundary locations
@@ -133,7 +92,7 @@ def jacobian(nx,ny,dx,dy,re,w,s):
 # compute rhs using arakawa scheme
 # computed at all physical domain points (1:nx+1,1:ny+1; all boundary points included)
 # no ghost points
-def rhs(nx,ny,dx,dy,re,w,s):
+def rhs_arakawa(nx,ny,dx,dy,re,w,s):
     aa = 1.0/(dx*dx)
     bb = 1.0/(dy*dy)
     gg = 1.0/(4.0*dx*dy)
@@ -245,7 +204,8 @@ def decay_ic(nx,ny,dx,dy):
     a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
     b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
     
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
+    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD',
+                             flags = fftw_options['flags'], threads = fftw_options['threads'])
     ut = np.real(fft_object_inv(wf)) 
     
     #w = np.zeros((nx+3,ny+3))
@@ -281,69 +241,35 @@ def vm_ic(nx,ny,x,y):
 #%%
 # compute the energy spectrum numerically
 def energy_spectrum(nx,ny,w):
-    epsilon = 1.0e-6
-
-    kx = np.empty(nx)
-    ky = np.empty(ny)
     
-    kx[0:int(nx/2)] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(0,int(nx/2)))
-    kx[int(nx/2):nx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(-int(nx/2),0))
-
-    ky[0:ny] = kx[0:ny]
+    '''
+    Computation of energy spectrum and maximum wavenumber from vorticity field
     
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(kx, ky, indexing='ij')
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    w : vorticity field in physical spce (including ghost points),
+        single field or a batch of snapshots stacked along the first axis
     
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    wf = fft_object(w[1:nx+1,1:ny+1]) 
+    Output
+    ------
+    en : energy spectrum computed from vorticity field, (n+1) or (nb,n+1)
+    n : maximum wavenumber
+    '''
     
-    es =  np.empty((nx,ny))
+    shape = w.shape[:-2] + (nx,ny)
+    a = pyfftw.empty_aligned(shape,dtype= 'complex128')
+    b = pyfftw.empty_aligned(shape,dtype= 'complex128')
+
+    fft_object = pyfftw.FFTW(a, b, axes = (-2,-1), direction = 'FFTW_FORWARD',
+                             flags = fftw_options['flags'], threads = fftw_options['threads'])
+    wf = fft_object(w[...,1:nx+1,1:ny+1]) 
     
-    kk = np.sqrt(kx[:,:]**2 + ky[:,:]**2)
-    es[:,:] = np.pi*((np.abs(wf[:,:])/(nx*ny))**2)/kk
-    
-    n = int(np.sqrt(nx*nx + ny*ny)/2.0)-1
-    
-    en = np.zeros(n+1)
-    
-    for k in range(1,n+1):
-        en[k] = 0.0
-        ic = 0
-        ii,jj = np.where((kk[1:,1:]>(k-0.5)) & (kk[1:,1:]<(k+0.5)))
-        ic = ii.size
-        ii = ii+1
-        jj = jj+1
-        en[k] = np.sum(es[ii,jj])
-#        for i in range(1,nx):
-#            for j in range(1,ny):          
-#                kk1 = np.sqrt(kx[i,j]**2 + ky[i,j]**2)
-#                if ( kk1>(k-0.5) and kk1<(k+0.5) ):
-#                    ic = ic+1
-#                    en[k] = en[k] + es[i,j]
-                    
-        en[k] = en[k]/ic
+    # shell sums with the cached shell index of the grid
+    en, n = shell_spectrum(nx,ny,wf)
         
     return en, n
 
-#%%
-def plotimage(x,y):
-    fig, ax = plt.subplots(1,1,sharey=True,figsize=(6,5))
-    cs1 = ax.contourf(x.T, 120, cmap = 'jet', interpolation='bilinear')
-    ax.set_title("True")
-    plt.colorbar(cs1, ax=ax)
-    plt.show()
-    
-    fig, ax = plt.subplots(1,1,sharey=True,figsize=(6,5))
-    cs2 = ax.contourf(y.T, 120, cmap = 'jet', interpolation='bilinear')
-    ax.set_title("Coarsened")
-    plt.colorbar(cs2, ax=ax)
-    plt.show()
-
 #%%
 def coarsen(nx,ny,nxc,nyc,w,wc):
     wf = np.fft.fft2(w[1:nx+1,1:ny+1])
@@ -387,9 +313,17 @@ isc = np.int64(l1[6][0])
 ich = np.int64(l1[7][0])
 ipr = np.int64(l1[8][0])
 ndc = np.int64(l1[9][0])
+nthreads = np.int64(l1[12][0])
+iplan = np.int64(l1[13][0])
+iplot = np.int64(l1[14][0])
 
 freq = int(nt/ns)
 
+# threads and planner effort for all FFTs, reusing the wisdom of earlier runs, and
+# threads of the stencil kernels
+init_fftw(nthreads,iplan)
+init_kernel(nthreads)
+
 if (ich != 19):
     print("Check input.txt file")
 
@@ -420,6 +354,11 @@ y = np.linspace(0.0,2.0*np.pi,ny+1)
 
 x, y = np.meshgrid(x, y, indexing='ij')
 
+# figures of the run (see add_plot)
+manifest = "plot_manifest.jsonl"
+if os.path.exists(manifest):
+    os.remove(manifest)
+
 #%% 
 # allocate the vorticity and streamfunction arrays
 w = np.empty((nx+3,ny+3)) 
@@ -427,7 +366,14 @@ s = np.empty((nx+3,ny+3))
 
 t = np.empty((nx+3,ny+3))
 
-r = np.empty((nx+3,ny+3))
+r = np.zeros((nx+3,ny+3))
+
+# right hand side of the selected scheme, [4] writes into r with the fused
+# Arakawa kernel (compiled with numba if installed)
+def rhs(nx,ny,dx,dy,re,w,s,isolver):
+    if isolver == 4:
+        return rhs_arakawa_fused(nx,ny,dx,dy,re,w,s,r,1)
+    return rhs_arakawa(nx,ny,dx,dy,re,w,s)
 
 #%%
 # set the initial condition based on the problem selected
@@ -482,34 +428,34 @@ bb = 2.0/3.0
 clock_time_init = tm.time()
 for k in range(1,nt+1):
     time = time + dt
-    r = rhs(nx,ny,dx,dy,re,w,s)
+    r = rhs(nx,ny,dx,dy,re,w,s,isolver)
     
     #stage-1
     t[1:nx+2,1:ny+2] = w[1:nx+2,1:ny+2] + dt*r[1:nx+2,1:ny+2]
     
     t = bc(nx,ny,t)
     
-    s = fps(nx, ny, dx, dy, -t)
+    s = fps(nx, ny, dx, dy, -t, s)
     s = bc(nx,ny,s)
     
-    r = rhs(nx,ny,dx,dy,re,t,s)
+    r = rhs(nx,ny,dx,dy,re,t,s,isolver)
     
     #stage-2
     t[1:nx+2,1:ny+2] = 0.75*w[1:nx+2,1:ny+2] + 0.25*t[1:nx+2,1:ny+2] + 0.25*dt*r[1:nx+2,1:ny+2]
     
     t = bc(nx,ny,t)
     
-    s = fps(nx, ny, dx, dy, -t)
+    s = fps(nx, ny, dx, dy, -t, s)
     s = bc(nx,ny,s)
     
-    r = rhs(nx,ny,dx,dy,re,t,s)
+    r = rhs(nx,ny,dx,dy,re,t,s,isolver)
     
     #stage-3
     w[1:nx+2,1:ny+2] = aa*w[1:nx+2,1:ny+2] + bb*t[1:nx+2,1:ny+2] + bb*dt*r[1:nx+2,1:ny+2]
     
     w = bc(nx,ny,w)
     
-    s = fps(nx, ny, dx, dy, -w)
+    s = fps(nx, ny, dx, dy, -w, s)
     s = bc(nx,ny,s)
     
     if (k%freq == 0):
@@ -521,6 +467,8 @@ for k in range(1,nt+1):
 total_clock_time = tm.time() - clock_time_init
 print('Total clock time=', total_clock_time)
 
+save_wisdom()
+
 if (ipr == 1):
     we = exact_tgv(nx,ny,x,y,time,re)
 
@@ -539,44 +487,17 @@ if (ipr == 3):
 
 #%%
 # contour plot for initial and final vorticity
-fig, axs = plt.subplots(1,2,sharey=True,figsize=(9,5))
-
-cs = axs[0].contourf(w0[1:nx+2,1:ny+2].T, 120, cmap = 'jet', interpolation='bilinear')
-axs[0].text(0.4, -0.1, '$t = 0.0$', transform=axs[0].transAxes, fontsize=16, fontweight='bold', va='top')
-cs = axs[1].contourf(w[1:nx+2,1:ny+2].T, 120, cmap = 'jet', interpolation='bilinear')
-axs[1].text(0.4, -0.1, '$t = '+str(dt*nt)+'$', transform=axs[1].transAxes, fontsize=16, fontweight='bold', va='top')
-
-fig.tight_layout() 
-
-fig.subplots_adjust(bottom=0.15)
-
-cbar_ax = fig.add_axes([0.22, -0.05, 0.6, 0.04])
-fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
-plt.show()
-
-fig.savefig("field_fdm.png", bbox_inches = 'tight')
-
+add_plot(manifest,'field',"field_fdm.png",{'w0':w0[1:nx+2,1:ny+2], 'w':w[1:nx+2,1:ny+2]},{'time':float(dt*nt)})
 
 #%%
 if (ipr == 3):
     en_s = np.loadtxt("spectral/energy_spectral_"+str(nd)+"_"+str(int(re))+".csv") 
-    fig, ax = plt.subplots()
-    fig.set_size_inches(7,5)
-    
-    line = 100*k**(-3.0)
-    
-    ax.loglog(k,ese[:],'k', lw = 2, label='Exact')
-    ax.loglog(k,en0[1:],'r', ls = '--', lw = 2, label='$t = 0.0$')
-    ax.loglog(k,en[1:], 'b', lw = 2, label = '$t = '+str(dt*nt)+'$')
-    ax.loglog(k,en_s[1:], 'y', lw = 2, label = '$t = '+str(dt*nt)+'$'+' spectral 1024')
-    ax.loglog(k,line, 'g--', lw = 2, label = 'k^-3')
-    
-    
-    plt.xlabel('$K$')
-    plt.ylabel('$E(K)$')
-    plt.legend(loc=0)
-    plt.ylim(1e-19,1e-1)
-    fig.savefig('es_fdm.png', bbox_inches = 'tight', pad_inches = 0)
-    
+    add_plot(manifest,'spectrum','es_fdm.png',{'k':k, 'ese':ese, 'en0':en0, 'en':en, 'en_ref':en_s},
+             {'time':float(dt*nt), 'label_ref':'$t = '+str(dt*nt)+'$'+' spectral 1024', 'ylim':[1e-19,1e-1]})
 
-    
+#%%
+# iplot = 0: headless, the manifest is rendered later
+# (python ../solver_spectral/render_plots.py plot_manifest.jsonl)
+if iplot == 1:
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),'..',
+                    'solver_spectral','render_plots.py'), manifest])
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:37 2026
+
+FFTW threads, planner effort and wisdom, the fast Poisson solver and the Arakawa
+right hand side kernel shared by the finite difference solvers. numba is optional.
+
+"""
+import numpy as np
+import pyfftw
+import os
+import json
+import pickle
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#%%
+# number of threads and planner effort for every FFTW object, set by init_fftw
+planner_flags = {0: 'FFTW_ESTIMATE', 1: 'FFTW_MEASURE', 2: 'FFTW_PATIENT'}
+fftw_options = {'threads': 1, 'flags': ('FFTW_MEASURE',)}
+
+def wisdom_file():
+
+    '''
+    name of the file holding the FFTW wisdom of this machine
+
+    Output
+    ------
+    filename : ~/.fftw_wisdom/wisdom_<hostname>.pkl
+    '''
+
+    return os.path.join(os.path.expanduser('~'), '.fftw_wisdom',
+                        'wisdom_'+socket.gethostname()+'.pkl')
+
+#%%
+def init_fftw(threads=1, iplan=1, filename=None):
+
+    '''
+    set the number of threads and the planner effort of all FFTW objects and import
+    the wisdom saved by earlier runs, so that repeated plans at the same resolution
+    are created without measuring again
+
+    Inputs
+    ------
+    threads : number of threads used by each transform
+    iplan : planner effort [0]FFTW_ESTIMATE, [1]FFTW_MEASURE, [2]FFTW_PATIENT
+    filename : wisdom file (default: wisdom_file())
+    '''
+
+    fftw_options['threads'] = int(threads)
+    fftw_options['flags'] = (planner_flags[int(iplan)],)
+
+    if filename is None:
+        filename = wisdom_file()
+
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            pyfftw.import_wisdom(pickle.load(f))
+
+#%%
+def save_wisdom(filename=None):
+
+    '''
+    export the FFTW wisdom accumulated in this run to the wisdom file
+
+    Inputs
+    ------
+    filename : wisdom file (default: wisdom_file())
+    '''
+
+    if filename is None:
+        filename = wisdom_file()
+
+    folder = os.path.dirname(filename)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    with open(filename, 'wb') as f:
+        pickle.dump(pyfftw.export_wisdom(), f)
+
+#%%
+def add_plot(manifest, kind, filename, arrays, args=None):
+
+    '''
+    store the data of a figure in a .npz file next to the image and append the figure
+    to the plot manifest, which is rendered by render_plots.py (the solver itself
+    does no figure work). Each line of the manifest is a JSON object with the kind of
+    figure, the image and data files (relative to the manifest) and the scalar arguments
+
+    Inputs
+    ------
+    manifest : name of the manifest file (JSON lines)
+    kind : kind of figure, a plotting function of render_plots.py
+    filename : name of the image file
+    arrays : dict of the arrays plotted
+    args : dict of the scalar arguments of the plotting function
+    '''
+
+    root = os.path.dirname(manifest) or '.'
+    os.makedirs(root, exist_ok=True)
+
+    data = os.path.splitext(filename)[0]+'.npz'
+    np.savez(data, **arrays)
+
+    entry = {'kind': kind,
+             'filename': os.path.relpath(filename, root),
+             'data': os.path.relpath(data, root),
+             'args': {} if args is None else args}
+
+    with open(manifest, 'a') as f:
+        f.write(json.dumps(entry)+'\n')
+
+#%%
+# shell index of the energy spectrum for every grid used
+spectrum_shells = {}
+
+def shell_index(nx,ny):
+
+    '''
+    shell of every wavenumber of the (nx,ny) grid for the energy spectrum. Shell k
+    holds the wavenumbers k-0.5 < |k| < k+0.5 (k = 1,...,n), the kx = 0 row, the
+    ky = 0 column and |k| > n+0.5 go to the discarded shell n+1. Computed once per grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+
+    Output
+    ------
+    index : shell index of the flattened (nx,ny) spectrum
+    counts : number of wavenumbers in each shell (n+2)
+    ikk : 1/|k| (nx,ny)
+    n : maximum wavenumber
+    '''
+
+    key = (nx,ny)
+    if key in spectrum_shells:
+        return spectrum_shells[key]
+
+    epsilon = 1.0e-6
+
+    kx = np.fft.fftfreq(nx,1/nx)
+    ky = np.fft.fftfreq(ny,1/ny)
+    kx[0] = epsilon
+    ky[0] = epsilon
+
+    kk = np.sqrt(kx.reshape(nx,1)**2 + ky.reshape(1,ny)**2)
+
+    n = int(np.sqrt(nx*nx + ny*ny)/2.0)-1
+
+    index = np.rint(kk).astype(np.int64)
+    index[index > n] = n+1
+    index[0,:] = n+1
+    index[:,0] = n+1
+    index = index.ravel()
+
+    counts = np.bincount(index, minlength=n+2)
+
+    spectrum_shells[key] = (index, counts, 1.0/kk, n)
+
+    return spectrum_shells[key]
+
+#%%
+def shell_spectrum(nx,ny,wf):
+
+    '''
+    energy spectrum from the vorticity in frequency domain, the shell sums of
+    pi*|wf|^2/|k| of all snapshots are computed by a single bincount
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    wf : vorticity field in frequency domain (full spectrum), (nx,ny) or a batch
+         of snapshots (nb,nx,ny)
+
+    Output
+    ------
+    en : energy spectrum (n+1) or (nb,n+1), en[0] = 0
+    n : maximum wavenumber
+    '''
+
+    index, counts, ikk, n = shell_index(nx,ny)
+
+    es = np.pi*((np.abs(wf)/(nx*ny))**2)*ikk
+    nb = es.size//(nx*ny)
+
+    # snapshot b uses the bins b*(n+2),...,b*(n+2)+n+1
+    bins = (index + (n+2)*np.arange(nb).reshape(nb,1)).ravel()
+    es = np.bincount(bins, weights=es.ravel(), minlength=nb*(n+2)).reshape(nb,n+2)
+
+    en = np.zeros((nb,n+1))
+    en[:,1:] = es[:,1:n+1]/counts[1:n+1]
+
+    return en.reshape(wf.shape[:-2]+(n+1,)), n
+
+#%%
+# fast Poisson solver of every grid used, built at its first solve (see poisson_solver)
+poisson_solvers = {}
+
+class PoissonFPS:
+
+    '''
+    fast Poisson solver of the second-order central difference Laplacian on the
+    periodic (nx,ny) grid. The eigenvalues aa + bb*cos(kx) + cc*cos(ky) of the
+    discrete Laplacian (and their reciprocal) and the forward and inverse FFTW
+    plans are computed once, a solve is two transforms and one multiplication.
+    The real-to-complex transforms read the interior of the source term and write
+    the interior of the solution in place, without copies of the fields
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    dx,dy : grid spacing in x and y direction
+    ng : number of ghost nodes on each side of the fields, the interior points are
+         f[ng:nx+ng,ng:ny+ng]
+    '''
+
+    def __init__(self, nx, ny, dx, dy, ng=1):
+
+        self.nx, self.ny, self.ng = nx, ny, ng
+
+        epsilon = 1.0e-6
+        aa = -2.0/(dx*dx) - 2.0/(dy*dy)
+        bb = 2.0/(dx*dx)
+        cc = 2.0/(dy*dy)
+        hx = 2.0*np.pi/np.float64(nx)
+        hy = 2.0*np.pi/np.float64(ny)
+
+        kx = hx*np.float64(np.arange(0, nx))
+        ky = hy*np.float64(np.arange(0, ny))
+
+        kx[0] = epsilon
+        ky[0] = epsilon
+
+        kx, ky = np.meshgrid(np.cos(kx), np.cos(ky), indexing='ij')
+
+        self.den = aa + bb*kx + cc*ky
+
+        # half spectrum of the real transforms, the normalization of the inverse
+        # transform is included and the zero wavenumber is set to zero (solution
+        # with zero mean)
+        self.rden = (1.0/self.den[:,0:int(ny/2)+1])/(nx*ny)
+        self.rden[0,0] = 0.0
+
+        # the transforms are planned on the interior of fields with ghost nodes
+        # (not aligned in memory) and applied to the fields of each solve
+        self.shape = (nx+2*ng+1,ny+2*ng+1)
+        self.interior = np.s_[ng:nx+ng,ng:ny+ng]
+        flags = fftw_options['flags'] + ('FFTW_UNALIGNED',)
+
+        f = pyfftw.empty_aligned(self.shape,dtype= 'float64')
+        u = pyfftw.empty_aligned(self.shape,dtype= 'float64')
+        self.b = pyfftw.empty_aligned((nx,int(ny/2)+1),dtype= 'complex128')
+
+        self.fft_object = pyfftw.FFTW(f[self.interior], self.b, axes = (0,1), direction = 'FFTW_FORWARD',
+                                      flags = flags, threads = fftw_options['threads'])
+        self.fft_object_inv = pyfftw.FFTW(self.b, u[self.interior], axes = (0,1), direction = 'FFTW_BACKWARD',
+                                          flags = flags, threads = fftw_options['threads'])
+
+    def solve(self, f, u=None):
+
+        '''
+        solution of laplacian(u) = f
+
+        Inputs
+        ------
+        f : source term [nx+2*ng+1 X ny+2*ng+1] (including ghost nodes)
+        u : array for the solution (default: a new array)
+
+        Output
+        ------
+        u : solution field [nx+2*ng+1 X ny+2*ng+1], the ghost nodes outside the
+            periodic boundaries are not set
+        '''
+
+        nx, ny, ng = self.nx, self.ny, self.ng
+
+        f = np.ascontiguousarray(f, dtype=np.float64)
+        if u is None:
+            u = np.empty(self.shape)
+
+        self.fft_object.update_arrays(f[self.interior], self.b)
+        self.fft_object.execute()
+
+        self.b *= self.rden
+
+        # the inverse real transform overwrites b
+        self.fft_object_inv.update_arrays(self.b, u[self.interior])
+        self.fft_object_inv.execute()
+
+        #periodicity
+        u[:,ny+ng] = u[:,ng]
+        u[nx+ng,:] = u[ng,:]
+
+        return u
+
+def poisson_solver(nx, ny, dx, dy, ng=1):
+
+    '''
+    fast Poisson solver of the (nx,ny) grid, created once per grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    dx,dy : grid spacing in x and y direction
+    ng : number of ghost nodes on each side of the fields
+
+    Output
+    ------
+    solver : PoissonFPS object
+    '''
+
+    key = (nx,ny,dx,dy,ng)
+    if key not in poisson_solvers:
+        poisson_solvers[key] = PoissonFPS(nx,ny,dx,dy,ng)
+
+    return poisson_solvers[key]
+
+#%%
+# number of threads and tile size (rows, columns) of the stencil kernels, set by
+# init_kernel. A tile of the fields (about 0.4 MB) stays in the L2 cache
+kernel_options = {'threads': 1, 'tile': (32, 512)}
+kernel_pool = {}
+
+def init_kernel(threads=1, tile=None):
+
+    '''
+    set the number of threads and the tile size of the stencil kernels. With
+    numba the tiles run in parallel on numba threads (at most NUMBA_NUM_THREADS),
+    otherwise bands of rows of the NumPy version run on a thread pool (NumPy
+    releases the GIL in the array operations)
+
+    Inputs
+    ------
+    threads : number of threads used by each kernel call
+    tile : number of rows and columns of a tile (default: unchanged)
+    '''
+
+    threads = int(threads)
+
+    kernel_options['threads'] = threads
+    if tile is not None:
+        kernel_options['tile'] = (int(tile[0]), int(tile[1]))
+
+    if numba is not None:
+        numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+    elif threads > 1 and threads not in kernel_pool:
+        kernel_pool[threads] = ThreadPoolExecutor(threads)
+
+#%%
+def arakawa_block(ib,ie,jb,je,aa,bb,gg,hh,re,w,s,ev,iev,ng,f):
+
+    '''
+    -jac + lap/re (+ ev*lap) point by point on the block (ib:ie,jb:je) of the
+    grid, with the same operations as the sliced NumPy version (arakawa_rows)
+    '''
+
+    for i in range(ib,ie):
+        for j in range(jb,je):
+            j1 = gg*( (w[i+1,j]-w[i-1,j])*(s[i,j+1]-s[i,j-1]) \
+                     -(w[i,j+1]-w[i,j-1])*(s[i+1,j]-s[i-1,j]))
+
+            j2 = gg*( w[i+1,j]*(s[i+1,j+1]-s[i+1,j-1]) \
+                    - w[i-1,j]*(s[i-1,j+1]-s[i-1,j-1]) \
+                    - w[i,j+1]*(s[i+1,j+1]-s[i-1,j+1]) \
+                    + w[i,j-1]*(s[i+1,j-1]-s[i-1,j-1]))
+
+            j3 = gg*( w[i+1,j+1]*(s[i,j+1]-s[i+1,j]) \
+                    - w[i-1,j-1]*(s[i-1,j]-s[i,j-1]) \
+                    - w[i-1,j+1]*(s[i,j+1]-s[i-1,j]) \
+                    + w[i+1,j-1]*(s[i+1,j]-s[i,j-1]) )
+
+            jac = (j1+j2+j3)*hh
+
+            lap = aa*(w[i+1,j]-2.0*w[i,j]+w[i-1,j]) \
+                + bb*(w[i,j+1]-2.0*w[i,j]+w[i,j-1])
+
+            if iev:
+                f[i,j] = -jac + lap/re + ev[i-ng,j-ng]*lap
+            else:
+                f[i,j] = -jac + lap/re
+
+def arakawa_tiles(nx,ny,ng,aa,bb,gg,hh,re,w,s,ev,iev,f,bi,bj):
+
+    '''
+    all physical domain points (ng:nx+ng+1,ng:ny+ng+1) split in tiles of bi X bj
+    points, the tiles are distributed over the numba threads
+    '''
+
+    ni = (nx+bi)//bi
+    nj = (ny+bj)//bj
+
+    for t in numba.prange(ni*nj):
+        i0 = ng + (t//nj)*bi
+        j0 = ng + (t%nj)*bj
+        arakawa_block(i0,min(i0+bi,nx+ng+1),j0,min(j0+bj,ny+ng+1),
+                      aa,bb,gg,hh,re,w,s,ev,iev,ng,f)
+
+# compiled once per session (and cached on disk) if numba is installed
+if numba is not None:
+    arakawa_block = numba.njit(cache=True)(arakawa_block)
+    arakawa_tiles = numba.njit(parallel=True, cache=True)(arakawa_tiles)
+
+def arakawa_rows(i0,i1,ny,aa,bb,gg,hh,re,w,s,ev,ng,f):
+
+    '''
+    -jac + lap/re (+ ev*lap) on the rows i0,...,i1-1 of the physical domain with
+    sliced NumPy arrays (fallback without numba)
+    '''
+
+    # rows of the band with a single ghost node
+    mx = i1-i0-1
+    w = w[i0-1:i1+1,ng-1:ny+ng+2]
+    s = s[i0-1:i1+1,ng-1:ny+ng+2]
+
+    #Arakawa
+    j1 = gg*( (w[2:mx+3,1:ny+2]-w[0:mx+1,1:ny+2])*(s[1:mx+2,2:ny+3]-s[1:mx+2,0:ny+1]) \
+             -(w[1:mx+2,2:ny+3]-w[1:mx+2,0:ny+1])*(s[2:mx+3,1:ny+2]-s[0:mx+1,1:ny+2]))
+
+    j2 = gg*( w[2:mx+3,1:ny+2]*(s[2:mx+3,2:ny+3]-s[2:mx+3,0:ny+1]) \
+            - w[0:mx+1,1:ny+2]*(s[0:mx+1,2:ny+3]-s[0:mx+1,0:ny+1]) \
+            - w[1:mx+2,2:ny+3]*(s[2:mx+3,2:ny+3]-s[0:mx+1,2:ny+3]) \
+            + w[1:mx+2,0:ny+1]*(s[2:mx+3,0:ny+1]-s[0:mx+1,0:ny+1]))
+
+    j3 = gg*( w[2:mx+3,2:ny+3]*(s[1:mx+2,2:ny+3]-s[2:mx+3,1:ny+2]) \
+            - w[0:mx+1,0:ny+1]*(s[0:mx+1,1:ny+2]-s[1:mx+2,0:ny+1]) \
+            - w[0:mx+1,2:ny+3]*(s[1:mx+2,2:ny+3]-s[0:mx+1,1:ny+2]) \
+            + w[2:mx+3,0:ny+1]*(s[2:mx+3,1:ny+2]-s[1:mx+2,0:ny+1]) )
+
+    jac = (j1+j2+j3)*hh
+
+    lap = aa*(w[2:mx+3,1:ny+2]-2.0*w[1:mx+2,1:ny+2]+w[0:mx+1,1:ny+2]) \
+        + bb*(w[1:mx+2,2:ny+3]-2.0*w[1:mx+2,1:ny+2]+w[1:mx+2,0:ny+1])
+
+    if ev is None:
+        f[i0:i1,ng:ny+ng+1] = -jac + lap/re
+    else:
+        f[i0:i1,ng:ny+ng+1] = -jac + lap/re + ev[i0-ng:i1-ng,:]*lap
+
+def rhs_arakawa_fused(nx,ny,dx,dy,re,w,s,f=None,ng=1,ev=None):
+
+    '''
+    right hand side -jac + lap/re of the vorticity equation with the Arakawa
+    scheme for the Jacobian and central differences for the Laplacian, computed
+    at all physical domain points (ng:nx+ng+1,ng:ny+ng+1) into a preallocated
+    array. With numba the Jacobian and Laplacian are fused in a single compiled
+    pass over cache-sized tiles, run in parallel on kernel_options['threads']
+    threads (see init_kernel); otherwise the sliced NumPy version runs on bands
+    of rows
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    dx,dy : grid spacing in x and y direction
+    re : Reynolds number
+    w : vorticity field (including ng ghost nodes on each side)
+    s : streamfunction field (including ng ghost nodes on each side)
+    f : array for the right hand side, same shape as w (default: a new array),
+        the ghost nodes are not set
+    ng : number of ghost nodes on each side of the fields
+    ev : eddy viscosity [nx+1 X ny+1], adds ev*lap for the LES (default: none)
+
+    Output
+    ------
+    f : right hand side
+    '''
+
+    aa = 1.0/(dx*dx)
+    bb = 1.0/(dy*dy)
+    gg = 1.0/(4.0*dx*dy)
+    hh = 1.0/3.0
+
+    if f is None:
+        f = np.zeros(w.shape)
+
+    if numba is not None:
+        bi, bj = kernel_options['tile']
+        if ev is None:
+            arakawa_tiles(nx,ny,ng,aa,bb,gg,hh,re,w,s,np.zeros((1,1)),False,f,bi,bj)
+        else:
+            arakawa_tiles(nx,ny,ng,aa,bb,gg,hh,re,w,s,ev,True,f,bi,bj)
+        return f
+
+    threads = kernel_options['threads']
+    if threads == 1 or threads not in kernel_pool:
+        arakawa_rows(ng,nx+ng+1,ny,aa,bb,gg,hh,re,w,s,ev,ng,f)
+        return f
+
+    # one band of rows per thread
+    rows = np.linspace(ng,nx+ng+1,threads+1).astype(int)
+    jobs = [kernel_pool[threads].submit(arakawa_rows,rows[k],rows[k+1],ny,aa,bb,gg,hh,re,w,s,ev,ng,f)
+            for k in range(threads) if rows[k+1] > rows[k]]
+    for job in jobs:
+        job.result()
+
+    return f
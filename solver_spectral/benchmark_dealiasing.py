@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:48:12 2026
+
+Cost and accuracy of the two dealiasing modes of the pseudo-spectral solver: 3/2
+padding (idealias = 1) against the 2/3 rule on the native grid (idealias = 2). The
+same decaying turbulence field is advanced by nt steps of the hybrid RK3/CN scheme
+in both modes and the clock time per step, the difference of the Jacobian of the
+initial field and the difference of the final energy spectrum and vorticity are
+reported for every resolution.
+
+"""
+
+import numpy as np
+from numpy.random import seed
+seed(1)
+import matplotlib.pyplot as plt
+import time as tm
+
+from utils import *
+
+font = {'family' : 'Times New Roman',
+        'size'   : 14}
+plt.rc('font', **font)
+
+#%%
+def decay(nx,ny):
+
+    '''
+    random-phase vorticity field with the energy spectrum of the DHIT initial
+    condition (k0 = 10)
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+
+    Output
+    ------
+    w : vorticity field (excluding periodic boundaries)
+    '''
+
+    kx, ky, k2 = wavenumbers(nx,ny)
+    kk = np.sqrt(k2)
+
+    k0 = 10.0
+    c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))
+    es = c*(kk**4)*np.exp(-(kk/k0)**2)
+
+    wf = np.sqrt(kk*es/np.pi)*np.exp(2.0j*np.pi*np.random.random_sample((nx,ny)))*(nx*ny)
+    wf[0,0] = 0.0
+
+    return np.real(np.fft.ifft2(wf))
+
+#%%
+def run(solver,w,nt):
+
+    '''
+    advance w by nt steps with the given stepper
+
+    Inputs
+    ------
+    solver : SpectralDHIT object
+    w : initial vorticity field
+    nt : number of time steps
+
+    Output
+    ------
+    jf : Jacobian of the initial field in frequency domain
+    wf : final vorticity field in frequency domain (full spectrum)
+    cpu : clock time per time step
+    '''
+
+    solver.set_vorticity(w)
+    jf = np.copy(solver.solution_jacobian())
+
+    clock_time_init = tm.time()
+    for n in range(nt):
+        solver.step()
+    cpu = (tm.time() - clock_time_init)/nt
+
+    wf = np.fft.fft2(np.fft.irfft2(solver.wnf, s=(solver.nx,solver.ny)))
+
+    return jf, wf, cpu
+
+#%%
+sizes = [512, 1024, 2048, 4096]
+nt = 10
+re = 8000.0
+dt = 5.0e-4
+modes = [('3/2 padding', 1), ('2/3 rule', 2)]
+
+init_fftw(1,1)
+
+results = []
+print('%6s %14s %14s %10s %12s %12s %12s' % ('nx', '3/2 (s/step)', '2/3 (s/step)', 'speedup',
+                                             'jacobian', 'spectrum', 'vorticity'))
+for nx in sizes:
+    w0 = decay(nx,nx)
+
+    out = []
+    for name, dealias in modes:
+        out.append(run(SpectralDHIT(nx,nx,re,dt,True,0,0,False,dealias),w0,nt))
+    (jf1, wf1, cpu1), (jf2, wf2, cpu2) = out
+
+    # Jacobian of the initial field on the modes kept by the 2/3 rule (both modes
+    # are exact there for a field without energy above nx/3)
+    mask = grid_operators(nx,nx,True).mask
+    ej = np.max(np.abs(jf1 - jf2)*mask)/np.max(np.abs(jf1)*mask)
+
+    # energy spectrum of the final field below the 2/3-rule cutoff, relative to its 
+    # peak (the far tail is at round-off level)
+    en1, n = shell_spectrum(nx,nx,wf1)
+    en2, n = shell_spectrum(nx,nx,wf2)
+    kc = int(nx/3)
+    es = np.max(np.abs(en1[1:kc] - en2[1:kc]))/np.max(en1)
+
+    # final vorticity
+    ew = np.linalg.norm(wf1 - wf2)/np.linalg.norm(wf1)
+
+    results.append([nx, cpu1, cpu2, cpu1/cpu2, ej, es, ew])
+    print('%6d %14.4e %14.4e %10.2f %12.4e %12.4e %12.4e' % tuple(results[-1]))
+
+save_wisdom()
+
+results = np.array(results)
+np.savetxt('benchmark_dealiasing.csv', results, delimiter=',',
+           header='nx, time per step 3/2 (s), time per step 2/3 (s), speedup, '
+                  'jacobian difference, spectrum difference (k < nx/3, over its peak), vorticity difference')
+
+#%%
+# clock time per step and differences between the modes against the resolution
+fig, axs = plt.subplots(1,2,figsize=(11,4.5))
+
+for (name, dealias), c in zip(modes, ['r','b']):
+    axs[0].loglog(results[:,0], results[:,dealias], c+'o-', lw = 2, label = name)
+axs[0].set_xlabel('$N$')
+axs[0].set_ylabel('Clock time per step (s)')
+axs[0].legend(loc=0)
+
+for j, label, c in zip([4,5,6], ['Jacobian', 'Energy spectrum', 'Vorticity'], ['k','g','m']):
+    axs[1].loglog(results[:,0], np.maximum(results[:,j],1.0e-16), c+'o-', lw = 2, label = label)
+axs[1].set_xlabel('$N$')
+axs[1].set_ylabel('Relative difference')
+axs[1].legend(loc=0)
+
+fig.tight_layout()
+plt.show()
+fig.savefig('benchmark_dealiasing.png', bbox_inches = 'tight')
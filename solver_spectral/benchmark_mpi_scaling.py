@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:31:05 2026
+
+Strong scaling of the distributed pseudo-spectral solver (SpectralDHITMPI): the
+same nx X ny problem is advanced by nt time steps of the hybrid RK3/CN scheme on
+an increasing number of MPI ranks, and the clock time per step, speedup and
+parallel efficiency against one rank are reported. Run as
+
+    python benchmark_mpi_scaling.py
+
+which starts one mpirun per rank count. Each run executes this script in worker
+mode (python benchmark_mpi_scaling.py worker <nx> <nt>) and prints its timing.
+
+"""
+
+import numpy as np
+import sys
+import os
+import subprocess
+import time as tm
+
+from utils import *
+
+#%%
+def worker(nx,nt):
+
+    '''
+    time nt steps of the distributed solver on the Taylor-Green vortex (the cost of
+    a step does not depend on the field), printed by the first rank as
+    'TIME <ranks> <seconds per step> <memory per rank in MB>'
+
+    Inputs
+    ------
+    nx : number of grid points in x and y direction
+    nt : number of time steps
+    '''
+
+    # MPI is only initialized in the worker runs, the launcher starts mpirun
+    from mpi4py import MPI
+
+    comm = MPI.COMM_WORLD
+    init_fftw(1,1)
+
+    solver = SpectralDHITMPI(nx,nx,1000.0,1.0e-4,comm)
+
+    x = np.linspace(0.0,2.0*np.pi,nx+1)[solver.fft.rows]
+    y = np.linspace(0.0,2.0*np.pi,nx+1)[0:nx]
+    x, y = np.meshgrid(x, y, indexing='ij')
+    solver.set_vorticity(8.0*np.cos(4.0*x)*np.cos(4.0*y))
+
+    solver.step() # first Jacobian of the run
+
+    comm.Barrier()
+    clock_time_init = tm.time()
+    for n in range(nt):
+        solver.step()
+    comm.Barrier()
+    cpu = (tm.time() - clock_time_init)/nt
+
+    if comm.rank == 0:
+        save_wisdom()
+        print('TIME', comm.size, cpu, solver.memory()/1.0e6)
+
+if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+    worker(int(sys.argv[2]),int(sys.argv[3]))
+    sys.exit()
+
+#%%
+import matplotlib.pyplot as plt
+
+font = {'family' : 'Times New Roman',
+        'size'   : 14}
+plt.rc('font', **font)
+
+nx = 1024
+nt = 20
+mpirun = ['mpirun', '-n'] # launcher of the MPI runs
+
+# rank counts dividing nx and 3nx/2, up to the number of cores
+ranks = [p for p in (1, 2, 4, 8, 16, 32, 64) if p <= os.cpu_count() and nx%p == 0]
+
+results = []
+print('%6s %14s %10s %12s %14s' % ('ranks', 'time/step (s)', 'speedup', 'efficiency', 'memory (MB)'))
+for p in ranks:
+    run = subprocess.run(mpirun + [str(p), sys.executable, os.path.abspath(__file__),
+                                   'worker', str(nx), str(nt)],
+                         capture_output=True, text=True)
+    line = [l for l in run.stdout.splitlines() if l.startswith('TIME')]
+    if run.returncode != 0 or not line:
+        print('run on', p, 'ranks failed:', run.stderr)
+        continue
+    cpu, mb = np.float64(line[0].split()[2:4])
+    p0, cpu0 = (results[0][0], results[0][1]) if results else (p, cpu)
+    results.append([p, cpu, cpu0/cpu, (cpu0/cpu)/(p/p0), mb])
+    print('%6d %14.4e %10.2f %12.2f %14.1f' % tuple(results[-1]))
+
+results = np.array(results)
+np.savetxt('benchmark_mpi_scaling_'+str(nx)+'.csv', results, delimiter=',',
+           header='ranks, time per step (s), speedup, efficiency, memory per rank (MB)')
+
+#%%
+# speedup against the number of ranks
+fig, ax = plt.subplots(figsize=(6,5))
+
+ax.loglog(results[:,0], results[:,2], 'bo-', lw = 2, label = str(nx)+r'$\times$'+str(nx))
+ax.loglog(results[:,0], results[:,0]/results[0,0], 'k--', lw = 2, label = 'Ideal')
+ax.set_xlabel('Number of ranks')
+ax.set_ylabel('Speedup')
+ax.legend(loc=0)
+
+fig.tight_layout()
+plt.show()
+fig.savefig('benchmark_mpi_scaling_'+str(nx)+'.png', bbox_inches = 'tight')
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:05:41 2026
+
+Cost-to-accuracy of the time integrators of the pseudo-spectral solver: hybrid
+third-order Runge-Kutta implicit Crank-Nicolson (isolver = 1) against ETDRK4
+(isolver = 2). The Taylor-Green vortex is compared with its exact solution, the
+decaying turbulence field with a RK3/CN reference run at a 20 times smaller step.
+
+"""
+
+import numpy as np
+from numpy.random import seed
+seed(1)
+import matplotlib.pyplot as plt
+import time as tm
+
+from utils import *
+
+font = {'family' : 'Times New Roman',
+        'size'   : 14}
+plt.rc('font', **font)
+
+#%%
+def tgv(nx,ny,time,re):
+
+    '''
+    exact solution for TGV problem (excluding periodic boundaries)
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    time : time at which the exact solution is to be computed
+    re : Reynolds number
+
+    Output
+    ------
+    w : vorticity for TGV problem
+    '''
+
+    x = np.linspace(0.0,2.0*np.pi,nx+1)[0:nx]
+    y = np.linspace(0.0,2.0*np.pi,ny+1)[0:ny]
+    x, y = np.meshgrid(x, y, indexing='ij')
+
+    nq = 4.0
+    w = 2.0*nq*np.cos(nq*x)*np.cos(nq*y)*np.exp(-2.0*nq*nq*time/re)
+
+    return w
+
+#%%
+def decay(nx,ny):
+
+    '''
+    random-phase vorticity field with the energy spectrum of the DHIT initial
+    condition (k0 = 10)
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+
+    Output
+    ------
+    w : vorticity field (excluding periodic boundaries)
+    '''
+
+    kx, ky, k2 = wavenumbers(nx,ny)
+    kk = np.sqrt(k2)
+
+    k0 = 10.0
+    c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))
+    es = c*(kk**4)*np.exp(-(kk/k0)**2)
+
+    wf = np.sqrt(kk*es/np.pi)*np.exp(2.0j*np.pi*np.random.random_sample((nx,ny)))*(nx*ny)
+    wf[0,0] = 0.0
+
+    return np.real(np.fft.ifft2(wf))
+
+#%%
+def run(solver,w,tend):
+
+    '''
+    integrate w up to tend with the given stepper
+
+    Inputs
+    ------
+    solver : SpectralDHIT or SpectralETDRK4 object
+    w : initial vorticity field
+    tend : final time (multiple of the time step)
+
+    Output
+    ------
+    w : final vorticity field
+    cpu : clock time of the time integration
+    '''
+
+    solver.set_vorticity(w)
+    nt = int(round(tend/solver.dt))
+
+    clock_time_init = tm.time()
+    for n in range(nt):
+        solver.step()
+    cpu = tm.time() - clock_time_init
+
+    return np.real(np.fft.ifft2(solver.wnf)), cpu
+
+#%%
+nx = 128
+ny = 128
+tend = 0.4
+dts = [2.0e-2, 1.0e-2, 5.0e-3, 2.5e-3, 1.25e-3]
+schemes = [('RK3/CN', SpectralDHIT), ('ETDRK4', SpectralETDRK4)]
+
+cases = {}
+
+# Taylor-Green vortex, the nonlinear term vanishes and the error is that of the
+# viscous term alone
+re = 100.0
+w0 = tgv(nx,ny,0.0,re)
+we = tgv(nx,ny,tend,re)
+cases['TGV'] = (re, w0, we)
+
+# decaying turbulence, reference with RK3/CN at dt/20
+re = 1000.0
+w0 = decay(nx,ny)
+we, cpu = run(SpectralDHIT(nx,ny,re,dts[-1]/20,False,1),w0,tend)
+cases['DHIT'] = (re, w0, we)
+
+results = {}
+print('%-6s %-8s %10s %12s %12s' % ('case', 'scheme', 'dt', 'cpu (s)', 'error'))
+for case, (re, w0, we) in cases.items():
+    for name, stepper in schemes:
+        results[(case,name)] = []
+        for dt in dts:
+            w, cpu = run(stepper(nx,ny,re,dt,False,1),w0,tend)
+            error = np.max(np.abs(w - we))/np.max(np.abs(we))
+            results[(case,name)].append((dt, cpu, error))
+            print('%-6s %-8s %10.2e %12.4e %12.4e' % (case, name, dt, cpu, error))
+
+np.savetxt('benchmark_time_integrators.csv',
+           np.array([[i, j, dt, cpu, error] for i, case in enumerate(cases)
+                     for j, (name, stepper) in enumerate(schemes)
+                     for dt, cpu, error in results[(case,name)]]),
+           delimiter=',', header='case [0]TGV [1]DHIT, scheme [0]RK3/CN [1]ETDRK4, dt, cpu, error')
+
+#%%
+# relative error against clock time
+fig, axs = plt.subplots(1,2,figsize=(11,4.5))
+
+for ax, case in zip(axs, cases):
+    for (name, stepper), c in zip(schemes, ['r','b']):
+        r = np.array(results[(case,name)])
+        ax.loglog(r[:,1], np.maximum(r[:,2],1.0e-16), c+'o-', lw = 2, label = name)
+    ax.set_xlabel('Clock time (s)')
+    ax.set_ylabel('Relative error')
+    ax.set_title(case)
+    ax.legend(loc=0)
+
+fig.tight_layout()
+plt.show()
+fig.savefig('benchmark_time_integrators.png', bbox_inches = 'tight')
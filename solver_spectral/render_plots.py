@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:41:27 2026
+
+Renderer of the figures of the pseudo-spectral DHIT solver, the finite difference
+solver (solver_fdm) and the implicit LES solvers (Implicit_LES). The solvers do no
+figure work: they store the data of every figure in a .npz file and list it in
+the plot manifest (see add_plot), which is rendered here, in a separate process
+and on any machine. Run as
+
+    python render_plots.py ../data_spectral/data_<nx>/plot_manifest.jsonl
+    python ../solver_spectral/render_plots.py plot_manifest.jsonl (solver_fdm, Implicit_LES)
+
+Figures whose image is newer than their data are skipped, so that a manifest can
+be rendered again while the run is going on. This is the only module of the
+solvers importing matplotlib.
+
+"""
+
+import numpy as np
+import os
+import sys
+import json
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from mpl_toolkits.axes_grid1 import make_axes_locatable
+
+from utils import *
+
+# mathtext renders the labels without a LaTeX run for every figure
+font = {'family' : 'Times New Roman',
+        'size'   : 14}
+plt.rc('font', **font)
+
+#%%
+def field(w0,w,time,filename):
+
+    '''
+    contour plot of the initial and the current vorticity field
+
+    Inputs
+    ------
+    w0 : initial vorticity field
+    w : vorticity field at time
+    time : time of w
+    filename : name of the image file
+    '''
+
+    fig = Figure(figsize=(9,5))
+    axs = fig.subplots(1,2,sharey=True)
+
+    cs = axs[0].contourf(w0.T, 120, cmap = 'jet')
+    axs[0].text(0.4, -0.1, '$t = 0.0$', transform=axs[0].transAxes, fontsize=16, fontweight='bold', va='top')
+
+    cs = axs[1].contourf(w.T, 120, cmap = 'jet')
+    axs[1].text(0.4, -0.1, '$t = '+str(time)+'$', transform=axs[1].transAxes, fontsize=16, fontweight='bold', va='top')
+
+    fig.tight_layout()
+    fig.subplots_adjust(bottom=0.15)
+
+    cbar_ax = fig.add_axes([0.22, -0.05, 0.6, 0.04])
+    fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
+
+    fig.savefig(filename, bbox_inches = 'tight')
+
+#%%
+def field_xy(x,y,w0,w,time,filename,nticks=0):
+
+    '''
+    contour plot of the initial and the current vorticity field on the grid
+    coordinates, titled with the time (implicit LES solvers)
+
+    Inputs
+    ------
+    x,y : coordinates of the grid points in x and y direction
+    w0 : initial vorticity field
+    w : vorticity field at time
+    time : time of w
+    filename : name of the image file
+    nticks : number of ticks of the color bar between the extrema of w0 (0: default ticks)
+    '''
+
+    fig = Figure(figsize=(9,5))
+    axs = fig.subplots(1,2,sharey=True)
+
+    cs = axs[0].contourf(x,y,w0, 120, cmap = 'jet')
+    axs[0].set_title('$t=0$')
+
+    cs = axs[1].contourf(x,y,w, 120, cmap = 'jet')
+    axs[1].set_title('$t='+str(time)+'$')
+
+    fig.tight_layout()
+    fig.subplots_adjust(bottom=0.15)
+
+    cbar_ax = fig.add_axes([0.2, -0.03, 0.6, 0.04])
+    if nticks > 0:
+        fig.colorbar(cs, cax=cbar_ax, ticks=np.linspace(np.min(w0), np.max(w0), nticks), format='%.1f',
+                     orientation='horizontal')
+    else:
+        fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
+
+    fig.savefig(filename, bbox_inches = 'tight')
+
+#%%
+def spectrum(k,ese,en0,en,time,filename,en_ref=None,label_ref='',ylim=(1e-16,1e-0)):
+
+    '''
+    exact, initial and final energy spectrum of the DHIT problem
+
+    Inputs
+    ------
+    k : wavenumbers 1,...,n of the initial grid
+    ese : exact energy spectrum
+    en0 : initial energy spectrum (n+1)
+    en : final energy spectrum (ne+1, ne < n after a downsizing)
+    time : final time
+    filename : name of the image file
+    en_ref : reference energy spectrum (n+1) of another run, if given
+    label_ref : legend of the reference spectrum
+    ylim : limits of the energy axis
+    '''
+
+    fig = Figure(figsize=(7,5))
+    ax = fig.subplots()
+
+    ne = en.shape[0] - 1
+    line = 100*k**(-3.0)
+
+    ax.loglog(k,ese[:],'k', lw = 2, label='Exact')
+    ax.loglog(k,en0[1:],'r', ls = '--', lw = 2, label='$t = 0.0$')
+    ax.loglog(k[0:ne],en[1:], 'b', lw = 2, label = '$t = '+str(time)+'$')
+    if en_ref is not None:
+        ax.loglog(k,en_ref[1:], 'y', lw = 2, label = label_ref)
+    ax.loglog(k,line, 'g--', lw = 2, label = 'k^-3')
+
+    ax.set_xlabel('$K$')
+    ax.set_ylabel('$E(K)$')
+    ax.legend(loc=0)
+    ax.set_ylim(*ylim)
+
+    fig.savefig(filename, bbox_inches = 'tight', pad_inches = 0)
+
+#%%
+def spectra(labels,styles,xlim,ylim,text,filename,**curves):
+
+    '''
+    energy spectra of several runs with a k^-3 line (implicit LES comparison)
+
+    Inputs
+    ------
+    labels : legend of each spectrum
+    styles : line style of each spectrum
+    xlim,ylim : limits of the wavenumber and energy axis
+    text : position of the label of the k^-3 line
+    filename : name of the image file
+    curves : wavenumbers k<m> and energy spectrum en<m> (with the k = 0 value) of the
+             spectrum m, wavenumbers kl and values line of the k^-3 line
+    '''
+
+    fig = Figure(figsize=(6,5))
+    ax = fig.subplots()
+
+    for m, (label, style) in enumerate(zip(labels, styles)):
+        ax.loglog(curves['k'+str(m)],curves['en'+str(m)][1:], style, lw = 2, label = label)
+    ax.loglog(curves['kl'],curves['line'], 'k-.', lw = 2)
+
+    ax.set_xlabel('$K$')
+    ax.set_ylabel('$E(K)$')
+    ax.legend(loc=0)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    ax.text(*text, '$k^{-3}$', color='k')
+
+    fig.savefig(filename, bbox_inches = 'tight', pad_inches = 0)
+
+#%%
+def surface(w,dx,dy,filename,npoints=256):
+
+    '''
+    surface plot of the vorticity field
+
+    Inputs
+    ------
+    w : vorticity field (including periodic boundaries)
+    dx,dy : grid spacing in x and y direction
+    filename : name of the image file
+    npoints : the surface is drawn with at most npoints X npoints patches
+    '''
+
+    fig = Figure(figsize=(10,6))
+    ax = fig.add_subplot(projection='3d', proj_type = 'ortho')
+
+    nx, ny = w.shape[0]-1, w.shape[1]-1
+    X, Y = np.meshgrid(np.linspace(0.0,nx*dx,nx+1), np.linspace(0.0,ny*dy,ny+1), indexing='ij')
+
+    surf = ax.plot_surface(X, Y, w, cmap='coolwarm',vmin=-30, vmax=30,
+                           linewidth=0, antialiased=False,rstride=max(1,int(nx/npoints)),
+                           cstride=max(1,int(ny/npoints)))
+
+    fig.colorbar(surf, shrink=0.5, aspect=5)
+    ax.view_init(elev=60, azim=30)
+
+    fig.savefig(filename, dpi=300, bbox_inches = 'tight')
+
+#%%
+def energy_spectrum(nx,ny,w):
+
+    '''
+    energy spectrum from the vorticity field in physical space
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    w : vorticity field (including periodic boundaries)
+
+    Output
+    ------
+    en : energy spectrum (n+1)
+    n : maximum wavenumber
+    '''
+
+    return shell_spectrum(nx,ny,np.fft.fft2(w[0:nx,0:ny]))
+
+#%%
+def plot_w_ens(nx=1024, field_data='field_spectral.npz'):
+
+    '''
+    vorticity at t = 0, 2, 4 and the energy spectra of the 1024 X 1024 DHIT run
+    (files 200 and 400 of the run, the initial field from the data of its final
+    field figure)
+
+    Inputs
+    ------
+    nx : resolution of the run
+    field_data : data of the final field figure of the run (see add_plot)
+    '''
+
+    ny = nx
+
+    x = np.linspace(0, 2*np.pi, nx+1)
+    y = np.linspace(0, 2*np.pi, ny+1)
+
+    w0 = np.load(field_data)['w0']
+
+    folder = "data_"+ str(nx)
+
+    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(200)+".csv"
+    w2 = np.genfromtxt(file_input, delimiter=',')
+
+    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(400)+".csv"
+    w4 = np.genfromtxt(file_input, delimiter=',')
+
+    fig, axs = plt.subplots(2,2,figsize=(10,9))
+
+    for ax, wp, title in ((axs[0,0],w0,'$t = 0.0$'), (axs[0,1],w2,'$t = 2.0$'), (axs[1,0],w4,'$t = 4.0$')):
+        cs = ax.contour(x,y,wp.T, 10, cmap = 'jet')
+        ax.set_xlabel('$x$')
+        ax.set_ylabel('$y$')
+        ax.set_title(title)
+        divider = make_axes_locatable(ax)
+        cax = divider.append_axes('right', size='5%', pad=0.1)
+        fig.colorbar(cs,cax=cax,orientation='vertical')
+
+    en0, n = energy_spectrum(nx,ny,w0)
+    en2, n = energy_spectrum(nx,ny,w2)
+    en4, n = energy_spectrum(nx,ny,w4)
+    k = np.linspace(1,n,n)
+
+    line = 100*k**(-3.0)
+
+    axs[1,1].loglog(k,en0[1:],'r', ls = '-', lw = 2, label='$t = 0.0$')
+    axs[1,1].loglog(k,en2[1:], 'b', lw = 2, label = '$t = 2.0$')
+    axs[1,1].loglog(k,en4[1:], 'y', lw = 2, label = '$t = 4.0$')
+    axs[1,1].loglog(k,line, 'k--', lw = 2)
+
+    axs[1,1].set_xlabel('$k$')
+    axs[1,1].set_ylabel('$E(k)$')
+    axs[1,1].legend(loc=0)
+    axs[1,1].set_ylim(1e-16,1e-0)
+    axs[1,1].text(0.8, 0.8, '$k^{-3}$', transform=axs[1,1].transAxes, fontsize=16, fontweight='bold', va='top')
+
+    fig.tight_layout()
+    fig.savefig("../data_spectral/"+folder+"/field_spectral.pdf", bbox_inches = 'tight')
+    fig.savefig("../data_spectral/"+folder+"/field_spectral.eps", bbox_inches = 'tight')
+    fig.savefig("../data_spectral/"+folder+"/field_spectral.png", bbox_inches = 'tight',dpi=175)
+    plt.close(fig)
+
+#%%
+plots = {'field': field, 'field_xy': field_xy, 'spectrum': spectrum, 'spectra': spectra,
+         'surface': surface}
+
+def render(manifest):
+
+    '''
+    render the figures of a plot manifest written by add_plot
+
+    Inputs
+    ------
+    manifest : name of the manifest file
+
+    Output
+    ------
+    nplot : number of figures rendered
+    '''
+
+    root = os.path.dirname(manifest)
+
+    with open(manifest) as f:
+        entries = [json.loads(l) for l in f if l.strip()]
+
+    nplot = 0
+    for entry in entries:
+        filename = os.path.join(root, entry['filename'])
+        data = os.path.join(root, entry['data'])
+
+        if os.path.exists(filename) and os.path.getmtime(filename) >= os.path.getmtime(data):
+            continue
+
+        with np.load(data) as arrays:
+            plots[entry['kind']](filename=filename, **arrays, **entry['args'])
+        nplot = nplot + 1
+
+    return nplot
+
+for manifest in sys.argv[1:]:
+    print('Rendered', render(manifest), 'figures of', manifest)
@@ -30,6 +30,8 @@ from scipy.interpolate import UnivariateSpline
 from matplotlib.colors import LightSource
 
 import seaborn as sns
+
+from utils import *
  
 font = {'family' : 'Times New Roman',
         'size'   : 14}    
@@ -161,19 +163,14 @@ def gaussian_filter(nx,ny,nxc,nyc,u,uc):
     
     uf = np.fft.fft2(u[0:nx,0:ny])
     
-    kx = np.fft.fftfreq(nx,1/nx)
-    ky = np.fft.fftfreq(ny,1/ny)
-    
-    kx = kx.reshape(nx,1)
-    ky = ky.reshape(1,ny)
-    
-    kxc = np.fft.fftfreq(nxc,1/nxc)
-    kyc = np.fft.fftfreq(nyc,1/nyc)
+    # cached wavenumbers of the fine and the coarse grid
+    ops = grid_operators(nx,ny)
+    opc = grid_operators(nxc,nyc)
     
-    sx = np.max(np.abs(kxc))
-    sy = np.max(np.abs(kyc))
+    sx = np.max(np.abs(opc.kx))
+    sy = np.max(np.abs(opc.ky))
     s2 = sx**2 + sy**2
-    k2 = kx**2 + ky**2
+    k2 = ops.k2
     
     uf = uf*np.exp(-(np.pi**2/24.0)*(k2/s2))
     
@@ -207,19 +204,14 @@ def elliptic_filter(nx,ny,nxc,nyc,u,uc):
     q = 1
     uf = np.fft.fft2(u[0:nx,0:ny])
     
-    kx = np.fft.fftfreq(nx,1/nx)
-    ky = np.fft.fftfreq(ny,1/ny)
+    # cached wavenumbers of the fine and the coarse grid
+    ops = grid_operators(nx,ny)
+    opc = grid_operators(nxc,nyc)
     
-    kx = kx.reshape(nx,1)
-    ky = ky.reshape(1,ny)
-    
-    kxc = np.fft.fftfreq(nxc,1/nxc)
-    kyc = np.fft.fftfreq(nyc,1/nyc)
-    
-    sx = np.max(np.abs(kxc))
-    sy = np.max(np.abs(kyc))
+    sx = np.max(np.abs(opc.kx))
+    sy = np.max(np.abs(opc.ky))
     s2 = sx**2 + sy**2
-    k2 = kx**2 + ky**2
+    k2 = ops.k2
     
     uf = uf/(1.0 + (k2/s2)**q)
     
@@ -269,11 +261,8 @@ def grad_spectral(nx,ny,u):
     
     uf = np.fft.fft2(u[0:nx,0:ny])
 
-    kx = np.fft.fftfreq(nx,1/nx)
-    ky = np.fft.fftfreq(ny,1/ny)
-    
-    kx = kx.reshape(nx,1)
-    ky = ky.reshape(1,ny)
+    ops = grid_operators(nx,ny)
+    kx, ky = ops.kx, ops.ky
     
     uxf = 1.0j*kx*uf
     uyf = 1.0j*ky*uf 
@@ -9,7 +9,8 @@ DNS solver for decaying homegenous isotropic turbulence problem for cartesian pe
 domain with [0,2pi] X [0,2pi] dimension and is discretized uniformly in x and y direction. 
 The solver uses pseudo-spectral method for solving two-dimensional incompressible 
 Navier-Stokes equation in vorticity-streamfunction formulation. The solver employs 
-hybrid third-order Runge-Kutta implicit Crank-Nicolson scheme for time integration. 
+hybrid third-order Runge-Kutta implicit Crank-Nicolson scheme for time integration
+(or the fourth-order exponential time differencing Runge-Kutta scheme, isolver = 2). 
 
 """
 
@@ -19,25 +20,17 @@ seed(1)
 import pyfftw
 from scipy import integrate
 from scipy import linalg
-import matplotlib.pyplot as plt 
 import time as tm
-import matplotlib.ticker as ticker
 import os
+import sys
+import subprocess
 
-from mpl_toolkits.mplot3d import Axes3D
-from matplotlib import cm
-from matplotlib.ticker import LinearLocator, FormatStrFormatter
-from scipy.interpolate import UnivariateSpline
-from matplotlib.colors import LightSource
-from mpl_toolkits.axes_grid1 import make_axes_locatable
+from utils import *
 
-font = {'family' : 'Times New Roman',
-        'size'   : 14}    
-plt.rc('font', **font)
+from scipy.interpolate import UnivariateSpline
 
-import matplotlib as mpl
-mpl.rcParams['text.usetex'] = True
-mpl.rcParams['text.latex.preamble'] = [r'\usepackage{amsmath}']
+# figures are listed in a plot manifest and rendered by render_plots.py, the only
+# module importing matplotlib
 #%%
 def exact_tgv(nx,ny,time,re):
     
@@ -66,64 +59,6 @@ def exact_tgv(nx,ny,time,re):
 
     return ue
 
-#%%
-def tgv_ic(nx,ny):
-    
-    '''
-    compute initial condition for TGV problem
-    
-    Inputs
-    ------
-    nx,ny : number of grid points in x and y direction
-    
-    Output
-    ------
-    w : initial condiition for vorticity for TGV problem
-    '''
-    
-    w = np.empty((nx+1,ny+1))
-    nq = 4.0
-    x = np.linspace(0.0,2.0*np.pi,nx+1)
-    y = np.linspace(0.0,2.0*np.pi,ny+1)
-    x, y = np.meshgrid(x, y, indexing='ij')
-    
-    w = 2.0*nq*np.cos(nq*x)*np.cos(nq*y)
-
-    return w
-
-#%%
-def vm_ic(nx,ny):
-    
-    '''
-    compute initial condition for vortex-merger problem
-    
-    Inputs
-    ------
-    nx,ny : number of grid points in x and y direction
-    
-    Output
-    ------
-    w : initial condiition for vorticity for vortex-merger problem
-    '''
-    
-    w = np.empty((nx+1,ny+1))
-
-    sigma = np.pi
-    xc1 = np.pi-np.pi/4.0
-    yc1 = np.pi
-    xc2 = np.pi+np.pi/4.0
-    yc2 = np.pi
-    
-    x = np.linspace(0.0,2.0*np.pi,nx+1)
-    y = np.linspace(0.0,2.0*np.pi,ny+1)
-    
-    x, y = np.meshgrid(x, y, indexing='ij')
-    
-    w = np.exp(-sigma*((x-xc1)**2 + (y-yc1)**2)) \
-            + np.exp(-sigma*((x-xc2)**2 + (y-yc2)**2))
-
-    return w
-
 #%%
 def pbc(nx,ny,u):
     
@@ -145,108 +80,36 @@ def pbc(nx,ny,u):
     u[nx,ny] = u[0,0]
 
 #%%
-# set initial condition for decay of turbulence problem
-def decay_ic(nx,ny,dx,dy):
+def wave2phy_batch(nx,ny,ufs):
     
     '''
-    assign initial condition for vorticity for DHIT problem
+    Converts several fields form frequency domain to the physical space with one 
+    batched inverse FFT
     
     Inputs
     ------
     nx,ny : number of grid points in x and y direction
-    dx,dy : grid spacing in x and y direction
+    ufs : list of solution fields in frequency domain (excluding periodic boundaries),
+          all full or all Hermitian half spectra
     
     Output
     ------
-    w : initial condition for vorticity for DHIT problem
+    u : solutions in physical space (len(ufs),nx+1,ny+1) (along with periodic boundaries)
     '''
     
-    w = np.empty((nx+1,ny+1))
-    
-    epsilon = 1.0e-6
-    
-    kx = np.empty(nx)
-    ky = np.empty(ny)
-    
-    kx[0:int(nx/2)] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(0,int(nx/2)))
-    kx[int(nx/2):nx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(-int(nx/2),0))
-
-    ky[0:ny] = kx[0:ny]
-    
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(kx, ky, indexing='ij')
+    nb = len(ufs)
+    u = np.empty((nb,nx+1,ny+1), dtype=np.finfo(ufs[0].dtype).dtype)
     
-    ksi = 2.0*np.pi*np.random.random_sample((int(nx/2+1), int(ny/2+1)))
-    eta = 2.0*np.pi*np.random.random_sample((int(nx/2+1), int(ny/2+1)))
+    dtype = fft_dtype(ny,ufs[0])
+    fft_object_inv = get_fftw((nb,nx,ny), dtype, direction = 'FFTW_BACKWARD', axes = (1,2))
     
-    phase = np.zeros((nx,ny), dtype='complex128')
-    wf =  np.empty((nx,ny), dtype='complex128')
+    for m in range(nb):
+        fft_object_inv.input_array[m] = ufs[m]
     
-    phase[1:int(nx/2),1:int(ny/2)] = np.vectorize(complex)(np.cos(ksi[1:int(nx/2),1:int(ny/2)] +
-                                    eta[1:int(nx/2),1:int(ny/2)]), np.sin(ksi[1:int(nx/2),1:int(ny/2)] +
-                                    eta[1:int(nx/2),1:int(ny/2)]))
-
-    phase[nx-1:int(nx/2):-1,1:int(ny/2)] = np.vectorize(complex)(np.cos(-ksi[1:int(nx/2),1:int(ny/2)] +
-                                            eta[1:int(nx/2),1:int(ny/2)]), np.sin(-ksi[1:int(nx/2),1:int(ny/2)] +
-                                            eta[1:int(nx/2),1:int(ny/2)]))
-
-    phase[1:int(nx/2),ny-1:int(ny/2):-1] = np.vectorize(complex)(np.cos(ksi[1:int(nx/2),1:int(ny/2)] -
-                                           eta[1:int(nx/2),1:int(ny/2)]), np.sin(ksi[1:int(nx/2),1:int(ny/2)] -
-                                           eta[1:int(nx/2),1:int(ny/2)]))
-
-    phase[nx-1:int(nx/2):-1,ny-1:int(ny/2):-1] = np.vectorize(complex)(np.cos(-ksi[1:int(nx/2),1:int(ny/2)] -
-                                                 eta[1:int(nx/2),1:int(ny/2)]), np.sin(-ksi[1:int(nx/2),1:int(ny/2)] -
-                                                eta[1:int(nx/2),1:int(ny/2)]))
-
-    k0 = 10.0
-    c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))           
-    
-    kk = np.sqrt(kx[:,:]**2 + ky[:,:]**2)
-    es = c*(kk**4)*np.exp(-(kk/k0)**2)
-    wf[:,:] = np.sqrt((kk*es/np.pi)) * phase[:,:]*(nx*ny)
-            
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
-    ut = np.real(fft_object_inv(wf)) 
-    
-    #periodicity
-    w[0:nx,0:ny] = ut
-    w[:,ny] = w[:,0]
-    w[nx,:] = w[0,:]
-    w[nx,ny] = w[0,0] 
-    
-    return w
-
-#%%
-def wave2phy(nx,ny,uf):
-    
-    '''
-    Converts the field form frequency domain to the physical space.
-    
-    Inputs
-    ------
-    nx,ny : number of grid points in x and y direction
-    uf : solution field in frequency domain (excluding periodic boundaries)
-    
-    Output
-    ------
-    u : solution in physical space (along with periodic boundaries)
-    '''
-    
-    u = np.empty((nx+1,ny+1))
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
-
-    u[0:nx,0:ny] = np.real(fft_object_inv(uf))
+    u[:,0:nx,0:ny] = np.real(fft_object_inv())
     # periodic BC
-    u[:,ny] = u[:,0]
-    u[nx,:] = u[0,:]
+    u[:,:,ny] = u[:,:,0]
+    u[:,nx,:] = u[:,0,:]
     
     return u
 
@@ -260,56 +123,21 @@ def energy_spectrum(nx,ny,w):
     Inputs
     ------
     nx,ny : number of grid points in x and y direction
-    w : vorticity field in physical spce (including periodic boundaries)
+    w : vorticity field in physical spce (including periodic boundaries),
+        (nx+1,ny+1) or a batch of snapshots (nb,nx+1,ny+1)
     
     Output
     ------
-    en : energy spectrum computed from vorticity field
+    en : energy spectrum computed from vorticity field, (n+1) or (nb,n+1)
     n : maximum wavenumber
     '''
     
-    epsilon = 1.0e-6
-
-    kx = np.empty(nx)
-    ky = np.empty(ny)
-    
-    dx = 2*np.pi/nx
-    
-    kx[0:int(nx/2)] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(0,int(nx/2)))
-    kx[int(nx/2):nx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(-int(nx/2),0))
-
-    ky[0:ny] = kx[0:ny]
-    
-    kx[0] = epsilon
-    ky[0] = epsilon
-
-    kx, ky = np.meshgrid(kx, ky, indexing='ij')
-    
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    wf = fft_object(w[0:nx,0:ny]) 
-    
-    es =  np.empty((nx,ny))
-    
-    kk = np.sqrt(kx[:,:]**2 + ky[:,:]**2)
-    es[:,:] = np.pi*((np.abs(wf[:,:])/(nx*ny))**2)/kk
-    
-    n = int(np.sqrt(nx*nx + ny*ny)/2.0)-1
+    shape = w.shape[:-2] + (nx,ny)
+    fft_object = get_fftw(shape, direction = 'FFTW_FORWARD', axes = (len(shape)-2,len(shape)-1))
+    wf = fftw_execute(fft_object,w[...,0:nx,0:ny]) 
     
-    en = np.zeros(n+1)
-    
-    for k in range(1,n+1):
-        en[k] = 0.0
-        ic = 0
-        ii,jj = np.where((kk[1:,1:]>(k-0.5)) & (kk[1:,1:]<(k+0.5)))
-        ic = ii.size
-        ii = ii+1
-        jj = jj+1
-        en[k] = np.sum(es[ii,jj])
-                    
-        en[k] = en[k]/ic
+    # shell sums with the cached shell index of the grid
+    en, n = shell_spectrum(nx,ny,wf)
         
     return en, n
 
@@ -326,32 +154,30 @@ def fps(nx,ny,dx,dy,k2,f):
     nx,ny : number of grid points in x and y direction
     dx,dy : grid spacing in x and y direction
     k2 : absolute wavenumber over 2D domain
-    f : right hand side of poisson equation in frequency domain (excluding periodic boundaries)
+    f : right hand side of poisson equation in frequency domain (excluding periodic boundaries),
+        full or Hermitian half spectrum (k2 of the same layout)
     
     Output
     ------
     u : solution to the Poisson eqution in physical space (including periodic boundaries)
     '''
     
-    u = np.zeros((nx+1,ny+1))
-         
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
+    u = np.zeros((nx+1,ny+1), dtype=np.finfo(f.dtype).dtype)
     
-    fft_object_inv = pyfftw.FFTW(a, b,axes = (0,1), direction = 'FFTW_BACKWARD')
+    fft_object_inv = get_fftw((nx,ny), fft_dtype(ny,f), direction = 'FFTW_BACKWARD')
        
     # the donominator is based on the scheme used for discrtetizing the Poisson equation
-    data1 = f/(-k2)
+    np.divide(f, -k2, out=fft_object_inv.input_array)
     
     # compute the inverse fourier transform
-    u[0:nx,0:ny] = np.real(fft_object_inv(data1))
+    u[0:nx,0:ny] = np.real(fft_object_inv())
     pbc(nx,ny,u)
     
     return u
 
 
 #%%
-def coarsen(nx,ny,nxc,nyc,uf):  
+def coarsen(nx,ny,nxc,nyc,uf,ufc=None,hermitian=False):  
     
     '''
     coarsen the data along with the size of the data 
@@ -360,37 +186,64 @@ def coarsen(nx,ny,nxc,nyc,uf):
     ------
     nx,ny : number of grid points in x and y direction on fine grid
     nxc,nyc : number of grid points in x and y direction on coarse grid
-    uf : solution field on fine grid in frequency domain (excluding periodic boundaries)
+    uf : solution field on fine grid in frequency domain (excluding periodic boundaries),
+         full or Hermitian half spectrum
+    ufc : array of the coarse spectrum to write into, e.g. a scratch buffer of the
+          coarse grid (default: new array)
+    hermitian : True to keep only the Hermitian part of the Nyquist modes of the 
+                coarse full spectrum, as the half spectrum does (see SpectralDHIT)
     
     Output
     ------
-    u : caorsened solution in frequency domain (excluding periodic boundaries)
+    u : caorsened solution in frequency domain (excluding periodic boundaries),
+        same layout as uf
     '''
     
-    ufc = np.zeros((nxc,nyc),dtype='complex')
-    
-    ufc[0:int(nxc/2),0:int(nyc/2)] = uf[0:int(nxc/2),0:int(nyc/2)]
-    ufc[int(nxc/2):,0:int(nyc/2)] = uf[int(nx-nxc/2):,0:int(nyc/2)]    
-    ufc[0:int(nxc/2),int(nyc/2):] = uf[0:int(nxc/2),int(ny-nyc/2):]
-    ufc[int(nxc/2):,int(nyc/2):] =  uf[int(nx-nxc/2):,int(ny-nyc/2):] 
+    # every coefficient of ufc is set below
+    if is_half(ny,uf):
+        if ufc is None:
+            ufc = np.empty((nxc,int(nyc/2)+1),dtype=uf.dtype)
+        
+        ufc[0:int(nxc/2),:] = uf[0:int(nxc/2),0:int(nyc/2)+1]
+        ufc[int(nxc/2):,:] = uf[int(nx-nxc/2):,0:int(nyc/2)+1]
+        
+        # Nyquist modes of the coarse grid hold the Hermitian part of the +/- nxc/2 
+        # and +/- nyc/2 fine modes, which is what the full spectrum gives in physical space
+        nyquist_truncate_half(nxc,nyc,uf,ufc)
+    else:
+        if ufc is None:
+            ufc = np.empty((nxc,nyc),dtype=uf.dtype)
+        
+        ufc[0:int(nxc/2),0:int(nyc/2)] = uf[0:int(nxc/2),0:int(nyc/2)]
+        ufc[int(nxc/2):,0:int(nyc/2)] = uf[int(nx-nxc/2):,0:int(nyc/2)]    
+        ufc[0:int(nxc/2),int(nyc/2):] = uf[0:int(nxc/2),int(ny-nyc/2):]
+        ufc[int(nxc/2):,int(nyc/2):] =  uf[int(nx-nxc/2):,int(ny-nyc/2):] 
+        if hermitian:
+            hermitian_nyquist(nxc,nyc,ufc)
     
-    ufc = ufc*(nxc*nyc)/(nx*ny)
+    ufc *= (nxc*nyc)/(nx*ny)
     
     return ufc
 
        
 #%%
-def nonlineardealiased(nx,ny,kx,ky,k2,wf):    
+def nonlineardealiased(nx,ny,kx,ky,k2,wf,ipack=0,dealias=1,hermitian=False):    
     
     '''
-    compute the Jacobian with 3/2 dealiasing 
+    compute the Jacobian with 3/2 dealiasing (or the 2/3 rule)
     
     Inputs
     ------
     nx,ny : number of grid points in x and y direction on fine grid
     kx,ky : wavenumber in x and y direction
     k2 : absolute wave number over 2D domain
-    wf : vorticity field in frequency domain (excluding periodic boundaries)
+    wf : vorticity field in frequency domain (excluding periodic boundaries),
+         full or Hermitian half spectrum (kx,ky,k2 of the same layout)
+    ipack : [0] four inverse FFTs, [1] pack the real factors in pairs (j1 + i*j3, j2 + i*j4)
+            so that only two inverse FFTs are needed (full spectrum only)
+    dealias : [1] 3/2 padding, [2] 2/3 rule on the native grid (see SpectralDHIT)
+    hermitian : True for the Hermitian part of the Nyquist modes of the full spectrum
+                (see SpectralDHIT)
     
     Output
     ------
@@ -398,6 +251,18 @@ def nonlineardealiased(nx,ny,kx,ky,k2,wf):
          (d(psi)/dy*d(omega)/dx - d(psi)/dx*d(omega)/dy)
     '''
     
+    # plans, padded wavenumbers and buffers of the grid, real-to-complex transforms 
+    # on the padded grid for the half spectrum, precision of wf
+    ops = grid_operators(nx,ny,is_half(ny,wf),wf.dtype)
+    
+    if dealias == 2:
+        # modes outside the 2/3-rule mask are dropped from the vorticity and from 
+        # the product, the Nyquist modes are among them
+        jf = nonlinear(nx,ny,kx,ky,k2,wf*ops.mask,ipack)
+        jf *= ops.mask
+        
+        return jf
+    
     j1f = 1.0j*kx*wf/k2
     j2f = 1.0j*ky*wf
     j3f = 1.0j*ky*wf/k2
@@ -406,81 +271,72 @@ def nonlineardealiased(nx,ny,kx,ky,k2,wf):
     nxe = int(nx*3/2)
     nye = int(ny*3/2)
     
-    j1f_padded = np.zeros((nxe,nye),dtype='complex128')
-    j2f_padded = np.zeros((nxe,nye),dtype='complex128')
-    j3f_padded = np.zeros((nxe,nye),dtype='complex128')
-    j4f_padded = np.zeros((nxe,nye),dtype='complex128')
-    
-    j1f_padded[0:int(nx/2),0:int(ny/2)] = j1f[0:int(nx/2),0:int(ny/2)]
-    j1f_padded[int(nxe-nx/2):,0:int(ny/2)] = j1f[int(nx/2):,0:int(ny/2)]    
-    j1f_padded[0:int(nx/2),int(nye-ny/2):] = j1f[0:int(nx/2),int(ny/2):]    
-    j1f_padded[int(nxe-nx/2):,int(nye-ny/2):] =  j1f[int(nx/2):,int(ny/2):] 
+    fft_object, fft_object_inv = ops.plans(padded=True)
     
-    j2f_padded[0:int(nx/2),0:int(ny/2)] = j2f[0:int(nx/2),0:int(ny/2)]
-    j2f_padded[int(nxe-nx/2):,0:int(ny/2)] = j2f[int(nx/2):,0:int(ny/2)]    
-    j2f_padded[0:int(nx/2),int(nye-ny/2):] = j2f[0:int(nx/2),int(ny/2):]    
-    j2f_padded[int(nxe-nx/2):,int(nye-ny/2):] =  j2f[int(nx/2):,int(ny/2):] 
+    jpf = fft_object_inv.input_array
+    jacp = fft_object.input_array
     
-    j3f_padded[0:int(nx/2),0:int(ny/2)] = j3f[0:int(nx/2),0:int(ny/2)]
-    j3f_padded[int(nxe-nx/2):,0:int(ny/2)] = j3f[int(nx/2):,0:int(ny/2)]    
-    j3f_padded[0:int(nx/2),int(nye-ny/2):] = j3f[0:int(nx/2),int(ny/2):]    
-    j3f_padded[int(nxe-nx/2):,int(nye-ny/2):] =  j3f[int(nx/2):,int(ny/2):] 
-    
-    j4f_padded[0:int(nx/2),0:int(ny/2)] = j4f[0:int(nx/2),0:int(ny/2)]
-    j4f_padded[int(nxe-nx/2):,0:int(ny/2)] = j4f[int(nx/2):,0:int(ny/2)]    
-    j4f_padded[0:int(nx/2),int(nye-ny/2):] = j4f[0:int(nx/2),int(ny/2):]    
-    j4f_padded[int(nxe-nx/2):,int(nye-ny/2):] =  j4f[int(nx/2):,int(ny/2):] 
-    
-    j1f_padded = j1f_padded*(nxe*nye)/(nx*ny)
-    j2f_padded = j2f_padded*(nxe*nye)/(nx*ny)
-    j3f_padded = j3f_padded*(nxe*nye)/(nx*ny)
-    j4f_padded = j4f_padded*(nxe*nye)/(nx*ny)
-    
-    
-    a = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    
-    a1 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    b1 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    
-    a2 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    b2 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    
-    a3 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    b3 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    
-    a4 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    b4 = pyfftw.empty_aligned((nxe,nye),dtype= 'complex128')
-    
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    
-    fft_object_inv1 = pyfftw.FFTW(a1, b1,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv2 = pyfftw.FFTW(a2, b2,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv3 = pyfftw.FFTW(a3, b3,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv4 = pyfftw.FFTW(a4, b4,axes = (0,1), direction = 'FFTW_BACKWARD')
-    
-    j1 = np.real(fft_object_inv1(j1f_padded))
-    j2 = np.real(fft_object_inv2(j2f_padded))
-    j3 = np.real(fft_object_inv3(j3f_padded))
-    j4 = np.real(fft_object_inv4(j4f_padded))
-    
-    jacp = j1*j2 - j3*j4
+    if ipack == 1 and not is_half(ny,wf):
+        # j1 + i*j3 and j2 + i*j4 are transformed together, the real part of 
+        # their product is j1*j2 - j3*j4
+        # the factors are applied on the padded grid to the padded vorticity with
+        # Hermitian Nyquist modes, so that both products transform exactly
+        j13 = ops.buffer('j13', padded=True)
+        j24 = ops.buffer('j24', padded=True)
+        wpe = ops.buffer('wpe', padded=True)
+        
+        pad_spectrum(nx,ny,nxe,nye,wf,wpe)
+        hermitian_nyquist(nx,ny,wpe)
+        kxe, kye, k2e = ops.kxe, ops.kye, ops.k2e
+        
+        for fac, jn in (((1.0j*kxe - kye)/k2e,j13), (1.0j*kye - kxe,j24)):
+            np.multiply(fac, wpe, out=jpf)
+            jpf *= (nxe*nye)/(nx*ny)
+            jn[:,:] = fft_object_inv()
+        
+        np.multiply(j13, j24, out=jacp)
+        jacp.imag[:,:] = 0.0
+    else:
+        j1 = ops.buffer('j1', padded=True, real=True)
+        j2 = ops.buffer('j2', padded=True, real=True)
+        j3 = ops.buffer('j3', padded=True, real=True)
+        j4 = ops.buffer('j4', padded=True, real=True)
+        
+        if is_half(ny,wf):
+            # the factors are applied on the padded grid to the padded vorticity with
+            # split Nyquist modes (see nyquist_pad_half), the sign of the x derivative
+            # differs between the kx = -nx/2 and +nx/2 halves
+            wpe = ops.buffer('wpe', padded=True)
+            
+            pad_spectrum(nx,ny,nxe,nye,wf,wpe)
+            kxe, kye, k2e = ops.kxe, ops.kye, ops.k2e
+            
+            for fac, jn in ((1.0j*kxe/k2e,j1), (1.0j*kye,j2), (1.0j*kye/k2e,j3), (1.0j*kxe,j4)):
+                np.multiply(fac, wpe, out=jpf)
+                jpf *= (nxe*nye)/(nx*ny)
+                jn[:,:] = np.real(fft_object_inv())
+        else:
+            # pad each factor directly into the input array of the inverse transform
+            for jnf, jn in ((j1f,j1), (j2f,j2), (j3f,j3), (j4f,j4)):
+                pad_spectrum(nx,ny,nxe,nye,jnf,jpf)
+                jpf *= (nxe*nye)/(nx*ny)
+                jn[:,:] = np.real(fft_object_inv())
+        
+        np.multiply(j1, j2, out=jacp)
+        jacp -= j3*j4
     
-    jacpf = fft_object(jacp)
+    jacpf = fft_object()
     
-    jf = np.zeros((nx,ny),dtype='complex128')
+    jf = np.zeros(wf.shape,dtype=wf.dtype)
     
-    jf[0:int(nx/2),0:int(ny/2)] = jacpf[0:int(nx/2),0:int(ny/2)]
-    jf[int(nx/2):,0:int(ny/2)] = jacpf[int(nxe-nx/2):,0:int(ny/2)]    
-    jf[0:int(nx/2),int(ny/2):] = jacpf[0:int(nx/2),int(nye-ny/2):]    
-    jf[int(nx/2):,int(ny/2):] =  jacpf[int(nxe-nx/2):,int(nye-ny/2):]
+    truncate_spectrum(nx,ny,nxe,nye,jacpf,jf,hermitian)
     
     jf = jf*(nx*ny)/(nxe*nye)
     
     return jf
 
 #%%
-def nonlinear(nx,ny,kx,ky,k2,wf):  
+def nonlinear(nx,ny,kx,ky,k2,wf,ipack=0):  
     
     '''
     compute the Jacobian without dealiasing 
@@ -490,7 +346,10 @@ def nonlinear(nx,ny,kx,ky,k2,wf):
     nx,ny : number of grid points in x and y direction on fine grid
     kx,ky : wavenumber in x and y direction
     k2 : absolute wave number over 2D domain
-    wf : vorticity field in frequency domain (excluding periodic boundaries)
+    wf : vorticity field in frequency domain (excluding periodic boundaries),
+         full or Hermitian half spectrum (kx,ky,k2 of the same layout)
+    ipack : [0] four inverse FFTs, [1] pack the real factors in pairs (j1 + i*j3, j2 + i*j4)
+            so that only two inverse FFTs are needed (full spectrum only)
     
     Output
     ------
@@ -503,42 +362,32 @@ def nonlinear(nx,ny,kx,ky,k2,wf):
     j3f = 1.0j*ky*wf/k2
     j4f = 1.0j*kx*wf
     
-    a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    a1 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b1 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    a2 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b2 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    a3 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b3 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    a4 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    b4 = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-    
-    fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-    
-    fft_object_inv1 = pyfftw.FFTW(a1, b1,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv2 = pyfftw.FFTW(a2, b2,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv3 = pyfftw.FFTW(a3, b3,axes = (0,1), direction = 'FFTW_BACKWARD')
-    fft_object_inv4 = pyfftw.FFTW(a4, b4,axes = (0,1), direction = 'FFTW_BACKWARD')
+    dtype = fft_dtype(ny,wf)
     
-    j1 = np.real(fft_object_inv1(j1f))
-    j2 = np.real(fft_object_inv2(j2f))
-    j3 = np.real(fft_object_inv3(j3f))
-    j4 = np.real(fft_object_inv4(j4f))
+    fft_object = get_fftw((nx,ny), dtype, direction = 'FFTW_FORWARD')
+    fft_object_inv = get_fftw((nx,ny), dtype, direction = 'FFTW_BACKWARD')
     
-    jac = j1*j2 - j3*j4
+    if ipack == 1 and not is_half(ny,wf):
+        j13 = np.copy(fftw_execute(fft_object_inv,j1f + 1.0j*j3f))
+        j24 = np.copy(fftw_execute(fft_object_inv,j2f + 1.0j*j4f))
+        
+        jac = np.real(j13*j24)
+    else:
+        j1 = np.copy(np.real(fftw_execute(fft_object_inv,j1f)))
+        j2 = np.copy(np.real(fftw_execute(fft_object_inv,j2f)))
+        j3 = np.copy(np.real(fftw_execute(fft_object_inv,j3f)))
+        j4 = np.copy(np.real(fftw_execute(fft_object_inv,j4f)))
+        
+        jac = j1*j2 - j3*j4
     
-    jf = fft_object(jac)
+    jf = np.copy(fftw_execute(fft_object,jac))
     
     return jf
 
 
 #%% coarsening
-def write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wf,w0,n,freq,dt):
+def write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wf,w0,n,freq,dt,ipack=0,folder=None,jf=None,
+               writer=None,dealias=1,manifest=None,hermitian=False):
     
     '''
     write the data to .csv files for post-processing
@@ -549,11 +398,23 @@ def write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wf,w0,n,freq,dt):
     dx,dy : grid spacing in x and y direction
     kx,ky : wavenumber in x and y direction
     k2 : absolute wave number over 2D domain
-    nxc,nyc : number of grid points in x and y direction on caorse grid
-    dxc,dyc : grid spacing in x and y direction for coarse grid
-    wf : vorticity field in frequency domain (excluding periodic boundaries)
+    nxc,nyc : number of grid points in x and y direction on caorse grid, or lists of
+              several coarse grids which all share the Jacobian of the fine grid
+    dxc,dyc : grid spacing in x and y direction for coarse grid (lists for several)
+    wf : vorticity field in frequency domain (excluding periodic boundaries),
+         full or Hermitian half spectrum
     n : time step
     freq : frequency at which to write the data
+    ipack : [1] packed inverse FFTs for the Jacobian (see nonlineardealiased)
+    folder : output folder in ../data_spectral (default: data_<nx>)
+    jf : jacobian of wf in frequency domain if already known (e.g. from the solver),
+         computed with nonlineardealiased otherwise
+    writer : SnapshotWriter doing the file output in the background (None: write here)
+    dealias : [1] 3/2 padding, [2] 2/3 rule for the Jacobians (see nonlineardealiased)
+    manifest : plot manifest listing the field figure every 50 files (see add_plot),
+               None for no figure
+    hermitian : True for the Hermitian part of the Nyquist modes of the full spectrum
+                (see SpectralDHIT)
     
     Output/ write
     ------
@@ -562,69 +423,58 @@ def write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wf,w0,n,freq,dt):
     sgs : subgrid scale term
     w : vorticity in physical space for fine grid (including periodic boundaries)
     s : streamfunction in physical space for fine grid (including periodic boundaries) 
+    
+    For several coarse grids, jc, jcoarse and sgs of the grid nxc go to the folders 
+    01_coarsened_jacobian_field_<nxc>, 02_jacobian_coarsened_field_<nxc> and 
+    03_subgrid_scale_term_<nxc>
     '''
     
-    s = fps(nx,ny,dx,dy,k2,-wf)
-    w = wave2phy(nx,ny,wf)
-   
-    kxc = np.fft.fftfreq(nxc,1/nxc)
-    kyc = np.fft.fftfreq(nyc,1/nyc)
-    kxc = kxc.reshape(nxc,1)
-    kyc = kyc.reshape(1,nyc)
-    
-    k2c = kxc*kxc + kyc*kyc
-    k2c[0,0] = 1.0e-12
-     
-    jf = nonlineardealiased(nx,ny,kx,ky,k2,wf)
-    j = wave2phy(nx,ny,jf) # jacobian for fine solution field
-
-    jc = np.zeros((nxc+1,nyc+1)) # coarsened(jacobian field)
-    jfc = coarsen(nx,ny,nxc,nyc,jf) # coarsened(jacobian field) in frequency domain
-    jc = wave2phy(nxc,nyc,jfc) # coarsened(jacobian field) physical space
-       
-    wfc = coarsen(nx,ny,nxc,nyc,wf)       
-    jcoarsef = nonlineardealiased(nxc,nyc,kxc,kyc,k2c,wfc) # jacobian(coarsened solution field) in frequency domain
-    jcoarse = wave2phy(nxc,nyc,jcoarsef) # jacobian(coarsened solution field) physical space
+    # vorticity and streamfunction (-k2*sf = -wf) from one batched inverse FFT
+    w, s = wave2phy_batch(nx,ny,[wf,wf/k2])
     
-    sgs = jc - jcoarse
+    if jf is None:
+        jf = nonlineardealiased(nx,ny,kx,ky,k2,wf,ipack,dealias,hermitian)
     
-    folder = 'data_'+str(nx)
-    if not os.path.exists("../data_spectral/"+folder):
-        os.makedirs("../data_spectral/"+folder)
-        os.makedirs("../data_spectral/"+folder+"/01_coarsened_jacobian_field")
-        os.makedirs("../data_spectral/"+folder+"/02_jacobian_coarsened_field")
-        os.makedirs("../data_spectral/"+folder+"/03_subgrid_scale_term")
-        os.makedirs("../data_spectral/"+folder+"/04_vorticity")
-        os.makedirs("../data_spectral/"+folder+"/05_streamfunction")
-    
-    filename = "../data_spectral/"+folder+"/01_coarsened_jacobian_field/J_fourier_"+str(int(n/freq))+".csv"
-    np.savetxt(filename, jc, delimiter=",")    
-    filename = "../data_spectral/"+folder+"/02_jacobian_coarsened_field/J_coarsen_"+str(int(n/freq))+".csv"
-    np.savetxt(filename, jcoarse, delimiter=",")
-    filename = "../data_spectral/"+folder+"/03_subgrid_scale_term/sgs_"+str(int(n/freq))+".csv"
-    np.savetxt(filename, sgs, delimiter=",")
-    filename = "../data_spectral/"+folder+"/04_vorticity/w_"+str(int(n/freq))+".csv"
-    np.savetxt(filename, w, delimiter=",")
-    filename = "../data_spectral/"+folder+"/05_streamfunction/s_"+str(int(n/freq))+".csv"
-    np.savetxt(filename, s, delimiter=",")
-    
-    if n%(50*freq) == 0:
-        fig, axs = plt.subplots(1,2,sharey=True,figsize=(9,5))
-
-        cs = axs[0].contourf(w0.T, 120, cmap = 'jet', interpolation='bilinear')
-        axs[0].text(0.4, -0.1, '$t = 0.0$', transform=axs[0].transAxes, fontsize=16, fontweight='bold', va='top')
+    if folder is None:
+        folder = 'data_'+str(nx)
+    
+    coarse_grids = list(zip(np.atleast_1d(nxc),np.atleast_1d(nyc)))
+    
+    # all fields are new arrays, so that they can be handed to the writer
+    files = []
+    for nxc, nyc in coarse_grids:
+        # wavenumbers, plans and spectra of the coarse grid are reused between outputs
+        opc = grid_operators(nxc,nyc,is_half(ny,wf),wf.dtype)
         
-        cs = axs[1].contourf(w.T, 120, cmap = 'jet', interpolation='bilinear')
-        axs[1].text(0.4, -0.1, '$t = '+str(dt*n)+'$', transform=axs[1].transAxes, fontsize=16, fontweight='bold', va='top')
+        jfc = coarsen(nx,ny,nxc,nyc,jf,opc.buffer('jfc'),hermitian) # coarsened(jacobian field) in frequency domain
+        jc = wave2phy(nxc,nyc,jfc) # coarsened(jacobian field) physical space
+           
+        wfc = coarsen(nx,ny,nxc,nyc,wf,opc.buffer('wfc'),hermitian)       
+        jcoarsef = nonlineardealiased(nxc,nyc,opc.kx,opc.ky,opc.k2,wfc,ipack,dealias,hermitian) # jacobian(coarsened solution field) in frequency domain
+        jcoarse = wave2phy(nxc,nyc,jcoarsef) # jacobian(coarsened solution field) physical space
         
-        fig.tight_layout() 
-        fig.subplots_adjust(bottom=0.15)
+        sgs = jc - jcoarse
         
-        cbar_ax = fig.add_axes([0.22, -0.05, 0.6, 0.04])
-        fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
-            
+        suffix = '_'+str(nxc) if len(coarse_grids) > 1 else ''
+        files += [("../data_spectral/"+folder+"/01_coarsened_jacobian_field"+suffix+"/J_fourier_"+str(int(n/freq))+".csv", jc),
+                  ("../data_spectral/"+folder+"/02_jacobian_coarsened_field"+suffix+"/J_coarsen_"+str(int(n/freq))+".csv", jcoarse),
+                  ("../data_spectral/"+folder+"/03_subgrid_scale_term"+suffix+"/sgs_"+str(int(n/freq))+".csv", sgs)]
+    
+    files += [("../data_spectral/"+folder+"/04_vorticity/w_"+str(int(n/freq))+".csv", w),
+              ("../data_spectral/"+folder+"/05_streamfunction/s_"+str(int(n/freq))+".csv", s)]
+    
+    for filename, u in files:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    
+    plot = None
+    if manifest is not None and n%(50*freq) == 0:
         filename = "../data_spectral/"+folder+"/field_spectral_"+str(int(n/freq))+".png"
-        fig.savefig(filename, bbox_inches = 'tight')
+        plot = (add_plot, (manifest, 'field', filename, {'w0':w0, 'w':w}, {'time':float(dt*n)}))
+    
+    if writer is None:
+        write_snapshot(files, plot)
+    else:
+        writer.submit(files, plot)
     
     
 #%% 
@@ -636,28 +486,49 @@ with open('input.txt') as f:
 
 nd = np.int64(l1[0][0])
 nt = np.int64(l1[1][0])
-re = np.float64(l1[2][0])
+re_list = np.float64(l1[2][0].split(',')) # one Reynolds number per ensemble member or one for all
+re = re_list[0]
 dt = np.float64(l1[3][0])
 ns = np.int64(l1[4][0])
 isolver = np.int64(l1[5][0])
 isc = np.int64(l1[6][0])
 ich = np.int64(l1[7][0])
 ipr = np.int64(l1[8][0])
-ndc = np.int64(l1[9][0])
+ndc_list = np.int64(l1[9][0].split(',')) # several coarse grids from one run
+ndc = ndc_list[0]
 ichkp = np.int64(l1[10][0])
 istart = np.int64(l1[11][0])
+irfft = np.int64(l1[12][0])
+ipack = np.int64(l1[13][0])
+nthreads = np.int64(l1[14][0])
+iplan = np.int64(l1[15][0])
+nens = np.int64(l1[16][0])
+cfl = np.float64(l1[17][0])
+nchkp = np.int64(l1[18][0])
+nkeep = np.int64(l1[19][0])
+nqueue = np.int64(l1[20][0])
+ispill = np.int64(l1[21][0])
+ndiag = np.int64(l1[22][0])
+iprec = np.int64(l1[23][0])
+tresize = np.float64(l1[24][0])
+idealias = np.int64(l1[25][0])
+iplot = np.int64(l1[26][0])
+ihermitian = np.int64(l1[27][0])
 
 freq = int(nt/ns)
 
 if (ich != 19):
     print("Check input.txt file")
 
+# threads and planner effort for all FFTs, reusing the wisdom of earlier runs
+init_fftw(nthreads,iplan)
+
 # assign parameters
 nx = nd
 ny = nd
 
-nxc = ndc
-nyc = ndc
+nxc = ndc_list if len(ndc_list) > 1 else ndc
+nyc = nxc
 
 pi = np.pi
 lx = 2.0*pi
@@ -670,8 +541,13 @@ dxc = lx/np.float64(nxc)
 dyc = ly/np.float64(nyc)
 
 ifile = 0
-time = ichkp*freq*istart*dt
+time = freq*istart*dt if ichkp > 0 else 0.0
+nrestart = int(istart*freq) if ichkp > 0 else 0 # time step of the initial field
 folder = 'data_'+str(nx)
+chkp_folder = "../data_spectral/"+folder+"/00_checkpoint"
+diag_file = "../data_spectral/"+folder+"/diagnostics.bin"
+resize_log = "../data_spectral/"+folder+"/resize_log.csv"
+manifest = "../data_spectral/"+folder+"/plot_manifest.jsonl"
 
 #%%
 # set the initial condition based on the problem selected
@@ -682,243 +558,214 @@ elif (ipr == 2):
 elif (ipr == 3):
     w0 = decay_ic(nx,ny,dx,dy) # decaying homegeneous isotropic turbulence problem
 
+# ensemble of realizations differing in the random phases of the initial condition
+# and/or in the Reynolds number, each member writes to data_<nx>/member_<m>
+if nens > 1:
+    w0 = np.stack([w0] + [decay_ic(nx,ny,dx,dy) if ipr == 3 else np.copy(w0) for m in range(1,nens)])
+    members = [folder+'/member_'+str(m) for m in range(nens)]
+else:
+    members = [folder]
+
 #%%  
 if ichkp == 0:
     w = np.copy(w0)
 elif ichkp == 1:
     print(istart)
-    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(istart)+".csv"
-    w = np.genfromtxt(file_input, delimiter=',')
+    w = []
+    for member in members:
+        file_input = "../data_spectral/"+member+"/04_vorticity/w_"+str(istart)+".csv"
+        w.append(np.genfromtxt(file_input, delimiter=','))
+    w = np.stack(w) if nens > 1 else w[0]
+    # grid of the saved field (smaller than nd after a downsizing, see tresize)
+    nx, ny = w.shape[-2]-1, w.shape[-1]-1
+    dx, dy = lx/np.float64(nx), ly/np.float64(ny)
+elif ichkp == 2:
+    w = np.copy(w0) # replaced by the binary checkpoint below
     
 #%%
 # compute frequencies, vorticity field in frequency domain
-kx = np.fft.fftfreq(nx,1/nx)
-ky = np.fft.fftfreq(ny,1/ny)
-
-kx = kx.reshape(nx,1)
-ky = ky.reshape(1,ny)
-    
-data = np.empty((nx,ny), dtype='complex128')
-
-data = np.vectorize(complex)(w[0:nx,0:ny],0.0)
-
-a = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-b = pyfftw.empty_aligned((nx,ny),dtype= 'complex128')
-
-fft_object = pyfftw.FFTW(a, b, axes = (0,1), direction = 'FFTW_FORWARD')
-
-wnf = fft_object(data) # fourier space forward
-
-#%%
-# initialize variables for time integration
-a1, a2, a3 = 8.0/15.0, 2.0/15.0, 1.0/3.0
-g1, g2, g3 = 8.0/15.0, 5.0/12.0, 3.0/4.0
-r2, r3 = -17.0/60.0, -5.0/12.0
-
-k2 = kx*kx + ky*ky
-k2[0,0] = 1.0e-12
-
-z = 0.5*dt*k2/re
-d1 = a1*z
-d2 = a2*z
-d3 = a3*z
-
-w1f = np.empty((nx,ny), dtype='complex128')
-w2f = np.empty((nx,ny), dtype='complex128')
+# irfft = 1 carries only the Hermitian half spectrum nx X (ny/2+1) of the real field
+# isolver = 2 integrates the viscous term exactly with ETDRK4
+# iprec = 1 runs the solver, the padded Jacobian and the output in single precision
+# ihermitian = 1 keeps the Hermitian part of the Nyquist modes of the complex spectrum
+stepper = SpectralETDRK4 if isolver == 2 else SpectralDHIT
+solver = stepper(nx,ny,re_list if nens > 1 else re,dt,irfft == 1,ipack,nens if nens > 1 else 0,iprec == 1,
+                 idealias,ihermitian == 1)
+solver.set_vorticity(w)
+
+# single precision is checked against double precision on a short run of a perturbed
+# TGV on a 64 X 64 grid with the stepper and the dealiasing of the run
+if iprec == 1:
+    drift = precision_guard(stepper,re,dt,irfft == 1,ipack,idealias,min(nt,100))
+    print('Energy drift of single precision (perturbed TGV, 64^2, '+str(min(nt,100))+' steps) =', drift)
+
+# ichkp = 2 resumes bit-exactly from the binary checkpoint istart (-1 for the latest)
+if ichkp == 2:
+    wcf, state = load_checkpoint(chkp_folder,istart)
+    if wcf.shape != solver.wnf.shape:
+        # the run was downsized before the checkpoint (see tresize)
+        nx, ny = state['nx'], state['ny']
+        dx, dy = lx/np.float64(nx), ly/np.float64(ny)
+        solver = solver.truncated(nx,ny)
+    solver.set_spectrum(wcf,state['dt'])
+    # the step is taken from the checkpoint, nt and nf may differ from the run that wrote it
+    time = state['time']
+    nrestart = state['n']
+    istart = int(nrestart/freq)
+    print('Restart from checkpoint at step', state['n'], 'time', time)
+
+kx, ky, k2 = solver.kx, solver.ky, solver.k2
+wnf = solver.wnf # updated in place by the solver
+
+print('Memory of work arrays for time integration (MB) =', solver.memory()/1.0e6)
+
+save_wisdom()
+
+# nqueue > 0: csv files and figures are written by a background thread
+writer = None
+if nqueue > 0:
+    writer = SnapshotWriter(nqueue,['block','drop','spill'][ispill],"../data_spectral/"+folder+"/00_spill")
+
+# ndiag > 0: energy, enstrophy, palinstrophy, dissipation and max vorticity every ndiag
+# steps, appended to diagnostics.bin (read with read_diagnostics), a restart appends
+if ndiag > 0:
+    if not os.path.exists("../data_spectral/"+folder):
+        os.makedirs("../data_spectral/"+folder)
+    if ichkp == 0 and os.path.exists(diag_file):
+        os.remove(diag_file)
+    elif os.path.exists(diag_file):
+        # the records from the restart step on are written again by this run
+        truncate_diagnostics(diag_file,nrestart,nens if nens > 1 else 0)
+    append_diagnostics(diag_file,time,nrestart,solver.diagnostics())
+
+# figures of the run, a restart adds to the manifest
+if ichkp == 0 and os.path.exists(manifest):
+    os.remove(manifest)
+
+# tresize > 0: log of the grid downsizing (step, time, old and new grid, energy above 
+# the new cutoff)
+if tresize > 0.0 and (ichkp == 0 or not os.path.exists(resize_log)):
+    if not os.path.exists("../data_spectral/"+folder):
+        os.makedirs("../data_spectral/"+folder)
+    with open(resize_log, 'w') as f:
+        f.write('# n, time, nx, ny, nx_new, ny_new, energy fraction above the new cutoff\n')
 
 #%%
 clock_time_init = tm.time()
 # time integration using hybrid third-order Runge-Kutta implicit Crank-Nicolson scheme
-# refer to Orlandi: Fluid flow phenomenon
-for n in range(int(ichkp*istart*freq)+1,nt+1):
-    time = time + dt
-    # 1st step
-    jnf = nonlineardealiased(nx,ny,kx,ky,k2,wnf)    
-    w1f[:,:] = ((1.0 - d1)/(1.0 + d1))*wnf[:,:] + (g1*dt*jnf[:,:])/(1.0 + d1)
-    w1f[0,0] = 0.0
-    
-    # 2nd step
-    j1f = nonlineardealiased(nx,ny,kx,ky,k2,w1f)
-    w2f[:,:] = ((1.0 - d2)/(1.0 + d2))*w1f[:,:] + (r2*dt*jnf[:,:]+ g2*dt*j1f[:,:])/(1.0 + d2)
-    w2f[0,0] = 0.0
-    
-    # 3rd step
-    j2f = nonlineardealiased(nx,ny,kx,ky,k2,w2f)
-    wnf[:,:] = ((1.0 - d3)/(1.0 + d3))*w2f[:,:] + (r3*dt*j1f[:,:] + g3*dt*j2f[:,:])/(1.0 + d3)
-    wnf[0,0] = 0.0
-    
-    if (n%freq == 0):
-        write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wnf,w0,n,freq,dt)
-        print(n, " ", time, " ",wnf.shape[0], " ", wnf.shape[1])
-    
-w = wave2phy(nx,ny,wnf) # final vorticity field in physical space            
+# refer to Orlandi: Fluid flow phenomenon (isolver = 1) or ETDRK4 (isolver = 2)
+# cfl > 0: adaptive time step, output is written at the times n*dt (n%freq == 0) of
+# the fixed step dt from input.txt
+n = nrestart
+nstep = 0
+while n < nt:
+    if cfl > 0.0:
+        n_out = (int(n/freq) + 1)*freq
+        t_out = n_out*dt
+        solver.step(cfl, t_out - time)
+        time = time + solver.dt
+        output = (time >= t_out - 1.0e-9*dt)
+        if output:
+            time = t_out
+            n = n_out
+    else:
+        solver.step()
+        time = time + dt
+        n = n + 1
+        output = (n%freq == 0)
+    nstep = nstep + 1
+    
+    if ndiag > 0 and nstep%ndiag == 0:
+        append_diagnostics(diag_file,time,n,solver.diagnostics())
+    
+    if output:
+        if nens > 1:
+            # the Jacobian of the solution is reused by the next step
+            jnf = solver.solution_jacobian()
+            for m in range(nens):
+                write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wnf[m],w0[m],n,freq,dt,ipack,members[m],jnf[m],
+                           writer,idealias,manifest,ihermitian == 1)
+        else:
+            write_data(nx,ny,dx,dy,kx,ky,k2,nxc,nyc,dxc,dyc,wnf,w0,n,freq,dt,ipack,folder,solver.solution_jacobian(),
+                       writer,idealias,manifest,ihermitian == 1)
+        print(n, " ", time, " ",wnf.shape[-2], " ", wnf.shape[-1])
+        
+        # binary checkpoint every nchkp output files, the last nkeep are kept
+        if nchkp > 0 and int(n/freq)%nchkp == 0:
+            save_checkpoint(chkp_folder,int(n/freq),wnf,
+                            {'time':time, 'n':n, 'dt':solver.dt, 'nx':nx, 'ny':ny, 'input':l1},nkeep)
+        
+        # tresize > 0: the solution is truncated to the grid of half the size once the
+        # energy above its cutoff falls below tresize, the coarse grids of the output 
+        # are the smallest grid
+        if tresize > 0.0 and nx%4 == 0 and ny%4 == 0 and int(nx/2) >= np.max(ndc_list):
+            tail = solver.truncation_error(int(nx/2),int(ny/2))
+            if tail < tresize:
+                solver = solver.truncated(int(nx/2),int(ny/2))
+                release_fftw(nx,ny)
+                with open(resize_log, 'a') as f:
+                    f.write('%d, %.10e, %d, %d, %d, %d, %.6e\n' % (n, time, nx, ny, solver.nx, solver.ny, tail))
+                print('Grid downsized from', nx, 'to', solver.nx, 'at step', n, 'energy above the cutoff', tail)
+                
+                nx, ny = solver.nx, solver.ny
+                dx, dy = lx/np.float64(nx), ly/np.float64(ny)
+                kx, ky, k2 = solver.kx, solver.ky, solver.k2
+                wnf = solver.wnf
+
+if writer is not None:
+    time_writer = tm.time()
+    writer.close()
+    print('Wait for the snapshot writer (s)=', tm.time() - time_writer, ' spilled fields=', writer.nspill,
+          ' dropped figures=', writer.ndrop)
+
+if nens > 1:
+    # final vorticity field in physical space of every member
+    w_ens = np.stack([wave2phy(nx,ny,wnf[m]) for m in range(nens)])
+    
+    # the rest of the post-processing is done for the first member
+    w0_ens = w0
+    w, w0 = w_ens[0], w0_ens[0]
+    re = re_list[0]
+    if ipr == 3:
+        en_ens, n = energy_spectrum(nx,ny,w_ens) # all members in one call
+        for m in range(nens):
+            np.savetxt("../data_spectral/"+members[m]+"/energy_spectral_"+str(nd)+"_"+str(int(re_list[m%len(re_list)]))+".csv", en_ens[m], delimiter=",")
+else:
+    w = wave2phy(nx,ny,wnf) # final vorticity field in physical space            
+
+save_wisdom()
 
 total_clock_time = tm.time() - clock_time_init
 print('Total clock time=', total_clock_time)  
+print('Number of time steps=', nstep)
 
 #%%
 # compute the exact, initial and final energy spectrum for DHIT problem
 if (ipr == 3):
-    en, n = energy_spectrum(nx,ny,w)
-    en0, n = energy_spectrum(nx,ny,w0)
+    en, ne = energy_spectrum(nx,ny,w)
+    en0, n = energy_spectrum(nd,nd,w0) # initial grid (nx < nd after a downsizing)
     k = np.linspace(1,n,n)
     
     k0 = 10.0
     c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))           
     ese = c*(k**4)*np.exp(-(k/k0)**2)
     
-    folder = 'data_'+str(nx)
+    folder = 'data_'+str(nd)
     
     np.savetxt("../data_spectral/"+folder+"energy_spectral_"+str(nd)+"_"+str(int(re))+".csv", en, delimiter=",")
 
 #%%
 # contour plot for initial and final vorticity
-fig, axs = plt.subplots(1,2,sharey=True,figsize=(9,5))
-
-cs = axs[0].contourf(w0.T, 120, cmap = 'jet', interpolation='bilinear')
-axs[0].text(0.4, -0.1, '$t = 0.0$', transform=axs[0].transAxes, fontsize=16, fontweight='bold', va='top')
-
-cs = axs[1].contourf(w.T, 120, cmap = 'jet', interpolation='bilinear')
-axs[1].text(0.4, -0.1, '$t = '+str(dt*nt)+'$', transform=axs[1].transAxes, fontsize=16, fontweight='bold', va='top')
-
-fig.tight_layout() 
-
-fig.subplots_adjust(bottom=0.15)
+add_plot(manifest,'field',"field_spectral.png",{'w0':w0, 'w':w},{'time':float(dt*nt)})
 
-cbar_ax = fig.add_axes([0.22, -0.05, 0.6, 0.04])
-fig.colorbar(cs, cax=cbar_ax, orientation='horizontal')
-plt.show()
-
-fig.savefig("field_spectral.png", bbox_inches = 'tight')
-
-
-#%%
 # energy spectrum plot for DHIT problem
 if (ipr == 3):
-    #en_a = np.loadtxt("energy_arakawa_"+str(nd)+"_"+str(int(re))+".csv") 
-    fig, ax = plt.subplots()
-    fig.set_size_inches(7,5)
-    
-    line = 100*k**(-3.0)
-    
-    ax.loglog(k,ese[:],'k', lw = 2, label='Exact')
-    ax.loglog(k,en0[1:],'r', ls = '--', lw = 2, label='$t = 0.0$')
-    ax.loglog(k,en[1:], 'b', lw = 2, label = '$t = '+str(dt*nt)+'$')
-    #ax.loglog(k,en_a[1:], 'y', lw = 2, label = '$t = '+str(dt*nt)+'$')
-    ax.loglog(k,line, 'g--', lw = 2, label = 'k^-3')
-    
-    plt.xlabel('$K$')
-    plt.ylabel('$E(K)$')
-    plt.legend(loc=0)
-    plt.ylim(1e-16,1e-0)
-    fig.savefig('es_spectral.png', bbox_inches = 'tight', pad_inches = 0)
-
-#%%
-fig = plt.figure(figsize=(10,6))
-ax = fig.gca(projection='3d', proj_type = 'ortho')
-
-X, Y = np.mgrid[0:2.0*np.pi+dx:dx, 0:2.0*np.pi+dy:dy]
-
-surf = ax.plot_surface(X, Y, w, cmap='coolwarm',vmin=-30, vmax=30,
-                       linewidth=0, antialiased=False,rstride=1,
-                        cstride=1)
-
-fig.colorbar(surf, shrink=0.5, aspect=5)
-ax.view_init(elev=60, azim=30)
-plt.show()
-
-fig.savefig("vorticity_3D1.png", dpi=300, bbox_inches = 'tight')
-
-#%%
-def plot_w_ens():
-    lx = 2.0*np.pi
-    ly = 2.0*np.pi
-    nx = 1024
-    ny = 1024
-    nxc = 64
-    dx = lx/np.float64(nx)
-    dy = ly/np.float64(ny)
-    
-    x = np.linspace(0, 2*np.pi, nx+1)
-    y = np.linspace(0, 2*np.pi, ny+1)
-    
-    
-    w0 = decay_ic(nx,ny,dx,dy)
-    
-    folder = "data_"+ str(nx)  
-    
-    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(200)+".csv"
-    w2 = np.genfromtxt(file_input, delimiter=',')
-    
-    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(400)+".csv"
-    w4 = np.genfromtxt(file_input, delimiter=',')
-    
-    fig, axs = plt.subplots(2,2,figsize=(10,9))
-
-    cs = axs[0,0].contour(x,y,w0.T, 10, cmap = 'jet', interpolation='bilinear')
-    axs[0,0].set_xlabel('$x$')
-    axs[0,0].set_ylabel('$y$')
-    axs[0,0].set_title('$t = 0.0$')
-    divider = make_axes_locatable(axs[0,0])
-    cax = divider.append_axes('right', size='5%', pad=0.1)
-    fig.colorbar(cs,cax=cax,orientation='vertical')
-    
-    cs = axs[0,1].contour(x,y,w2.T, 10, cmap = 'jet', interpolation='bilinear')
-    axs[0,1].set_xlabel('$x$')
-    axs[0,1].set_ylabel('$y$')
-    axs[0,1].set_title('$t = 2.0$')   
-    divider = make_axes_locatable(axs[0,1])
-    cax = divider.append_axes('right', size='5%', pad=0.1)
-    fig.colorbar(cs,cax=cax,orientation='vertical')
-    
-    cs = axs[1,0].contour(x,y,w4.T, 10, cmap = 'jet', interpolation='bilinear')
-    axs[1,0].set_xlabel('$x$')
-    axs[1,0].set_ylabel('$y$')
-    axs[1,0].set_title('$t = 4.0$')
-    divider = make_axes_locatable(axs[1,0])
-    cax = divider.append_axes('right', size='5%', pad=0.1)
-    fig.colorbar(cs,cax=cax,orientation='vertical')
-
-    en0, n = energy_spectrum(nx,ny,w0)
-    en2, n = energy_spectrum(nx,ny,w2)
-    en4, n = energy_spectrum(nx,ny,w4)
-    k = np.linspace(1,n,n)
-    
-    k0 = 10.0
-    c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))           
-    ese = c*(k**4)*np.exp(-(k/k0)**2)
-    
-    line = 100*k**(-3.0)
-    
-    #axs[1,1].loglog(k,ese[:],'k', lw = 2, label='Exact')
-    axs[1,1].loglog(k,en0[1:],'r', ls = '-', lw = 2, label='$t = 0.0$')
-    axs[1,1].loglog(k,en2[1:], 'b', lw = 2, label = '$t = 2.0$')
-    axs[1,1].loglog(k,en4[1:], 'y', lw = 2, label = '$t = 4.0$')
-    axs[1,1].loglog(k,line, 'k--', lw = 2)
-    
-    axs[1,1].set_xlabel('$k$')
-    axs[1,1].set_ylabel('$E(k)$')
-    axs[1,1].legend(loc=0)
-    axs[1,1].set_ylim(1e-16,1e-0)
-    axs[1,1].text(0.8, 0.8, '$k^{-3}$', transform=axs[1,1].transAxes, fontsize=16, fontweight='bold', va='top')
-
-    
-    fig.tight_layout() 
-    plt.show()
-    fig.savefig("../data_spectral/"+folder+"/field_spectral.pdf", bbox_inches = 'tight')
-    fig.savefig("../data_spectral/"+folder+"/field_spectral.eps", bbox_inches = 'tight')
-    fig.savefig("../data_spectral/"+folder+"/field_spectral.png", bbox_inches = 'tight',dpi=175)
-
-plot_w_ens()
-    
-
-
-
-
-
-
-
-
-
+    add_plot(manifest,'spectrum','es_spectral.png',{'k':k, 'ese':ese, 'en0':en0, 'en':en},
+             {'time':float(dt*nt)})
 
+add_plot(manifest,'surface',"vorticity_3D1.png",{'w':w},{'dx':float(dx), 'dy':float(dy)})
 
+# iplot = 0: headless, the manifest is rendered later (python render_plots.py <manifest>)
+if iplot == 1:
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),'render_plots.py'), 
+                    manifest])
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:40:12 2026
+
+Distributed-memory version of spectral_solver_DHIT.py for grids that do not fit
+the memory of one process. The vorticity spectrum is decomposed in slabs of ky
+columns over the MPI ranks, 2D FFTs are transpose based (SlabFFT) and the 3/2
+padding of the Jacobian is part of the slab transform. Reads the same input.txt,
+run with
+
+    mpirun -n <p> python spectral_solver_DHIT_mpi.py
+
+where p divides nx, ny and 3nx/2. The solver uses the full complex spectrum and the
+hybrid third-order Runge-Kutta implicit Crank-Nicolson scheme (fixed or adaptive
+time step, double or single precision). The half spectrum, packed Jacobian,
+ETDRK4, ensembles, binary checkpoints, the background writer and the figures are
+options of the serial solver only.
+
+"""
+
+import numpy as np
+from numpy.random import seed
+seed(1)
+import time as tm
+import os
+from mpi4py import MPI
+
+from utils import *
+
+#%%
+def periodic_rows(u, comm):
+    
+    '''
+    add the periodic boundaries to the local rows of a field in physical space, the
+    last rank appends the first row of the field (held by the first rank)
+    
+    Inputs
+    ------
+    u : local rows of the field (excluding periodic boundaries)
+    comm : MPI communicator
+    
+    Output
+    ------
+    ub : local rows with the periodic column, and the periodic row on the last rank
+    '''
+    
+    nxl, ny = u.shape
+    last = (comm.rank == comm.size-1)
+    
+    ub = np.empty((nxl+1 if last else nxl,ny+1), dtype=u.dtype)
+    ub[0:nxl,0:ny] = u
+    
+    if comm.size == 1:
+        ub[nxl,0:ny] = u[0]
+    elif comm.rank == 0:
+        comm.Send(np.ascontiguousarray(u[0]), dest=comm.size-1)
+    elif last:
+        comm.Recv(ub[nxl,0:ny], source=0)
+    
+    ub[:,ny] = ub[:,0]
+    
+    return ub
+
+#%%
+def coarsen(nx,ny,nxc,nyc,uf,cols,comm,hermitian=False):
+    
+    '''
+    coarsen the distributed spectrum: every rank takes the coarse modes of its ky 
+    columns and the coarse spectrum is assembled on the first rank
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on fine grid
+    nxc,nyc : number of grid points in x and y direction on coarse grid
+    uf : local ky columns of the solution field on fine grid in frequency domain
+    cols : slice of the global ky columns of uf
+    comm : MPI communicator
+    hermitian : True for the Hermitian part of the Nyquist modes (see SpectralDHIT)
+    
+    Output
+    ------
+    ufc : coarsened solution in frequency domain (nxc,nyc) on the first rank, None
+          on the others
+    '''
+    
+    # fine ky columns kept on the coarse grid and their coarse index
+    j = np.arange(ny)[cols]
+    keep = (j < int(nyc/2)) | (j >= ny - int(nyc/2))
+    jc = np.where(j < int(nyc/2), j, j - ny + nyc)[keep]
+    
+    ufk = np.concatenate((uf[0:int(nxc/2),keep], uf[int(nx-nxc/2):,keep]))
+    
+    parts = comm.gather((jc,ufk), root=0)
+    if comm.rank != 0:
+        return None
+    
+    ufc = np.zeros((nxc,nyc),dtype=uf.dtype)
+    for jc, ufk in parts:
+        ufc[:,jc] = ufk
+    
+    ufc = ufc*(nxc*nyc)/(nx*ny)
+    if hermitian:
+        hermitian_nyquist(nxc,nyc,ufc)
+    
+    return ufc
+
+#%%
+def energy_spectrum(nx,ny,wf,cols,comm):
+    
+    '''
+    energy spectrum from the distributed vorticity spectrum, shell sums of every rank
+    are added on the first rank (see shell_spectrum)
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    wf : local ky columns of the vorticity field in frequency domain
+    cols : slice of the global ky columns of wf
+    comm : MPI communicator
+    
+    Output
+    ------
+    en : energy spectrum (n+1) on the first rank, None on the others
+    n : maximum wavenumber
+    '''
+    
+    index, counts, ikk, n = shell_index(nx,ny)
+    index = index.reshape(nx,ny)[:,cols]
+    
+    es = np.pi*((np.abs(wf)/(nx*ny))**2)*ikk[:,cols]
+    es = np.bincount(index.ravel(), weights=es.ravel(), minlength=n+2)
+    es = comm.reduce(es, op=MPI.SUM, root=0)
+    
+    if comm.rank != 0:
+        return None, n
+    
+    en = np.zeros(n+1)
+    en[1:] = es[1:n+1]/counts[1:n+1]
+        
+    return en, n
+
+#%% coarsening
+def write_data(nx,ny,nxcs,coarse,solver,n,freq,comm,folder=None):
+    
+    '''
+    write the data to .csv files for post-processing, the fine-grid fields are 
+    written by all ranks together (write_slab_csv), the coarse-grid fields by the
+    first rank
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on fine grid
+    nxcs : list of the coarse grids nxc = nyc
+    coarse : list of SpectralDHIT on the coarse grids (first rank only, None on the
+             others) for the Jacobian of the coarsened solution, all coarse grids 
+             share the Jacobian of the fine grid
+    solver : SpectralDHITMPI holding the solution and its Jacobian
+    n : time step
+    freq : frequency at which to write the data
+    comm : MPI communicator
+    folder : output folder in ../data_spectral (default: data_<nx>)
+    
+    Output/ write
+    ------
+    jc : coarsening of Jacobian computed at fine grid
+    jcoarse : Jacobian computed for coarsed solution field
+    sgs : subgrid scale term
+    w : vorticity in physical space for fine grid (including periodic boundaries)
+    s : streamfunction in physical space for fine grid (including periodic boundaries) 
+    
+    For several coarse grids, jc, jcoarse and sgs of the grid nxc go to the folders 
+    01_coarsened_jacobian_field_<nxc>, 02_jacobian_coarsened_field_<nxc> and 
+    03_subgrid_scale_term_<nxc>
+    '''
+    
+    wf = solver.wnf
+    jf = solver.solution_jacobian() # the Jacobian of the solution is reused by the next step
+    
+    if folder is None:
+        folder = 'data_'+str(nx)
+    if comm.rank == 0:
+        os.makedirs("../data_spectral/"+folder+"/04_vorticity", exist_ok=True)
+        os.makedirs("../data_spectral/"+folder+"/05_streamfunction", exist_ok=True)
+    comm.Barrier()
+    
+    # vorticity and streamfunction (-k2*sf = -wf) on the fine grid
+    w = periodic_rows(solver.fft.backward(wf).real,comm)
+    write_slab_csv("../data_spectral/"+folder+"/04_vorticity/w_"+str(int(n/freq))+".csv", w, comm)
+    
+    s = periodic_rows(solver.fft.backward(wf/solver.k2).real,comm)
+    write_slab_csv("../data_spectral/"+folder+"/05_streamfunction/s_"+str(int(n/freq))+".csv", s, comm)
+    
+    for i, nxc in enumerate(nxcs):
+        nyc = nxc
+        jfc = coarsen(nx,ny,nxc,nyc,jf,solver.fft.cols,comm,solver.hermitian) # coarsened(jacobian field) in frequency domain
+        wfc = coarsen(nx,ny,nxc,nyc,wf,solver.fft.cols,comm,solver.hermitian)
+        
+        if comm.rank == 0:
+            jc = wave2phy(nxc,nyc,jfc) # coarsened(jacobian field) physical space
+            
+            jcoarsef = np.empty_like(wfc) # jacobian(coarsened solution field) in frequency domain
+            coarse[i].jacobian(wfc,jcoarsef)
+            jcoarse = wave2phy(nxc,nyc,jcoarsef) # jacobian(coarsened solution field) physical space
+            
+            sgs = jc - jcoarse
+            
+            suffix = '_'+str(nxc) if len(nxcs) > 1 else ''
+            files = [("../data_spectral/"+folder+"/01_coarsened_jacobian_field"+suffix+"/J_fourier_"+str(int(n/freq))+".csv", jc),
+                     ("../data_spectral/"+folder+"/02_jacobian_coarsened_field"+suffix+"/J_coarsen_"+str(int(n/freq))+".csv", jcoarse),
+                     ("../data_spectral/"+folder+"/03_subgrid_scale_term"+suffix+"/sgs_"+str(int(n/freq))+".csv", sgs)]
+            for filename, u in files:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+            write_snapshot(files)
+    
+    
+#%% 
+comm = MPI.COMM_WORLD
+rank = comm.rank
+nprocs = comm.size
+
+# read input file
+l1 = []
+with open('input.txt') as f:
+    for l in f:
+        l1.append((l.strip()).split("\t"))
+
+nd = np.int64(l1[0][0])
+nt = np.int64(l1[1][0])
+re = np.float64(l1[2][0].split(',')[0])
+dt = np.float64(l1[3][0])
+ns = np.int64(l1[4][0])
+isolver = np.int64(l1[5][0])
+isc = np.int64(l1[6][0])
+ich = np.int64(l1[7][0])
+ipr = np.int64(l1[8][0])
+ndc_list = np.int64(l1[9][0].split(',')) # several coarse grids from one run
+ichkp = np.int64(l1[10][0])
+istart = np.int64(l1[11][0])
+irfft = np.int64(l1[12][0])
+ipack = np.int64(l1[13][0])
+nthreads = np.int64(l1[14][0])
+iplan = np.int64(l1[15][0])
+nens = np.int64(l1[16][0])
+cfl = np.float64(l1[17][0])
+nchkp = np.int64(l1[18][0])
+nkeep = np.int64(l1[19][0])
+nqueue = np.int64(l1[20][0])
+ispill = np.int64(l1[21][0])
+ndiag = np.int64(l1[22][0])
+iprec = np.int64(l1[23][0])
+tresize = np.float64(l1[24][0])
+idealias = np.int64(l1[25][0])
+iplot = np.int64(l1[26][0])
+ihermitian = np.int64(l1[27][0])
+
+freq = int(nt/ns)
+
+if (ich != 19) and rank == 0:
+    print("Check input.txt file")
+
+if rank == 0 and (isolver != 1 or irfft != 0 or ipack != 0 or nens > 1 or ichkp == 2 
+                  or nchkp > 0 or nqueue > 0 or tresize > 0.0 or idealias != 1 or iplot != 0):
+    print("isolver, irfft, ipack, nens, binary checkpoints, nqueue, tresize, idealias and iplot are "
+          "ignored by the distributed solver (RK3/CN, 3/2 padding, fixed grid, no figures)")
+
+# threads and planner effort for all FFTs, every rank reads the wisdom
+init_fftw(nthreads,iplan)
+
+# assign parameters
+nx = nd
+ny = nd
+
+pi = np.pi
+lx = 2.0*pi
+ly = 2.0*pi
+
+dx = lx/np.float64(nx)
+dy = ly/np.float64(ny)
+
+ifile = 0
+time = freq*istart*dt if ichkp == 1 else 0.0
+folder = 'data_'+str(nx)
+diag_file = "../data_spectral/"+folder+"/diagnostics.bin"
+
+#%%
+# every rank sets the rows of the initial condition it holds (no rank holds the field)
+solver = SpectralDHITMPI(nx,ny,re,dt,comm,iprec == 1,ihermitian == 1)
+rows = solver.fft.rows
+
+if ichkp == 1:
+    if rank == 0:
+        print(istart)
+    file_input = "../data_spectral/"+folder+"/04_vorticity/w_"+str(istart)+".csv"
+    wl = read_slab_csv(file_input,rows,comm)
+elif (ipr == 1):
+    wl = tgv_ic(nx,ny,rows) # taylor-green vortex problem
+elif (ipr == 2):
+    wl = vm_ic(nx,ny,rows) # vortex-merger problem
+elif (ipr == 3):
+    # decaying homegeneous isotropic turbulence problem, inverse transform (in double
+    # precision) of the local ky columns of the spectrum, all ranks draw the same phases
+    fft = SlabFFT(nx,ny,comm) if iprec == 1 else solver.fft
+    wl = np.real(fft.backward(decay_spectrum(nx,ny,dx,dy,fft.cols))).copy()
+    del fft
+
+solver.set_vorticity(wl)
+w0f = np.copy(solver.wnf) # for the energy spectrum
+
+# Jacobian of the coarsened solution on the first rank
+coarse = [SpectralDHIT(ndc,ndc,re,dt,single=(iprec == 1),hermitian=(ihermitian == 1)) for ndc in ndc_list] if rank == 0 else None
+
+if rank == 0:
+    print('Number of ranks =', nprocs)
+    print('Memory of work arrays for time integration per rank (MB) =', solver.memory()/1.0e6)
+    save_wisdom()
+
+# ndiag > 0: energy, enstrophy, palinstrophy, dissipation and max vorticity every ndiag
+# steps, appended to diagnostics.bin (read with read_diagnostics), a restart appends
+if ndiag > 0:
+    d = solver.diagnostics()
+    if rank == 0:
+        if not os.path.exists("../data_spectral/"+folder):
+            os.makedirs("../data_spectral/"+folder)
+        if ichkp == 0 and os.path.exists(diag_file):
+            os.remove(diag_file)
+        append_diagnostics(diag_file,time,int(istart*freq) if ichkp == 1 else 0,d)
+
+#%%
+comm.Barrier()
+clock_time_init = tm.time()
+# time integration using hybrid third-order Runge-Kutta implicit Crank-Nicolson scheme
+# refer to Orlandi: Fluid flow phenomenon
+# cfl > 0: adaptive time step, output is written at the times n*dt (n%freq == 0) of
+# the fixed step dt from input.txt
+n = int(istart*freq) if ichkp == 1 else 0
+nstep = 0
+while n < nt:
+    if cfl > 0.0:
+        t_out = (n + freq)*dt
+        solver.step(cfl, t_out - time)
+        time = time + solver.dt
+        output = (time >= t_out - 1.0e-9*dt)
+        if output:
+            time = t_out
+            n = n + freq
+    else:
+        solver.step()
+        time = time + dt
+        n = n + 1
+        output = (n%freq == 0)
+    nstep = nstep + 1
+    
+    if ndiag > 0 and nstep%ndiag == 0:
+        d = solver.diagnostics()
+        if rank == 0:
+            append_diagnostics(diag_file,time,n,d)
+    
+    if output:
+        write_data(nx,ny,ndc_list,coarse,solver,n,freq,comm)
+        if rank == 0:
+            print(n, " ", time, " ",nx, " ", ny)
+
+comm.Barrier()
+total_clock_time = tm.time() - clock_time_init
+
+#%%
+# compute the initial and final energy spectrum for DHIT problem
+if (ipr == 3):
+    # spectrum of the real vorticity field (as the serial solver)
+    wf = np.copy(solver.fft.forward(solver.vorticity()))
+    en, n = energy_spectrum(nx,ny,wf,solver.fft.cols,comm)
+    en0, n = energy_spectrum(nx,ny,w0f,solver.fft.cols,comm)
+    
+    if rank == 0:
+        np.savetxt("../data_spectral/"+folder+"energy_spectral_"+str(nd)+"_"+str(int(re))+".csv", en, delimiter=",")
+
+if rank == 0:
+    save_wisdom()
+    
+    print('Total clock time=', total_clock_time)  
+    print('Number of time steps=', nstep)
@@ -0,0 +1,2277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:37 2026
+
+Shared FFTW plans and aligned work buffers for the pseudo-spectral DHIT solver.
+Plans are built once per transform signature and reused for every call, so that
+a time step only executes FFTs and never plans or allocates them.
+
+"""
+import numpy as np
+import pyfftw
+import os
+import io
+import json
+import pickle
+import socket
+import queue
+import threading
+import warnings
+
+#%%
+# number of threads and planner effort for every FFTW object, set by init_fftw
+planner_flags = {0: 'FFTW_ESTIMATE', 1: 'FFTW_MEASURE', 2: 'FFTW_PATIENT'}
+fftw_options = {'threads': 1, 'flags': ('FFTW_MEASURE',)}
+
+def wisdom_file():
+
+    '''
+    name of the file holding the FFTW wisdom of this machine
+
+    Output
+    ------
+    filename : ~/.fftw_wisdom/wisdom_<hostname>.pkl
+    '''
+
+    return os.path.join(os.path.expanduser('~'), '.fftw_wisdom',
+                        'wisdom_'+socket.gethostname()+'.pkl')
+
+#%%
+def init_fftw(threads=1, iplan=1, filename=None):
+
+    '''
+    set the number of threads and the planner effort of all FFTW objects and import
+    the wisdom saved by earlier runs, so that repeated plans at the same resolution
+    are created without measuring again
+
+    Inputs
+    ------
+    threads : number of threads used by each transform
+    iplan : planner effort [0]FFTW_ESTIMATE, [1]FFTW_MEASURE, [2]FFTW_PATIENT
+    filename : wisdom file (default: wisdom_file())
+    '''
+
+    fftw_options['threads'] = int(threads)
+    fftw_options['flags'] = (planner_flags[int(iplan)],)
+
+    if filename is None:
+        filename = wisdom_file()
+
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            pyfftw.import_wisdom(pickle.load(f))
+
+#%%
+def save_wisdom(filename=None):
+
+    '''
+    export the FFTW wisdom accumulated in this run to the wisdom file
+
+    Inputs
+    ------
+    filename : wisdom file (default: wisdom_file())
+    '''
+
+    if filename is None:
+        filename = wisdom_file()
+
+    folder = os.path.dirname(filename)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    with open(filename, 'wb') as f:
+        pickle.dump(pyfftw.export_wisdom(), f)
+
+#%%
+# shell index of the energy spectrum for every grid used
+spectrum_shells = {}
+
+def shell_index(nx,ny):
+
+    '''
+    shell of every wavenumber of the (nx,ny) grid for the energy spectrum. Shell k
+    holds the wavenumbers k-0.5 < |k| < k+0.5 (k = 1,...,n), the kx = 0 row, the
+    ky = 0 column and |k| > n+0.5 go to the discarded shell n+1. Computed once per grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+
+    Output
+    ------
+    index : shell index of the flattened (nx,ny) spectrum
+    counts : number of wavenumbers in each shell (n+2)
+    ikk : 1/|k| (nx,ny)
+    n : maximum wavenumber
+    '''
+
+    key = (nx,ny)
+    if key in spectrum_shells:
+        return spectrum_shells[key]
+
+    epsilon = 1.0e-6
+
+    kx = np.fft.fftfreq(nx,1/nx)
+    ky = np.fft.fftfreq(ny,1/ny)
+    kx[0] = epsilon
+    ky[0] = epsilon
+
+    kk = np.sqrt(kx.reshape(nx,1)**2 + ky.reshape(1,ny)**2)
+
+    n = int(np.sqrt(nx*nx + ny*ny)/2.0)-1
+
+    index = np.rint(kk).astype(np.int64)
+    index[index > n] = n+1
+    index[0,:] = n+1
+    index[:,0] = n+1
+    index = index.ravel()
+
+    counts = np.bincount(index, minlength=n+2)
+
+    spectrum_shells[key] = (index, counts, 1.0/kk, n)
+
+    return spectrum_shells[key]
+
+#%%
+def shell_spectrum(nx,ny,wf):
+
+    '''
+    energy spectrum from the vorticity in frequency domain, the shell sums of
+    pi*|wf|^2/|k| of all snapshots are computed by a single bincount
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    wf : vorticity field in frequency domain (full spectrum), (nx,ny) or a batch
+         of snapshots (nb,nx,ny)
+
+    Output
+    ------
+    en : energy spectrum (n+1) or (nb,n+1), en[0] = 0
+    n : maximum wavenumber
+    '''
+
+    index, counts, ikk, n = shell_index(nx,ny)
+
+    es = np.pi*((np.abs(wf)/(nx*ny))**2)*ikk
+    nb = es.size//(nx*ny)
+
+    # snapshot b uses the bins b*(n+2),...,b*(n+2)+n+1
+    bins = (index + (n+2)*np.arange(nb).reshape(nb,1)).ravel()
+    es = np.bincount(bins, weights=es.ravel(), minlength=nb*(n+2)).reshape(nb,n+2)
+
+    en = np.zeros((nb,n+1))
+    en[:,1:] = es[:,1:n+1]/counts[1:n+1]
+
+    return en.reshape(wf.shape[:-2]+(n+1,)), n
+
+#%%
+def append_diagnostics(filename, time, n, d):
+
+    '''
+    append a record of the diagnostics time series to a binary file of float64
+    records [time, n, d.ravel()] (see SpectralDHIT.diagnostics)
+
+    Inputs
+    ------
+    filename : time series file
+    time : time
+    n : time step
+    d : diagnostics (5,) or (5,nb)
+    '''
+
+    with open(filename, 'ab') as f:
+        np.concatenate(([time, n], np.ravel(d))).astype(np.float64).tofile(f)
+
+#%%
+def read_diagnostics(filename, nb=0):
+
+    '''
+    read the diagnostics time series written by append_diagnostics
+
+    Inputs
+    ------
+    filename : time series file
+    nb : [0] single realization, [nb > 0] number of ensemble members
+
+    Output
+    ------
+    time : time of every record
+    n : time step of every record
+    d : diagnostics (nrec,5) or (nrec,5,nb)
+    '''
+
+    ncol = 5*max(nb,1)
+    data = np.fromfile(filename, dtype=np.float64).reshape(-1, 2+ncol)
+
+    d = data[:,2:] if nb == 0 else data[:,2:].reshape(-1,5,nb)
+
+    return data[:,0], data[:,1].astype(np.int64), d
+
+#%%
+def truncate_diagnostics(filename, n, nb=0):
+
+    '''
+    drop the records of the diagnostics time series from time step n on, so that a
+    run restarted at step n does not repeat them
+
+    Inputs
+    ------
+    filename : time series file
+    n : time step of the restart
+    nb : [0] single realization, [nb > 0] number of ensemble members
+    '''
+
+    ncol = 5*max(nb,1)
+    data = np.fromfile(filename, dtype=np.float64).reshape(-1, 2+ncol)
+
+    data[data[:,1] < n].tofile(filename)
+
+#%%
+def save_checkpoint(folder, k, wf, state, nkeep=2):
+
+    '''
+    write a binary checkpoint: the spectrum to chkp_<k>.npy and the rest of the state
+    (time, step, dt, random number generator state, input parameters) to chkp_<k>.pkl.
+    Both files are written to a temporary name first and the .pkl file last, so that
+    a checkpoint with a .pkl file is complete. Only the last nkeep checkpoints are kept
+
+    Inputs
+    ------
+    folder : checkpoint folder
+    k : checkpoint index (output file number)
+    wf : vorticity field in frequency domain
+    state : dictionary of the remaining state
+    nkeep : number of checkpoints kept in the folder (0 keeps all)
+    '''
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    base = os.path.join(folder, 'chkp_'+str(k))
+
+    with open(base+'.npy.tmp', 'wb') as f:
+        np.save(f, wf)
+    os.replace(base+'.npy.tmp', base+'.npy')
+
+    state = dict(state, rng=np.random.get_state())
+    with open(base+'.pkl.tmp', 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(base+'.pkl.tmp', base+'.pkl')
+
+    if nkeep > 0:
+        for i in checkpoints(folder)[:-nkeep]:
+            for ext in ('.pkl', '.npy'):
+                os.remove(os.path.join(folder, 'chkp_'+str(i)+ext))
+
+#%%
+def checkpoints(folder):
+
+    '''
+    indices of the complete checkpoints in folder
+
+    Output
+    ------
+    ks : sorted list of checkpoint indices
+    '''
+
+    if not os.path.exists(folder):
+        return []
+
+    ks = [int(f[5:-4]) for f in os.listdir(folder)
+          if f.startswith('chkp_') and f.endswith('.pkl')]
+
+    return sorted(ks)
+
+#%%
+def load_checkpoint(folder, k=-1):
+
+    '''
+    read a binary checkpoint written by save_checkpoint and restore the state of the
+    random number generator
+
+    Inputs
+    ------
+    folder : checkpoint folder
+    k : checkpoint index (-1 for the latest)
+
+    Output
+    ------
+    wf : vorticity field in frequency domain (memory-mapped, read only)
+    state : dictionary of the remaining state
+    '''
+
+    if k < 0:
+        ks = checkpoints(folder)
+        if not ks:
+            raise FileNotFoundError('no checkpoint in '+folder)
+        k = ks[-1]
+
+    base = os.path.join(folder, 'chkp_'+str(k))
+
+    with open(base+'.pkl', 'rb') as f:
+        state = pickle.load(f)
+    np.random.set_state(state['rng'])
+
+    wf = np.load(base+'.npy', mmap_mode='r')
+
+    return wf, state
+
+#%%
+def write_snapshot(files, plot=None):
+
+    '''
+    write the fields of a snapshot to .csv files and render its figure
+
+    Inputs
+    ------
+    files : list of (filename, field); a field given as the name of a .npy file
+            (spilled by SnapshotWriter) is read and the .npy file removed
+    plot : (function, arguments) rendering the figure, or None
+    '''
+
+    for filename, u in files:
+        if isinstance(u, str):
+            spill, u = u, np.load(u)
+            os.remove(spill)
+        # single-precision fields are written with the 9 digits they carry
+        np.savetxt(filename, u, delimiter=",", fmt='%.8e' if u.dtype == np.float32 else '%.18e')
+
+    if plot is not None:
+        plot[0](*plot[1])
+
+#%%
+def add_plot(manifest, kind, filename, arrays, args=None):
+
+    '''
+    store the data of a figure in a .npz file next to the image and append the figure
+    to the plot manifest, which is rendered by render_plots.py (the solver itself
+    does no figure work). Each line of the manifest is a JSON object with the kind of
+    figure, the image and data files (relative to the manifest) and the scalar arguments
+
+    Inputs
+    ------
+    manifest : name of the manifest file (JSON lines)
+    kind : kind of figure, a plotting function of render_plots.py
+    filename : name of the image file
+    arrays : dict of the arrays plotted
+    args : dict of the scalar arguments of the plotting function
+    '''
+
+    root = os.path.dirname(manifest) or '.'
+    os.makedirs(root, exist_ok=True)
+
+    data = os.path.splitext(filename)[0]+'.npz'
+    np.savez(data, **arrays)
+
+    entry = {'kind': kind,
+             'filename': os.path.relpath(filename, root),
+             'data': os.path.relpath(data, root),
+             'args': {} if args is None else args}
+
+    with open(manifest, 'a') as f:
+        f.write(json.dumps(entry)+'\n')
+
+#%%
+class SnapshotWriter:
+
+    '''
+    background thread doing the serialization and plotting of the snapshots (see
+    write_snapshot), fed by a bounded queue. The submitted fields are owned by the
+    writer and must not be modified afterwards. When the queue is full:
+        'block' : wait for a free slot (the time loop stalls)
+        'drop'  : drop the figure of the snapshot and hold its fields in an
+                  unbounded in-memory queue (nothing is written to the spill
+                  folder), the figures of queued snapshots are skipped while the
+                  writer is behind
+        'spill' : save the fields to .npy files (fast binary write) and queue a
+                  reference, the .csv files are written when the writer catches up
+
+    Inputs
+    ------
+    maxsize : number of snapshots held in memory by the queue
+    policy : 'block', 'drop' or 'spill'
+    folder : folder of the spilled fields
+    '''
+
+    def __init__(self, maxsize=4, policy='block', folder='spill'):
+
+        self.policy = policy
+        self.folder = folder
+        self.queue = queue.Queue(maxsize)
+        self.overflow = queue.Queue()
+        self.nspill = 0
+        self.ndrop = 0
+        self.lock = threading.Lock() # ndrop is counted by both threads
+        self.error = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, files, plot=None):
+
+        '''
+        queue a snapshot
+
+        Inputs
+        ------
+        files : list of (filename, field)
+        plot : (function, arguments) rendering the figure, or None
+        '''
+
+        if self.error is not None:
+            raise self.error
+
+        if self.policy == 'block':
+            self.queue.put((files, plot))
+            return
+
+        try:
+            self.queue.put_nowait((files, plot))
+        except queue.Full:
+            if self.policy == 'drop':
+                if plot is not None:
+                    self.count_drop()
+                self.overflow.put((files, None))
+                return
+
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+
+            spilled = []
+            for filename, u in files:
+                spill = os.path.join(self.folder, 'spill_'+str(self.nspill)+'.npy')
+                np.save(spill, u)
+                spilled.append((filename, spill))
+                self.nspill += 1
+
+            self.overflow.put((spilled, plot))
+
+    def run(self):
+
+        '''
+        write the queued snapshots, the spilled ones when the queue is empty
+        '''
+
+        while True:
+            try:
+                files, plot = self.queue.get(timeout=0.05)
+            except queue.Empty:
+                try:
+                    files, plot = self.overflow.get_nowait()
+                except queue.Empty:
+                    if self.closed:
+                        return
+                    continue
+
+            if self.policy == 'drop' and plot is not None and not self.queue.empty():
+                plot = None
+                self.count_drop()
+
+            try:
+                write_snapshot(files, plot)
+            except Exception as e:
+                self.error = e
+
+    def count_drop(self):
+
+        '''
+        count a dropped figure
+        '''
+
+        with self.lock:
+            self.ndrop += 1
+
+    def close(self):
+
+        '''
+        wait until all snapshots are written
+        '''
+
+        self.closed = True
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+#%%
+# FFTW objects (with their own aligned input/output arrays) and scratch buffers
+fftw_plans = {}
+work_buffers = {}
+
+def get_fftw(shape, dtype='complex128', direction='FFTW_FORWARD',
+             flags=None, axes=(0,1), threads=None):
+
+    '''
+    return the cached FFTW object for a transform, planning it on first use
+
+    Inputs
+    ------
+    shape : shape of the array to be transformed
+    dtype : data type of the array in physical space, a real dtype gives the
+            real-to-complex (forward) or complex-to-real (backward) transform
+            with the Hermitian half spectrum stored along the last axis
+    direction : 'FFTW_FORWARD' or 'FFTW_BACKWARD'
+    flags : FFTW planner flags (default: set by init_fftw)
+    axes : axes along which the transform is computed
+    threads : number of threads (default: set by init_fftw)
+
+    Output
+    ------
+    fft_object : pyfftw.FFTW object owning aligned input and output arrays
+    '''
+
+    if flags is None:
+        flags = fftw_options['flags']
+    if threads is None:
+        threads = fftw_options['threads']
+
+    key = (tuple(shape), np.dtype(dtype).name, direction, tuple(flags), tuple(axes), threads)
+
+    if key not in fftw_plans:
+        if np.dtype(dtype).kind == 'f':
+            shapeh = list(shape)
+            shapeh[axes[-1]] = int(shape[axes[-1]]/2) + 1
+            dtypeh = np.result_type(dtype, np.complex64)
+
+            if direction == 'FFTW_FORWARD':
+                a = pyfftw.empty_aligned(shape, dtype=dtype)
+                b = pyfftw.empty_aligned(shapeh, dtype=dtypeh)
+            else:
+                a = pyfftw.empty_aligned(shapeh, dtype=dtypeh)
+                b = pyfftw.empty_aligned(shape, dtype=dtype)
+        else:
+            a = pyfftw.empty_aligned(shape, dtype=dtype)
+            b = pyfftw.empty_aligned(shape, dtype=dtype)
+
+        fftw_plans[key] = pyfftw.FFTW(a, b, axes=axes, direction=direction, flags=flags,
+                                      threads=threads)
+
+    return fftw_plans[key]
+
+#%%
+def release_fftw(nx, ny):
+
+    '''
+    drop the cached plans, work buffers and grid operators of the (nx,ny) grid and of
+    its 3/2 padded grid, e.g. after the solver has moved to a smaller grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    '''
+
+    grids = [(nx,ny), (int(nx*3/2),int(ny*3/2))]
+
+    for key in [key for key in fftw_plans if tuple(key[0][-2:]) in grids]:
+        del fftw_plans[key]
+    for key in [key for key in work_buffers if tuple(key[1][-2:]) in grids]:
+        del work_buffers[key]
+    for key in [key for key in grid_cache if key[0:2] in grids]:
+        del grid_cache[key]
+
+#%%
+def get_buffer(name, shape, dtype='complex128'):
+
+    '''
+    return a cached aligned scratch array (contents are not initialized)
+
+    Inputs
+    ------
+    name : label of the buffer, distinct labels give distinct arrays
+    shape : shape of the buffer
+    dtype : data type of the buffer
+
+    Output
+    ------
+    u : aligned array of given shape and data type
+    '''
+
+    key = (name, tuple(shape), np.dtype(dtype).name)
+
+    if key not in work_buffers:
+        work_buffers[key] = pyfftw.empty_aligned(shape, dtype=dtype)
+
+    return work_buffers[key]
+
+#%%
+def fftw_execute(fft_object, u):
+
+    '''
+    copy the data into the internal input array of a cached FFTW object and
+    execute the transform. The data is always copied so that the cached object
+    never rebinds to the caller's array.
+
+    Inputs
+    ------
+    fft_object : cached pyfftw.FFTW object
+    u : data to be transformed
+
+    Output
+    ------
+    v : internal output array of fft_object (overwritten by the next execution)
+    '''
+
+    fft_object.input_array[...] = u
+
+    return fft_object()
+
+#%%
+def is_half(ny,uf):
+
+    '''
+    check if a field in frequency domain is stored as the Hermitian half spectrum
+    (ny/2+1 coefficients along y) of a real-to-complex transform
+
+    Inputs
+    ------
+    ny : number of grid points in y direction
+    uf : solution field in frequency domain
+
+    Output
+    ------
+    True for the half spectrum, False for the full complex spectrum
+    '''
+
+    return uf.shape[-1] == int(ny/2) + 1
+
+#%%
+def fft_dtype(ny,uf):
+
+    '''
+    data type of the physical-space array of the transforms of a spectrum
+
+    Inputs
+    ------
+    ny : number of grid points in y direction
+    uf : solution field in frequency domain
+
+    Output
+    ------
+    dtype : real type of the precision of uf for the half spectrum, dtype of uf otherwise
+    '''
+
+    return np.finfo(uf.dtype).dtype if is_half(ny,uf) else uf.dtype
+
+#%%
+def wavenumbers(nx,ny,half=False):
+
+    '''
+    compute the wavenumbers for the full or the Hermitian half spectrum
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    half : True for the half spectrum of a real-to-complex transform
+
+    Output
+    ------
+    kx,ky : wavenumber in x and y direction
+    k2 : absolute wave number over 2D domain (k2[0,0] set to 1.0e-12)
+    '''
+
+    kx = np.fft.fftfreq(nx,1/nx)
+    if half:
+        ky = np.fft.rfftfreq(ny,1/ny)
+    else:
+        ky = np.fft.fftfreq(ny,1/ny)
+
+    kx = kx.reshape(nx,1)
+    ky = ky.reshape(1,ky.shape[0])
+
+    k2 = kx*kx + ky*ky
+    k2[0,0] = 1.0e-12
+
+    return kx, ky, k2
+
+#%%
+def pad_spectrum(nx,ny,nxe,nye,uf,ufe):
+
+    '''
+    zero-pad the Fourier coefficients from (nx,ny) grid to (nxe,nye) grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on original grid
+    nxe,nye : number of grid points in x and y direction on padded grid
+    uf : solution field in frequency domain on the original grid (full or half spectrum)
+    ufe : padded array to be filled in place (same layout as uf)
+    '''
+
+    ufe[:,:] = 0.0
+
+    if is_half(ny,uf):
+        ufe[0:int(nx/2),0:int(ny/2)+1] = uf[0:int(nx/2),:]
+        ufe[int(nxe-nx/2):,0:int(ny/2)+1] = uf[int(nx/2):,:]
+        nyquist_pad_half(nx,ny,ufe)
+        return
+
+    ufe[0:int(nx/2),0:int(ny/2)] = uf[0:int(nx/2),0:int(ny/2)]
+    ufe[int(nxe-nx/2):,0:int(ny/2)] = uf[int(nx/2):,0:int(ny/2)]
+    ufe[0:int(nx/2),int(nye-ny/2):] = uf[0:int(nx/2),int(ny/2):]
+    ufe[int(nxe-nx/2):,int(nye-ny/2):] =  uf[int(nx/2):,int(ny/2):]
+
+#%%
+def truncate_spectrum(nx,ny,nxe,nye,ufe,uf,hermitian=False):
+
+    '''
+    truncate the Fourier coefficients from (nxe,nye) grid to (nx,ny) grid
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on truncated grid
+    nxe,nye : number of grid points in x and y direction on original grid
+    ufe : solution field in frequency domain on the original grid (full or half spectrum)
+    uf : truncated array to be filled in place (same layout as ufe)
+    hermitian : True to keep only the Hermitian part of the Nyquist modes of the
+                full spectrum (see hermitian_nyquist), as the half spectrum does
+    '''
+
+    if is_half(ny,uf):
+        uf[0:int(nx/2),:] = ufe[0:int(nx/2),0:int(ny/2)+1]
+        uf[int(nx/2):,:] = ufe[int(nxe-nx/2):,0:int(ny/2)+1]
+        nyquist_truncate_half(nx,ny,ufe,uf)
+        return
+
+    uf[0:int(nx/2),0:int(ny/2)] = ufe[0:int(nx/2),0:int(ny/2)]
+    uf[int(nx/2):,0:int(ny/2)] = ufe[int(nxe-nx/2):,0:int(ny/2)]
+    uf[0:int(nx/2),int(ny/2):] = ufe[0:int(nx/2),int(nye-ny/2):]
+    uf[int(nx/2):,int(ny/2):] =  ufe[int(nxe-nx/2):,int(nye-ny/2):]
+    if hermitian:
+        hermitian_nyquist(nx,ny,uf)
+
+#%%
+def hermitian_nyquist(nx,ny,ufe):
+
+    '''
+    replace the rows and columns of the padded full spectrum that hold the Nyquist
+    modes of the (nx,ny) grid (kx = +-nx/2, ky = +-ny/2) by their Hermitian part in place.
+    After padding, the Nyquist modes of the original grid sit at -nx/2 only, so that
+    the inverse transform is complex; the Hermitian part gives its real part exactly.
+    Since the derivative factors are Hermitian on the padded grid, their product with
+    the projected spectrum transforms to the real part of the derivative fields.
+    On the (nx,ny) grid itself (nxe = nx, nye = ny), it keeps the part of the Nyquist
+    modes of a truncated spectrum that the real field holds.
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on original grid
+    ufe : padded full spectrum (nxe,nye) or stack of spectra (nb,nxe,nye)
+    '''
+
+    nxe, nye = ufe.shape[-2:]
+    rows = [int(nx/2), int(nxe-nx/2)]
+    cols = [int(ny/2), int(nye-ny/2)]
+
+    # the mirror of (kx,ky) is (-kx,-ky)
+    mx = (-np.arange(nxe))%nxe
+    my = (-np.arange(nye))%nye
+
+    ur = ufe[...,rows,:]
+    ufe[...,rows,:] = 0.5*(ur + np.conj(ur[...,::-1,:][...,my]))
+
+    uc = ufe[...,cols]
+    ufe[...,cols] = 0.5*(uc + np.conj(uc[...,mx,:][...,::-1]))
+
+#%%
+def nyquist_pad_half(nx,ny,ufe):
+
+    '''
+    split the Nyquist modes of the (nx,ny) grid in a padded half spectrum in place,
+    as the real part of the padded full spectrum does (see hermitian_nyquist). The
+    ky = ny/2 column is an ordinary mode of the padded grid whose conjugate at -ny/2
+    is implied, so it is kept at half amplitude; the kx = -nx/2 row is shared at half
+    amplitude with the empty +nx/2 row.
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on original grid
+    ufe : padded half spectrum (nxe,nye/2+1) or stack of spectra filled by the
+          block copy of the original half spectrum (the +nx/2 row is zero)
+    '''
+
+    nxe = ufe.shape[-2]
+    hx, hy = int(nx/2), int(ny/2)
+
+    corner = ufe[...,nxe-hx,hy].copy()
+    ufe[...,hy] *= 0.5
+    ufe[...,nxe-hx,hy] = 0.0
+    ufe[...,hx,hy] = 0.5*np.conj(corner)
+
+    ufe[...,nxe-hx,0:hy] *= 0.5
+    ufe[...,hx,0:hy] = ufe[...,nxe-hx,0:hy]
+    ufe[...,hx,0] = np.conj(ufe[...,nxe-hx,0])
+
+#%%
+def nyquist_truncate_half(nx,ny,ufe,uf,scale=1.0):
+
+    '''
+    Nyquist modes of the half spectrum truncated to the (nx,ny) grid in place: the
+    kx = -nx/2 row collects the modes at +-nx/2 of the larger grid and the ky = ny/2
+    column keeps its Hermitian part, which is all the real field on the (nx,ny) grid
+    holds of the modes at +-ny/2 (the truncated full spectrum leaves the rest in its
+    imaginary part)
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction on truncated grid
+    ufe : half spectrum on the larger grid (or stack of spectra)
+    uf : half spectrum truncated by the block copy, Nyquist modes are overwritten
+    scale : factor applied to the block copy
+    '''
+
+    nxe = ufe.shape[-2]
+    hx, hy = int(nx/2), int(ny/2)
+
+    uf[...,hx,0:hy] = 0.5*scale*(ufe[...,nxe-hx,0:hy] + ufe[...,hx,0:hy])
+
+    # the mirror of kx on the truncated grid
+    mx = (-np.arange(nx))%nx
+    uc = uf[...,hy]
+    uf[...,hy] = 0.5*(uc + np.conj(uc[...,mx]))
+    uf[...,hx,hy] = scale*ufe[...,hx,hy].real
+
+#%%
+def tgv_ic(nx,ny,rows=np.s_[:]):
+    
+    '''
+    compute initial condition for TGV problem
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    rows : global rows of the field to compute (default: all, with the periodic row)
+    
+    Output
+    ------
+    w : initial condiition for vorticity for TGV problem
+    '''
+    
+    nq = 4.0
+    x = np.linspace(0.0,2.0*np.pi,nx+1)[rows]
+    y = np.linspace(0.0,2.0*np.pi,ny+1)
+    x, y = np.meshgrid(x, y, indexing='ij')
+    
+    w = 2.0*nq*np.cos(nq*x)*np.cos(nq*y)
+
+    return w
+
+#%%
+def vm_ic(nx,ny,rows=np.s_[:]):
+    
+    '''
+    compute initial condition for vortex-merger problem
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    rows : global rows of the field to compute (default: all, with the periodic row)
+    
+    Output
+    ------
+    w : initial condiition for vorticity for vortex-merger problem
+    '''
+    
+    sigma = np.pi
+    xc1 = np.pi-np.pi/4.0
+    yc1 = np.pi
+    xc2 = np.pi+np.pi/4.0
+    yc2 = np.pi
+    
+    x = np.linspace(0.0,2.0*np.pi,nx+1)[rows]
+    y = np.linspace(0.0,2.0*np.pi,ny+1)
+    
+    x, y = np.meshgrid(x, y, indexing='ij')
+    
+    w = np.exp(-sigma*((x-xc1)**2 + (y-yc1)**2)) \
+            + np.exp(-sigma*((x-xc2)**2 + (y-yc2)**2))
+
+    return w
+
+#%%
+def decay_spectrum(nx,ny,dx,dy,cols=np.s_[:]):
+    
+    '''
+    spectrum of the initial vorticity for DHIT problem (energy spectrum with peak at
+    k0 = 10 and random phases from the global random number generator). The phases
+    are drawn in blocks of rows, the same numbers as one draw of the full arrays, and
+    only the columns needed for the ky columns cols are kept
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    dx,dy : grid spacing in x and y direction
+    cols : global ky columns of the spectrum to compute (default: all)
+    
+    Output
+    ------
+    wf : columns cols of the (nx,ny) vorticity spectrum
+    '''
+    
+    epsilon = 1.0e-6
+    hx, hy = int(nx/2), int(ny/2)
+    
+    kx = np.empty(nx)
+    ky = np.empty(ny)
+    
+    kx[0:hx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(0,hx))
+    kx[hx:nx] = 2*np.pi/(np.float64(nx)*dx)*np.float64(np.arange(-hx,0))
+
+    ky[0:ny] = kx[0:ny]
+    
+    kx[0] = epsilon
+    ky[0] = epsilon
+    
+    # ky and ny-ky take their phase from the same column of ksi and eta
+    jy = np.arange(ny)[cols]
+    j = np.where(jy <= hy, jy, ny-jy)
+    
+    nb = max(1, int(2**20/(hy+1)))
+    ksi = np.empty((hx+1,len(jy)))
+    eta = np.empty((hx+1,len(jy)))
+    for a in (ksi, eta):
+        for i in range(0,hx+1,nb):
+            a[i:i+nb] = 2.0*np.pi*np.random.random_sample((min(nb,hx+1-i), hy+1))[:,j]
+    
+    # (kx,ky) : ksi + eta, (-kx,ky) : -ksi + eta, (kx,-ky) : ksi - eta, (-kx,-ky) : -ksi - eta
+    sy = np.where(jy < hy, 1.0, -1.0)
+    mask = (jy != 0) & (jy != hy)
+    
+    phase = np.zeros((nx,len(jy)), dtype='complex128')
+    for rows, sx in ((np.s_[1:hx], 1.0), (np.s_[nx-1:hx:-1], -1.0)):
+        theta = sx*ksi[1:hx] + sy*eta[1:hx]
+        phase[rows].real = np.where(mask, np.cos(theta), 0.0)
+        phase[rows].imag = np.where(mask, np.sin(theta), 0.0)
+    
+    kx, ky = np.meshgrid(kx, ky[jy], indexing='ij')
+    
+    k0 = 10.0
+    c = 4.0/(3.0*np.sqrt(np.pi)*(k0**5))           
+    
+    kk = np.sqrt(kx[:,:]**2 + ky[:,:]**2)
+    es = c*(kk**4)*np.exp(-(kk/k0)**2)
+    wf = np.sqrt((kk*es/np.pi)) * phase[:,:]*(nx*ny)
+    
+    return wf
+
+#%%
+# set initial condition for decay of turbulence problem
+def decay_ic(nx,ny,dx,dy):
+    
+    '''
+    assign initial condition for vorticity for DHIT problem
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    dx,dy : grid spacing in x and y direction
+    
+    Output
+    ------
+    w : initial condition for vorticity for DHIT problem
+    '''
+    
+    w = np.empty((nx+1,ny+1))
+    
+    wf = decay_spectrum(nx,ny,dx,dy)
+            
+    fft_object_inv = get_fftw((nx,ny), direction = 'FFTW_BACKWARD')
+    ut = np.real(fftw_execute(fft_object_inv,wf)) 
+    
+    #periodicity
+    w[0:nx,0:ny] = ut
+    w[:,ny] = w[:,0]
+    w[nx,:] = w[0,:]
+    w[nx,ny] = w[0,0] 
+    
+    return w
+
+#%%
+def wave2phy(nx,ny,uf):
+    
+    '''
+    Converts the field form frequency domain to the physical space.
+    
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    uf : solution field in frequency domain (excluding periodic boundaries),
+         full or Hermitian half spectrum
+    
+    Output
+    ------
+    u : solution in physical space (along with periodic boundaries)
+    '''
+    
+    u = np.empty((nx+1,ny+1), dtype=np.finfo(uf.dtype).dtype)
+    
+    if is_half(ny,uf):
+        fft_object_inv = get_fftw((nx,ny), fft_dtype(ny,uf), direction = 'FFTW_BACKWARD')
+        u[0:nx,0:ny] = fftw_execute(fft_object_inv,uf)
+    else:
+        fft_object_inv = get_fftw((nx,ny), fft_dtype(ny,uf), direction = 'FFTW_BACKWARD')
+        u[0:nx,0:ny] = np.real(fftw_execute(fft_object_inv,uf))
+    # periodic BC
+    u[:,ny] = u[:,0]
+    u[nx,:] = u[0,:]
+    
+    return u
+
+#%%
+# wavenumbers, masks, plans and scratch buffers of every grid used
+grid_cache = {}
+
+class GridOperators:
+
+    '''
+    operators of the (nx,ny) grid which only depend on the resolution, the layout
+    of the spectrum and the precision: wavenumbers of the grid and of its 3/2 padded
+    grid, the 2/3-rule dealiasing mask, FFTW plans of both grids and scratch arrays.
+    Built once per grid by grid_operators and shared by the solvers, the coarsening
+    and the a-priori analysis, the arrays are read-only.
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    half : True for the Hermitian half spectrum of a real-to-complex transform
+    dtype : complex data type of the spectra (complex128 or complex64)
+    '''
+
+    def __init__(self, nx, ny, half=False, dtype='complex128'):
+
+        self.nx, self.ny = nx, ny
+        self.half = half
+        self.cdtype = np.dtype(dtype)
+        self.rdtype = np.finfo(self.cdtype).dtype
+
+        self.kx, self.ky, self.k2 = wavenumbers(nx,ny,half)
+
+        # spectrum of the 3/2 padded grid in the same layout (Jacobian of the
+        # padded vorticity)
+        self.nxe, self.nye = int(nx*3/2), int(ny*3/2)
+        self.kxe, self.kye, self.k2e = wavenumbers(self.nxe,self.nye,half)
+
+        # modes kept by the 2/3 rule, |kx| < nx/3 and |ky| < ny/3
+        self.mask = (np.abs(self.kx) < nx/3.0) & (np.abs(self.ky) < ny/3.0)
+
+        for a in (self.kx, self.ky, self.k2, self.kxe, self.kye, self.k2e, self.mask):
+            a.setflags(write=False)
+
+        # physical-space data type of the transforms, real for the half spectrum
+        self.dtype = self.rdtype if half else self.cdtype
+        self.shape = self.k2.shape
+
+    def plans(self, padded=False):
+
+        '''
+        FFTW objects of the grid or of its 3/2 padded grid (planned on first use,
+        see get_fftw)
+
+        Inputs
+        ------
+        padded : True for the transforms of the (nxe,nye) padded grid
+
+        Output
+        ------
+        fft_object, fft_object_inv : forward and backward FFTW objects
+        '''
+
+        shape = (self.nxe,self.nye) if padded else (self.nx,self.ny)
+
+        return (get_fftw(shape, self.dtype, direction='FFTW_FORWARD'),
+                get_fftw(shape, self.dtype, direction='FFTW_BACKWARD'))
+
+    def buffer(self, name, padded=False, real=False):
+
+        '''
+        cached aligned scratch array of the grid (contents are not initialized)
+
+        Inputs
+        ------
+        name : label of the buffer, distinct labels give distinct arrays
+        padded : True for an array of the padded grid, (nxe,nye) for a real array and
+                 the spectrum shape of the padded grid otherwise
+        real : True for a real array of the precision of the grid
+
+        Output
+        ------
+        u : aligned scratch array
+        '''
+
+        if padded:
+            shape = (self.nxe,self.nye) if real else self.k2e.shape
+        else:
+            shape = self.shape
+        dtype = self.rdtype if real else self.cdtype
+
+        return get_buffer(name, shape, dtype)
+
+def grid_operators(nx, ny, half=False, dtype='complex128'):
+
+    '''
+    return the cached operators of the (nx,ny) grid, building them on first use
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    half : True for the Hermitian half spectrum of a real-to-complex transform
+    dtype : complex data type of the spectra (complex128 or complex64)
+
+    Output
+    ------
+    ops : GridOperators object of the grid
+    '''
+
+    key = (nx, ny, bool(half), np.dtype(dtype).name)
+
+    if key not in grid_cache:
+        grid_cache[key] = GridOperators(nx, ny, half, dtype)
+
+    return grid_cache[key]
+
+#%%
+class SpectralDHIT:
+
+    '''
+    hybrid third-order Runge-Kutta implicit Crank-Nicolson stepper for the
+    pseudo-spectral solver. The object owns every work array of the time step
+    (stage fields, stage Jacobians, derivative factors, 3/2 padded buffers and
+    FFTW plans) and precomputes the implicit viscous factors once per dt, so that
+    a step only executes FFTs and in-place ufuncs and allocates no field-sized arrays.
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    re : Reynolds number (one value per member for an ensemble)
+    dt : time step
+    half : True to carry the Hermitian half spectrum (real-to-complex transforms)
+    ipack : [1] pack the real factors of the Jacobian in pairs (full spectrum only)
+    nb : [0] single realization, [nb > 0] ensemble of nb realizations held as a
+         stack (nb,nx,ny) and transformed together by batched FFTs along axes (1,2)
+    single : True for single precision (complex64 spectra, float32 fields and
+             single-precision FFTW plans), see precision_guard
+    dealias : [1] 3/2 padding, [2] 2/3 rule: the factors and the product of the
+              Jacobian are truncated to |kx| < nx/3, |ky| < ny/3 on the native grid,
+              so that its FFTs run at (nx,ny) instead of (3nx/2,3ny/2)
+    hermitian : True to keep only the Hermitian part of the Nyquist modes of the full
+                spectrum (Jacobian, truncation), which is all the real field holds of
+                them, so that the full spectrum follows the half spectrum to round-off;
+                False keeps the Nyquist modes of the Jacobian as they are
+    '''
+
+    # RK3 coefficients (refer to Orlandi: Fluid flow phenomenon)
+    alpha = (8.0/15.0, 2.0/15.0, 1.0/3.0)
+    gamma = (8.0/15.0, 5.0/12.0, 3.0/4.0)
+    rho = (0.0, -17.0/60.0, -5.0/12.0)
+
+    def __init__(self, nx, ny, re, dt, half=False, ipack=0, nb=0, single=False, dealias=1,
+                 hermitian=False):
+
+        self.nx, self.ny = nx, ny
+        self.nb = nb
+        self.dealias = dealias
+        self.half = half
+        self.hermitian = hermitian and not half
+        self.rdtype = np.dtype('float32' if single else 'float64')
+        self.cdtype = np.dtype('complex64' if single else 'complex128')
+        self.ipack = 1 if (ipack == 1 and not half) else 0
+
+        # wavenumbers shared with every other user of the grid
+        ops = grid_operators(nx,ny,half,self.cdtype)
+        self.kx, self.ky, self.k2 = ops.kx, ops.ky, ops.k2
+
+        # leading ensemble axis, the viscous factors broadcast over the members
+        if nb == 0:
+            self.re = re
+            shape = self.k2.shape
+            axes = (0,1)
+        else:
+            self.re = np.broadcast_to(np.asarray(re, dtype=np.float64), (nb,)).reshape(nb,1,1)
+            shape = (nb,) + self.k2.shape
+            axes = (1,2)
+
+        # solution, stage fields and stage Jacobians in frequency domain
+        self.wnf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.w1f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.w2f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.jnf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.j1f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.j2f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.tf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+
+        # 3/2 padded grid, the native grid for the 2/3 rule
+        if dealias == 2:
+            nxe, nye = nx, ny
+        else:
+            nxe, nye = int(nx*3/2), int(ny*3/2)
+        self.nxe, self.nye = nxe, nye
+        pshape = (nxe,nye) if nb == 0 else (nb,nxe,nye)
+        fshape = (nx,ny) if nb == 0 else (nb,nx,ny)
+        dtype = self.rdtype if half else self.cdtype
+
+        self.fft_object = get_fftw(fshape, dtype, direction='FFTW_FORWARD', axes=axes)
+        self.fft_object_inv = get_fftw(fshape, dtype, direction='FFTW_BACKWARD', axes=axes)
+        self.fft_padded = get_fftw(pshape, dtype, direction='FFTW_FORWARD', axes=axes)
+        self.fft_padded_inv = get_fftw(pshape, dtype, direction='FFTW_BACKWARD', axes=axes)
+
+        # derivative factors of the Jacobian including the padding scale factor
+        scale = (nxe*nye)/(nx*ny)
+        kx, ky, k2 = np.broadcast_arrays(self.kx, self.ky, self.k2)
+        if self.ipack == 1:
+            # j1 + i*j3 and j2 + i*j4 on the padded grid, applied to the padded
+            # vorticity with Hermitian Nyquist modes (see hermitian_nyquist)
+            if dealias == 2:
+                kxe, kye, k2e = kx, ky, k2
+            else:
+                kxe, kye, k2e = np.broadcast_arrays(ops.kxe, ops.kye, ops.k2e)
+            self.factors = [scale*(1.0j*kxe - kye)/k2e, scale*(1.0j*kye - kxe)]
+            self.jp = [pyfftw.empty_aligned(pshape, dtype=self.cdtype) for i in range(2)]
+            self.wpe = pyfftw.zeros_aligned(pshape, dtype=self.cdtype)
+        elif half and dealias == 1:
+            # on the padded grid, applied to the padded vorticity with split Nyquist
+            # modes (see nyquist_pad_half)
+            kxe, kye, k2e = np.broadcast_arrays(ops.kxe, ops.kye, ops.k2e)
+            self.factors = [scale*1.0j*kxe/k2e, scale*1.0j*kye, scale*1.0j*kye/k2e, scale*1.0j*kxe]
+            self.jp = [pyfftw.empty_aligned(pshape, dtype=self.rdtype) for i in range(4)]
+            self.wpe = pyfftw.zeros_aligned(self.fft_padded_inv.input_array.shape, dtype=self.cdtype)
+        else:
+            self.factors = [scale*1.0j*kx/k2, scale*1.0j*ky, scale*1.0j*ky/k2, scale*1.0j*kx]
+            self.jp = [pyfftw.empty_aligned(pshape, dtype=self.rdtype) for i in range(4)]
+        self.factors = [fac.astype(self.cdtype) for fac in self.factors]
+
+        # blocks of the spectrum copied between the fine and the padded grid and
+        # the gaps of the padded grid which stay zero, and the factor taking the
+        # product back to the fine grid
+        hx, hy = int(nx/2), int(ny/2)
+        self.jscale = (nx*ny)/(nxe*nye)
+        if dealias == 2:
+            # the mask is applied to the factors and to the product in place
+            self.factors = [fac*ops.mask for fac in self.factors]
+            self.blocks = [(np.s_[...], np.s_[...])]
+            self.gaps = []
+            self.jscale = ops.mask
+        elif half:
+            self.blocks = [(np.s_[...,0:hx,:], np.s_[...,0:hx,0:hy+1]),
+                           (np.s_[...,hx:,:], np.s_[...,nxe-hx:,0:hy+1])]
+            self.gaps = [np.s_[...,hx:nxe-hx,:], np.s_[...,hy+1:]]
+        else:
+            self.blocks = [(np.s_[...,0:hx,0:hy], np.s_[...,0:hx,0:hy]),
+                           (np.s_[...,hx:,0:hy], np.s_[...,nxe-hx:,0:hy]),
+                           (np.s_[...,0:hx,hy:], np.s_[...,0:hx,nye-hy:]),
+                           (np.s_[...,hx:,hy:], np.s_[...,nxe-hx:,nye-hy:])]
+            self.gaps = [np.s_[...,hx:nxe-hx,:], np.s_[...,hy:nye-hy]]
+
+        # mean mode of the spectrum, held fixed at zero
+        self.mean = np.s_[...,0,0]
+
+        self.set_dt(dt)
+
+        # weights of the spectral sums of the diagnostics, built on first use
+        self.dweights = None
+
+    def set_dt(self, dt):
+
+        '''
+        precompute the implicit Crank-Nicolson factors of the three stages for time step dt
+
+        Inputs
+        ------
+        dt : time step
+        '''
+
+        self.dt = dt
+        z = 0.5*dt*self.k2/self.re
+
+        # w_(k+1) = ca*w_k + cb*(gamma*j_k + rho*j_(k-1))
+        self.ca, self.cb = [], []
+        for a in self.alpha:
+            self.ca.append(((1.0 - a*z)/(1.0 + a*z)).astype(self.rdtype))
+            self.cb.append((dt/(1.0 + a*z)).astype(self.rdtype))
+
+    def set_vorticity(self, w):
+
+        '''
+        set the solution from the vorticity field in physical space
+
+        Inputs
+        ------
+        w : vorticity field in physical space (periodic boundaries are ignored),
+            stack of fields (nb,nx+1,ny+1) for an ensemble
+        '''
+
+        self.wnf[...] = fftw_execute(self.fft_object, w[...,0:self.nx,0:self.ny])
+        self.jnf_current = False
+
+    def set_spectrum(self, wf, dt=None):
+
+        '''
+        set the solution in frequency domain and the time step (restart from a checkpoint)
+
+        Inputs
+        ------
+        wf : vorticity field in frequency domain of the same layout as wnf
+        dt : time step (default: keep the current one)
+        '''
+
+        if wf.shape != self.wnf.shape:
+            raise ValueError('spectrum of shape '+str(wf.shape)+' does not match the solver '
+                             +str(self.wnf.shape))
+
+        self.wnf[...] = wf
+        self.jnf_current = False
+
+        if dt is not None and dt != self.dt:
+            self.set_dt(dt)
+
+    def jacobian(self, wf, jf):
+
+        '''
+        compute the Jacobian with 3/2 or 2/3-rule dealiasing in place
+
+        Inputs
+        ------
+        wf : vorticity field in frequency domain
+        jf : array to be filled with the jacobian in frequency domain
+             (d(psi)/dy*d(omega)/dx - d(psi)/dx*d(omega)/dy)
+        '''
+
+        jpf = self.fft_padded_inv.input_array
+        jacp = self.fft_padded.input_array
+
+        if self.ipack == 1:
+            if self.dealias == 2:
+                # Nyquist modes are outside the mask of the factors
+                self.wpe[...] = wf
+            else:
+                # only the +nx/2 row and +ny/2 column of the gaps are written by the projection
+                self.wpe[...,int(self.nx/2),:] = 0.0
+                self.wpe[...,int(self.ny/2)] = 0.0
+                for src, dst in self.blocks:
+                    self.wpe[dst] = wf[src]
+                hermitian_nyquist(self.nx,self.ny,self.wpe)
+
+            for fac, jp in zip(self.factors, self.jp):
+                np.multiply(fac, self.wpe, out=jpf)
+                jp[...] = self.fft_padded_inv()
+
+            np.multiply(self.jp[0], self.jp[1], out=jacp)
+            jacp.imag[...] = 0.0
+        elif self.half and self.dealias == 1:
+            # only the +nx/2 row of the gaps is written by the split
+            self.wpe[...,int(self.nx/2),:] = 0.0
+            for src, dst in self.blocks:
+                self.wpe[dst] = wf[src]
+            nyquist_pad_half(self.nx,self.ny,self.wpe)
+
+            for fac, jp in zip(self.factors, self.jp):
+                np.multiply(fac, self.wpe, out=jpf)
+                jp[...] = self.fft_padded_inv().real
+        else:
+            for fac, jp in zip(self.factors, self.jp):
+                for gap in self.gaps:
+                    jpf[gap] = 0.0
+                for src, dst in self.blocks:
+                    np.multiply(fac[src], wf[src], out=jpf[dst])
+
+                jp[...] = self.fft_padded_inv().real
+
+        if self.ipack == 0:
+            j1, j2, j3, j4 = self.jp
+            np.multiply(j1, j2, out=jacp)
+            np.multiply(j3, j4, out=j4) # j1, j3 (velocity) are kept for cfl_dt
+            np.subtract(jacp, j4, out=jacp)
+
+        jacpf = self.fft_padded()
+
+        for src, dst in self.blocks:
+            np.multiply(jacpf[dst], self.jscale, out=jf[src])
+        # the Nyquist modes keep the part of the real product (its Hermitian part)
+        if self.half and self.dealias == 1:
+            nyquist_truncate_half(self.nx,self.ny,jacpf,jf,self.jscale)
+        elif self.hermitian and self.dealias == 1:
+            hermitian_nyquist(self.nx,self.ny,jf)
+
+    def stage(self, k, wf, jf, jpf, out):
+
+        '''
+        Crank-Nicolson update of stage k (0,1,2) in place
+
+        Inputs
+        ------
+        k : stage index
+        wf : solution at the beginning of the stage
+        jf, jpf : Jacobian of the current and the previous stage
+        out : array to be filled with the solution at the end of the stage
+        '''
+
+        np.multiply(self.ca[k], wf, out=out)
+
+        np.multiply(self.cb[k], jf, out=self.tf)
+        self.tf *= self.gamma[k]
+        out += self.tf
+
+        if self.rho[k] != 0.0:
+            np.multiply(self.cb[k], jpf, out=self.tf)
+            self.tf *= self.rho[k]
+            out += self.tf
+
+        out[self.mean] = 0.0
+
+    def solution_jacobian(self):
+
+        '''
+        Jacobian of the current solution, computed once and reused by the first stage
+        of the next step (output and time integration share it)
+
+        Output
+        ------
+        jnf : jacobian of wnf in frequency domain (array of the solver, do not modify)
+        '''
+
+        if not self.jnf_current:
+            self.jacobian(self.wnf, self.jnf)
+            self.jnf_current = True
+
+        return self.jnf
+
+    def velocity_max(self):
+
+        '''
+        maximum velocity magnitudes of the last Jacobian (d(psi)/dy and d(psi)/dx are
+        the first factors of the Jacobian on the padded grid)
+
+        Output
+        ------
+        umax, vmax : max|u|, max|v|
+        '''
+
+        if self.ipack == 1:
+            u, v = self.jp[0].imag, self.jp[0].real
+        else:
+            u, v = self.jp[2], self.jp[0]
+
+        return max(np.max(u), -np.min(u)), max(np.max(v), -np.min(v))
+
+    def cfl_dt(self, cfl):
+
+        '''
+        time step for a target CFL number from the velocity of the last Jacobian
+
+        Inputs
+        ------
+        cfl : target CFL number, dt*(max|u|/dx + max|v|/dy)
+
+        Output
+        ------
+        dt : time step
+        '''
+
+        umax, vmax = self.velocity_max()
+
+        dx = 2.0*np.pi/np.float64(self.nx)
+        dy = 2.0*np.pi/np.float64(self.ny)
+
+        return cfl/max(umax/dx + vmax/dy, 1.0e-12)
+
+    def adapt_dt(self, cfl, dt_max=np.inf):
+
+        '''
+        change the time step after the first Jacobian of a step (see step)
+
+        Inputs
+        ------
+        cfl : target CFL number
+        dt_max : time left to the next output
+        '''
+
+        dt_cfl = self.cfl_dt(cfl)
+        dt = self.dt if (0.8*dt_cfl <= self.dt <= dt_cfl) else dt_cfl
+        if dt_max < 2.0*dt:
+            dt = dt_max/np.ceil(dt_max/dt) # equal steps up to the output time
+        if dt != self.dt:
+            self.set_dt(dt)
+
+    def step(self, cfl=0.0, dt_max=np.inf):
+
+        '''
+        advance the solution by one time step
+
+        Inputs
+        ------
+        cfl : [0] fixed time step, [cfl > 0] time step adapted to the target CFL number
+              from the velocity of the first stage. The step is kept while it lies
+              between 0.8 and 1 times the CFL limit, so that the viscous factors are
+              recomputed only when dt changes
+        dt_max : time left to the next output, the step is shortened to land on it
+        '''
+
+        self.solution_jacobian()
+
+        if cfl > 0.0:
+            self.adapt_dt(cfl, dt_max)
+
+        self.stage(0, self.wnf, self.jnf, None, self.w1f)
+
+        self.jacobian(self.w1f, self.j1f)
+        self.stage(1, self.w1f, self.j1f, self.jnf, self.w2f)
+
+        self.jacobian(self.w2f, self.j2f)
+        self.stage(2, self.w2f, self.j2f, self.j1f, self.wnf)
+        self.jnf_current = False
+
+    def diagnostics(self):
+
+        '''
+        integral quantities of the current solution per unit area from spectral sums
+        (Parseval), only the maximum vorticity needs an inverse FFT
+
+        Output
+        ------
+        d : [energy, enstrophy, palinstrophy, energy dissipation rate, max |vorticity|],
+            (5,) or (5,nb) for an ensemble. energy = <u.u>/2, enstrophy = <w^2>/2,
+            palinstrophy = <|grad w|^2>/2, dissipation = 2*enstrophy/re
+        '''
+
+        dweights = self.diagnostic_weights()
+
+        np.abs(self.wnf, out=self.wf2)
+        self.wf2 *= self.wf2
+
+        energy, enstrophy, palinstrophy = [np.einsum('...ij,ij->...', self.wf2, weight)
+                                           for weight in dweights]
+        dissipation = 2.0*enstrophy/np.ravel(self.re) if self.nb > 0 else 2.0*enstrophy/self.re
+
+        wmax = np.max(np.abs(self.vorticity()), axis=(-2,-1))
+
+        return np.array([energy, enstrophy, palinstrophy, dissipation, wmax])
+
+    def diagnostic_weights(self):
+
+        '''
+        weights of the spectral sums of energy, enstrophy and palinstrophy, built on
+        first use together with the scratch array wf2 of |wnf|^2
+
+        Output
+        ------
+        dweights : [1/k2, 1, k2] times the Parseval weight of every mode
+        '''
+
+        if self.dweights is None:
+            # the half spectrum holds the modes 0 < ky < ny/2 once for +ky and -ky
+            weight = np.ones(self.k2.shape)
+            if self.half:
+                weight[:,1:int(self.ny/2)] = 2.0
+            weight /= 2.0*(np.float64(self.nx*self.ny)**2)
+            self.dweights = [weight/self.k2, weight, weight*self.k2]
+            self.dweights[0][self.mean] = 0.0
+            self.wf2 = np.empty(self.wnf.shape)
+
+        return self.dweights
+
+    def truncation_error(self, nxn, nyn):
+
+        '''
+        fraction of the energy held by the modes that a truncation of the solution
+        to the (nxn,nyn) grid drops
+
+        Inputs
+        ------
+        nxn,nyn : number of grid points in x and y direction of the smaller grid
+
+        Output
+        ------
+        tail : energy above the cutoff of the smaller grid over the total energy,
+               largest over the members of an ensemble
+        '''
+
+        weight = self.diagnostic_weights()[0]
+
+        if self.half or self.hermitian:
+            # modes |kx| < nxn/2 and |ky| < nyn/2 are kept, the Nyquist modes of the
+            # smaller grid count half (the truncation keeps their Hermitian part)
+            edge = (np.abs(self.kx) >= nxn/2) | (np.abs(self.ky) >= nyn/2)
+            out = (np.abs(self.kx) > nxn/2) | (np.abs(self.ky) > nyn/2)
+            drop = np.where(out, 1.0, 0.5*edge)
+        else:
+            # modes -nxn/2 <= kx < nxn/2 and -nyn/2 <= ky < nyn/2 are kept
+            drop = (self.kx < -nxn/2) | (self.kx >= nxn/2)
+            drop = drop | (self.ky < -nyn/2) | (self.ky >= nyn/2)
+
+        np.abs(self.wnf, out=self.wf2)
+        self.wf2 *= self.wf2
+
+        energy = np.einsum('...ij,ij->...', self.wf2, weight)
+        tail = np.einsum('...ij,ij->...', self.wf2, weight*drop)
+
+        return np.max(tail/energy)
+
+    def truncated(self, nxn, nyn):
+
+        '''
+        stepper of the same kind on the smaller (nxn,nyn) grid holding the spectrally
+        truncated solution and the current time step (plans, wavenumbers and work
+        arrays are those of the new grid)
+
+        Inputs
+        ------
+        nxn,nyn : number of grid points in x and y direction of the smaller grid
+
+        Output
+        ------
+        solver : new stepper
+        '''
+
+        re = np.ravel(self.re) if self.nb > 0 else self.re
+        solver = self.__class__(nxn, nyn, re, self.dt, self.half, self.ipack, self.nb,
+                                self.rdtype == np.float32, self.dealias, self.hermitian)
+
+        hx, hy = int(nxn/2), int(nyn/2)
+        nx, ny = self.nx, self.ny
+        if self.half:
+            blocks = [(np.s_[...,0:hx,:], np.s_[...,0:hx,0:hy+1]),
+                      (np.s_[...,hx:,:], np.s_[...,nx-hx:,0:hy+1])]
+        else:
+            blocks = [(np.s_[...,0:hx,0:hy], np.s_[...,0:hx,0:hy]),
+                      (np.s_[...,hx:,0:hy], np.s_[...,nx-hx:,0:hy]),
+                      (np.s_[...,0:hx,hy:], np.s_[...,0:hx,ny-hy:]),
+                      (np.s_[...,hx:,hy:], np.s_[...,nx-hx:,ny-hy:])]
+
+        wf = np.zeros(solver.wnf.shape, dtype=self.cdtype)
+        for dst, src in blocks:
+            wf[dst] = self.wnf[src]
+        wf *= (nxn*nyn)/(nx*ny)
+        if self.half:
+            nyquist_truncate_half(nxn,nyn,self.wnf,wf,(nxn*nyn)/(nx*ny))
+        elif self.hermitian:
+            hermitian_nyquist(nxn,nyn,wf)
+        solver.set_spectrum(wf)
+
+        return solver
+
+    def vorticity(self):
+
+        '''
+        vorticity of the current solution in physical space
+
+        Output
+        ------
+        w : vorticity field (excluding periodic boundaries), a view of an FFTW buffer
+        '''
+
+        return fftw_execute(self.fft_object_inv, self.wnf).real
+
+    def memory(self):
+
+        '''
+        memory held by the work arrays of the stepper
+
+        Output
+        ------
+        nbytes : number of bytes of all arrays (including FFTW buffers) used in a time step
+        '''
+
+        arrays = [self.kx, self.ky, self.k2, self.wnf, self.w1f, self.w2f,
+                  self.jnf, self.j1f, self.j2f, self.tf] + self.factors + self.jp \
+                 + self.ca + self.cb
+        if self.ipack == 1 or (self.half and self.dealias == 1):
+            arrays.append(self.wpe)
+
+        for fft_object in (self.fft_object, self.fft_object_inv,
+                           self.fft_padded, self.fft_padded_inv):
+            arrays += [fft_object.input_array, fft_object.output_array]
+
+        return sum(a.nbytes for a in arrays)
+
+#%%
+# ETDRK4 coefficients for the last few (grid, re, dt)
+etd_coefficients = {}
+
+def etdrk4_coefficients(k2, re, dt, m=16):
+
+    '''
+    coefficients of the fourth-order exponential time differencing Runge-Kutta
+    scheme (Cox & Matthews) for the linear viscous operator L = -k2/re. The
+    phi-functions are evaluated by a contour integral of m points on the upper
+    unit half circle around each L*dt (Kassam & Trefethen), which avoids the
+    cancellation of the direct formulas for small |L*dt|. Coefficients are cached
+    per (grid, re, dt)
+
+    Inputs
+    ------
+    k2 : absolute wave number over 2D domain
+    re : Reynolds number (array (nb,1,1) for an ensemble)
+    dt : time step
+    m : number of points of the contour integral
+
+    Output
+    ------
+    e, e2 : exp(L*dt), exp(L*dt/2)
+    q, f1, f2, f3 : weights of the nonlinear term
+    '''
+
+    key = (k2.shape, tuple(np.ravel(re)), dt, m)
+    if key in etd_coefficients:
+        return etd_coefficients[key]
+
+    l = -dt*k2/re
+    e = np.exp(l)
+    e2 = np.exp(0.5*l)
+
+    q = np.zeros(l.shape)
+    f1 = np.zeros(l.shape)
+    f2 = np.zeros(l.shape)
+    f3 = np.zeros(l.shape)
+
+    # L is real, so the mean over the upper half circle has the same real part
+    for j in range(m):
+        lr = l + np.exp(1.0j*np.pi*(j + 0.5)/m)
+        elr = np.exp(lr)
+        lr3 = lr**3
+        q += ((np.exp(0.5*lr) - 1.0)/lr).real
+        f1 += ((-4.0 - lr + elr*(4.0 - 3.0*lr + lr*lr))/lr3).real
+        f2 += ((2.0 + lr + elr*(lr - 2.0))/lr3).real
+        f3 += ((-4.0 - 3.0*lr - lr*lr + elr*(4.0 - lr))/lr3).real
+
+    coefficients = (e, e2, dt*q/m, dt*f1/m, dt*f2/m, dt*f3/m)
+
+    # adaptive time steps would otherwise fill the cache
+    if len(etd_coefficients) >= 4:
+        etd_coefficients.pop(next(iter(etd_coefficients)))
+    etd_coefficients[key] = coefficients
+
+    return coefficients
+
+#%%
+class SpectralETDRK4(SpectralDHIT):
+
+    '''
+    fourth-order exponential time differencing Runge-Kutta stepper (ETDRK4). The
+    linear viscous term is integrated exactly, the Jacobian (3/2 or 2/3 dealiasing) and
+    all work arrays are those of SpectralDHIT. The propagators of the solution
+    (exp(L*dt), exp(L*dt/2)) are kept in ca and the weights of the nonlinear term
+    in cb, both taken from the cache of etdrk4_coefficients
+
+    Inputs
+    ------
+    same as SpectralDHIT
+    '''
+
+    def __init__(self, nx, ny, re, dt, half=False, ipack=0, nb=0, single=False, dealias=1,
+                 hermitian=False):
+
+        SpectralDHIT.__init__(self, nx, ny, re, dt, half, ipack, nb, single, dealias, hermitian)
+
+        # Jacobian of the third stage
+        self.j3f = pyfftw.zeros_aligned(self.wnf.shape, dtype=self.cdtype)
+
+    def set_dt(self, dt):
+
+        '''
+        set the ETDRK4 coefficients for time step dt
+
+        Inputs
+        ------
+        dt : time step
+        '''
+
+        self.dt = dt
+        e, e2, q, f1, f2, f3 = [c.astype(self.rdtype, copy=False)
+                                for c in etdrk4_coefficients(self.k2, self.re, dt)]
+        self.ca, self.cb = [e, e2], [q, f1, f2, f3]
+
+    def step(self, cfl=0.0, dt_max=np.inf):
+
+        '''
+        advance the solution by one time step
+
+        Inputs
+        ------
+        cfl : [0] fixed time step, [cfl > 0] time step adapted to the target CFL number
+              (see SpectralDHIT.step)
+        dt_max : time left to the next output, the step is shortened to land on it
+        '''
+
+        v, a, b = self.wnf, self.w1f, self.w2f
+        nv, na, nb, nc = self.jnf, self.j1f, self.j2f, self.j3f
+        tf = self.tf
+
+        self.solution_jacobian()
+
+        if cfl > 0.0:
+            self.adapt_dt(cfl, dt_max)
+
+        e, e2 = self.ca
+        q, f1, f2, f3 = self.cb
+
+        # a = e2*v + q*N(v)
+        np.multiply(e2, v, out=a)
+        np.multiply(q, nv, out=tf)
+        a += tf
+        a[self.mean] = 0.0
+        self.jacobian(a, na)
+
+        # b = e2*v + q*N(a)
+        np.multiply(e2, v, out=b)
+        np.multiply(q, na, out=tf)
+        b += tf
+        b[self.mean] = 0.0
+        self.jacobian(b, nb)
+
+        # c = e2*a + q*(2N(b) - N(v)), stored in b
+        np.multiply(nb, 2.0, out=tf)
+        tf -= nv
+        tf *= q
+        np.multiply(e2, a, out=b)
+        b += tf
+        b[self.mean] = 0.0
+        self.jacobian(b, nc)
+
+        # v = e*v + f1*N(v) + 2*f2*(N(a) + N(b)) + f3*N(c)
+        v *= e
+        np.multiply(f1, nv, out=tf)
+        v += tf
+        np.add(na, nb, out=tf)
+        tf *= f2
+        tf *= 2.0
+        v += tf
+        np.multiply(f3, nc, out=tf)
+        v += tf
+        v[self.mean] = 0.0
+        self.jnf_current = False
+
+    def memory(self):
+
+        '''
+        memory held by the work arrays of the stepper
+
+        Output
+        ------
+        nbytes : number of bytes of all arrays (including FFTW buffers) used in a time step
+        '''
+
+        return SpectralDHIT.memory(self) + self.j3f.nbytes
+
+#%%
+def precision_guard(stepper, re, dt, half=False, ipack=0, dealias=1, nt=100, tol=1.0e-4, n=64):
+
+    '''
+    accuracy guard of the single-precision solver: a Taylor-Green vortex perturbed
+    by noise (so that the Jacobian and its padded product do not vanish) is
+    integrated for nt steps in single and in double precision with the same stepper
+    on a small (n,n) grid, and a warning is issued when the energy of the
+    single-precision run drifts from the double-precision one by more than tol
+    (relative)
+
+    Inputs
+    ------
+    stepper : SpectralDHIT or SpectralETDRK4
+    re : Reynolds number
+    dt : time step
+    half, ipack, dealias : layout of the spectrum, packing of the Jacobian and
+                           dealiasing of the run (see SpectralDHIT)
+    nt : number of time steps
+    tol : largest relative energy drift accepted
+    n : number of grid points in x and y direction of the test grid
+
+    Output
+    ------
+    drift : max over the time steps of |E_single/E_double - 1|
+    '''
+
+    x = np.linspace(0.0,2.0*np.pi,n+1)[0:n]
+    x, y = np.meshgrid(x, x, indexing='ij')
+
+    # fixed noise of all wavenumbers up to the Nyquist modes, 10% of the TGV amplitude
+    nq = 4.0
+    w = 2.0*nq*np.cos(nq*x)*np.cos(nq*y)
+    w += 0.2*nq*np.random.default_rng(0).standard_normal((n,n))
+
+    energy = []
+    for single in (False, True):
+        solver = stepper(n,n,re,dt,half,ipack,0,single,dealias)
+        solver.set_vorticity(w)
+        e = np.empty(nt+1)
+        e[0] = solver.diagnostics()[0]
+        for k in range(nt):
+            solver.step()
+            e[k+1] = solver.diagnostics()[0]
+        energy.append(e)
+
+    drift = np.max(np.abs(energy[1]/energy[0] - 1.0))
+
+    if drift > tol:
+        warnings.warn('single precision energy of the perturbed Taylor-Green vortex drifts by '
+                      '%.2e from double precision after %d steps (tolerance %.1e)' % (drift, nt, tol))
+
+    return drift
+
+#%%
+class SlabFFT:
+
+    '''
+    parallel 2D FFT of a field decomposed in slabs over the ranks of an MPI
+    communicator. In physical space a rank holds nxe/p consecutive rows of the
+    (nxe,nye) grid, in frequency space all kx of ny/p consecutive ky columns of the
+    (nx,ny) spectrum. A transform is a 1D FFT along the local axis, a global
+    transpose (Alltoall) and a 1D FFT along the other axis. For a physical grid
+    larger than the spectrum (3/2 padding) the backward transform zero-pads kx
+    before and ky after the transpose and the forward transform truncates in the
+    reverse order, so that dealiasing adds no communication
+
+    Inputs
+    ------
+    nx,ny : number of modes of the spectrum in x and y direction
+    comm : MPI communicator
+    nxe,nye : number of grid points of the physical grid (default: nx,ny)
+    dtype : complex data type of the transforms
+    '''
+
+    def __init__(self, nx, ny, comm, nxe=None, nye=None, dtype='complex128'):
+
+        nxe = nx if nxe is None else nxe
+        nye = ny if nye is None else nye
+        p = comm.size
+
+        if ny%p != 0 or nxe%p != 0:
+            raise ValueError('slab decomposition of the ('+str(nxe)+','+str(nye)+') grid and the ('
+                             +str(nx)+','+str(ny)+') spectrum needs a divisor of '+str(nxe)
+                             +' and '+str(ny)+' as number of ranks, not '+str(p))
+
+        self.comm = comm
+        self.p = p
+        self.nx, self.ny, self.nxe, self.nye = nx, ny, nxe, nye
+        self.nxl, self.nyl = int(nxe/p), int(ny/p)
+
+        # global rows of the physical slab and ky columns of the spectral slab
+        self.rows = np.s_[comm.rank*self.nxl:(comm.rank+1)*self.nxl]
+        self.cols = np.s_[comm.rank*self.nyl:(comm.rank+1)*self.nyl]
+
+        self.fftx = get_fftw((nxe,self.nyl), dtype, direction='FFTW_FORWARD', axes=(0,))
+        self.fftx_inv = get_fftw((nxe,self.nyl), dtype, direction='FFTW_BACKWARD', axes=(0,))
+        self.ffty = get_fftw((self.nxl,nye), dtype, direction='FFTW_FORWARD', axes=(1,))
+        self.ffty_inv = get_fftw((self.nxl,nye), dtype, direction='FFTW_BACKWARD', axes=(1,))
+
+        self.sendbuf = pyfftw.empty_aligned((p,self.nxl,self.nyl), dtype=dtype)
+        self.recvbuf = pyfftw.empty_aligned((p,self.nxl,self.nyl), dtype=dtype)
+        self.work = pyfftw.empty_aligned((self.nxl,ny), dtype=dtype)
+        self.uf = pyfftw.empty_aligned((nx,self.nyl), dtype=dtype)
+
+    def backward(self, uf):
+
+        '''
+        inverse transform of the local spectral slab
+
+        Inputs
+        ------
+        uf : local slab (nx,ny/p) of the spectrum
+
+        Output
+        ------
+        u : local slab (nxe/p,nye) of the field in physical space (complex), a view
+            of an FFTW buffer
+        '''
+
+        hx, hy = int(self.nx/2), int(self.ny/2)
+        nxe, nye = self.nxe, self.nye
+
+        a = self.fftx_inv.input_array
+        a[0:hx] = uf[0:hx]
+        a[hx:nxe-hx] = 0.0
+        a[nxe-hx:] = uf[hx:]
+        a = self.fftx_inv()
+
+        # block q of the rows goes to rank q, which receives the ky columns of all ranks
+        self.sendbuf[...] = a.reshape(self.p,self.nxl,self.nyl)
+        self.comm.Alltoall(self.sendbuf, self.recvbuf)
+        np.copyto(self.work.reshape(self.nxl,self.p,self.nyl), self.recvbuf.transpose(1,0,2))
+
+        b = self.ffty_inv.input_array
+        b[:,0:hy] = self.work[:,0:hy]
+        b[:,hy:nye-hy] = 0.0
+        b[:,nye-hy:] = self.work[:,hy:]
+
+        return self.ffty_inv()
+
+    def forward(self, u):
+
+        '''
+        forward transform of the local physical slab
+
+        Inputs
+        ------
+        u : local slab (nxe/p,nye) of the field in physical space (real or complex)
+
+        Output
+        ------
+        uf : local slab (nx,ny/p) of the spectrum, a buffer of the object
+        '''
+
+        hx, hy = int(self.nx/2), int(self.ny/2)
+        nxe, nye = self.nxe, self.nye
+
+        self.ffty.input_array[...] = u
+        b = self.ffty()
+        self.work[:,0:hy] = b[:,0:hy]
+        self.work[:,hy:] = b[:,nye-hy:]
+
+        np.copyto(self.sendbuf, self.work.reshape(self.nxl,self.p,self.nyl).transpose(1,0,2))
+        self.comm.Alltoall(self.sendbuf, self.recvbuf)
+        self.fftx.input_array[...] = self.recvbuf.reshape(nxe,self.nyl)
+        a = self.fftx()
+
+        self.uf[0:hx] = a[0:hx]
+        self.uf[hx:] = a[nxe-hx:]
+
+        return self.uf
+
+#%%
+def write_slab_csv(filename, u, comm):
+
+    '''
+    write a field decomposed in row slabs to one .csv file with MPI-IO. Every rank
+    formats its rows (as write_snapshot) and writes them at the offset given by
+    the bytes of the ranks before it, so that the file is that of the global field
+
+    Inputs
+    ------
+    filename : name of the .csv file
+    u : local rows of the field, in rank order
+    comm : MPI communicator
+    '''
+
+    from mpi4py import MPI
+
+    f = io.BytesIO()
+    np.savetxt(f, u, delimiter=",", fmt='%.8e' if u.dtype == np.float32 else '%.18e')
+    data = f.getvalue()
+
+    offset = comm.exscan(len(data))
+    if offset is None:
+        offset = 0
+
+    fh = MPI.File.Open(comm, filename, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+    fh.Set_size(0)
+    fh.Write_at_all(offset, data)
+    fh.Close()
+
+#%%
+def read_slab_csv(filename, rows, comm):
+
+    '''
+    read the rows of a field of one rank from a .csv file (written by write_slab_csv
+    or write_snapshot) with MPI-IO. The ranks scan equal byte ranges of the file for
+    line ends and gather their offsets, then every rank reads and parses the bytes
+    of its own rows, no rank holds the whole file
+
+    Inputs
+    ------
+    filename : name of the .csv file
+    rows : slice of the global rows of the rank
+    comm : MPI communicator
+
+    Output
+    ------
+    u : rows of the field (with the periodic column of the file)
+    '''
+
+    from mpi4py import MPI
+
+    fh = MPI.File.Open(comm, filename, MPI.MODE_RDONLY)
+    size = fh.Get_size()
+
+    a, b = comm.rank*size//comm.size, (comm.rank+1)*size//comm.size
+    data = bytearray(b-a)
+    fh.Read_at_all(a, data)
+    ends = a + np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')) + 1
+    starts = np.concatenate([[0]] + comm.allgather(ends))
+
+    data = bytearray(int(starts[rows.stop] - starts[rows.start]))
+    fh.Read_at_all(int(starts[rows.start]), data)
+    fh.Close()
+
+    return np.loadtxt(io.BytesIO(data), delimiter=',', ndmin=2)
+
+#%%
+class SpectralDHITMPI(SpectralDHIT):
+
+    '''
+    distributed-memory hybrid third-order Runge-Kutta implicit Crank-Nicolson
+    stepper (needs mpi4py, imported by the driver that creates the communicator).
+
+    The spectrum (full, complex) is decomposed in ky slabs over the ranks and the
+    Jacobian is computed with the slab transforms of SlabFFT on the 3/2 padded
+    grid. The stages, the time step control and the diagnostics of SpectralDHIT
+    work on the local slabs, maxima and sums are reduced over the communicator
+
+    Inputs
+    ------
+    nx,ny : number of grid points in x and y direction
+    re : Reynolds number
+    dt : time step
+    comm : MPI communicator, its size divides ny and 3nx/2
+    single : True for single precision (see SpectralDHIT)
+    hermitian : True for the Hermitian part of the Nyquist modes (see SpectralDHIT)
+    '''
+
+    def __init__(self, nx, ny, re, dt, comm, single=False, hermitian=False):
+
+        self.nx, self.ny = nx, ny
+        self.nb = 0
+        self.half = False
+        self.hermitian = hermitian
+        self.ipack = 0
+        self.rdtype = np.dtype('float32' if single else 'float64')
+        self.cdtype = np.dtype('complex64' if single else 'complex128')
+        self.comm = comm
+        self.re = re
+
+        nxe, nye = int(nx*3/2), int(ny*3/2)
+        self.nxe, self.nye = nxe, nye
+
+        self.fft = SlabFFT(nx,ny,comm,dtype=self.cdtype)
+        self.fft_padded = SlabFFT(nx,ny,comm,nxe,nye,self.cdtype)
+
+        # wavenumbers of the local ky columns
+        ops = grid_operators(nx,ny,False,self.cdtype)
+        self.kx = ops.kx
+        self.ky = np.copy(ops.ky[:,self.fft.cols])
+        self.k2 = np.copy(ops.k2[:,self.fft.cols])
+        shape = self.k2.shape
+
+        self.wnf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.w1f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.w2f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.jnf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.j1f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.j2f = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+        self.tf = pyfftw.zeros_aligned(shape, dtype=self.cdtype)
+
+        scale = (nxe*nye)/(nx*ny)
+        kx, ky, k2 = np.broadcast_arrays(self.kx, self.ky, self.k2)
+        self.factors = [scale*1.0j*kx/k2, scale*1.0j*ky, scale*1.0j*ky/k2, scale*1.0j*kx]
+        self.factors = [fac.astype(self.cdtype) for fac in self.factors]
+        self.jp = [pyfftw.empty_aligned((self.fft_padded.nxl,nye), dtype=self.rdtype) for i in range(4)]
+
+        # the mean mode is held by the first rank
+        self.mean = np.s_[...,0,0] if comm.rank == 0 else np.s_[...,0:0,0:0]
+
+        self.set_dt(dt)
+        self.dweights = None
+
+    def set_vorticity(self, w):
+
+        '''
+        set the solution from the local rows of the vorticity field in physical space
+
+        Inputs
+        ------
+        w : rows fft.rows of the vorticity field (periodic boundaries are ignored)
+        '''
+
+        self.wnf[...] = self.fft.forward(w[:,0:self.ny])
+        self.jnf_current = False
+
+    def jacobian(self, wf, jf):
+
+        '''
+        compute the Jacobian with 3/2 dealiasing in place (see SpectralDHIT.jacobian)
+
+        Inputs
+        ------
+        wf : local slab of the vorticity field in frequency domain
+        jf : local slab to be filled with the jacobian in frequency domain
+        '''
+
+        for fac, jp in zip(self.factors, self.jp):
+            np.multiply(fac, wf, out=self.tf)
+            jp[...] = self.fft_padded.backward(self.tf).real
+
+        j1, j2, j3, j4 = self.jp
+        np.multiply(j1, j2, out=j2)
+        np.multiply(j3, j4, out=j4) # j1, j3 (velocity) are kept for cfl_dt
+        np.subtract(j2, j4, out=j2)
+
+        np.multiply(self.fft_padded.forward(j2), (self.nx*self.ny)/(self.nxe*self.nye), out=jf)
+
+        if self.hermitian:
+            # Hermitian part of the Nyquist modes (see hermitian_nyquist), the mirror
+            # -ky of the kx = -nx/2 row is on another rank, so the row is gathered
+            hx, hy = int(self.nx/2), int(self.ny/2)
+            my = (-np.arange(self.ny))%self.ny
+            row = np.concatenate(self.comm.allgather(jf[hx]))
+            jf[hx] = 0.5*(row + np.conj(row[my]))[self.fft.cols]
+
+            if self.fft.cols.start <= hy < self.fft.cols.stop:
+                mx = (-np.arange(self.nx))%self.nx
+                c = jf[:,hy-self.fft.cols.start]
+                jf[:,hy-self.fft.cols.start] = 0.5*(c + np.conj(c[mx]))
+
+    def velocity_max(self):
+
+        '''
+        maximum velocity magnitudes over all ranks (see SpectralDHIT.velocity_max)
+
+        Output
+        ------
+        umax, vmax : max|u|, max|v|
+        '''
+
+        from mpi4py import MPI
+
+        umax, vmax = SpectralDHIT.velocity_max(self)
+
+        return self.comm.allreduce(umax, op=MPI.MAX), self.comm.allreduce(vmax, op=MPI.MAX)
+
+    def vorticity(self):
+
+        '''
+        local rows of the vorticity of the current solution in physical space
+
+        Output
+        ------
+        w : rows fft.rows of the vorticity field, a view of an FFTW buffer
+        '''
+
+        return self.fft.backward(self.wnf).real
+
+    def diagnostics(self):
+
+        '''
+        integral quantities of the current solution (see SpectralDHIT.diagnostics),
+        the same on all ranks
+
+        Output
+        ------
+        d : [energy, enstrophy, palinstrophy, energy dissipation rate, max |vorticity|]
+        '''
+
+        from mpi4py import MPI
+
+        d = SpectralDHIT.diagnostics(self)
+        d[0:4] = self.comm.allreduce(d[0:4], op=MPI.SUM)
+        d[4] = self.comm.allreduce(d[4], op=MPI.MAX)
+
+        return d
+
+    def memory(self):
+
+        '''
+        memory held by the work arrays of the stepper on this rank
+
+        Output
+        ------
+        nbytes : number of bytes of all arrays (including FFTW and transpose buffers)
+        '''
+
+        arrays = [self.kx, self.ky, self.k2, self.wnf, self.w1f, self.w2f,
+                  self.jnf, self.j1f, self.j2f, self.tf] + self.factors + self.jp \
+                 + self.ca + self.cb
+
+        for fft in (self.fft, self.fft_padded):
+            arrays += [fft.sendbuf, fft.recvbuf, fft.work, fft.uf]
+            for fft_object in (fft.fftx, fft.fftx_inv, fft.ffty, fft.ffty_inv):
+                arrays += [fft_object.input_array, fft_object.output_array]
+
+        return sum(a.nbytes for a in arrays)